@@ -0,0 +1,113 @@
+"""
+Concurrent booking stress test for /api/book-spot.
+
+Fires many concurrent book (+ immediate release) requests at a small lot from
+a thread pool and checks that no spot was ever double booked: at most one
+Active booking per spot, and no two bookings of a spot overlap in time.
+
+Usage (from the project/ directory):
+    python benchmarks/booking_stress.py --spots 5 --requests 2000 --threads 16
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Point the app at a throwaway database before importing it
+DB_DIR = tempfile.mkdtemp(prefix='parking_bench_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(DB_DIR, 'bench.sqlite')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app, db, User, Booking  # noqa: E402
+
+
+def setup(spots):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(username='bench@example.com', role='User', full_name='Bench User')
+        user.set_password('benchpassword')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    client = app.test_client()
+    response = client.post('/api/lots', json={
+        'name': 'Stress Lot', 'address': 'Bench Road', 'pincode': '000000',
+        'price': 10, 'maxSpots': spots
+    })
+    lot = response.get_json()
+    return user_id, [spot['id'] for spot in lot['spots']]
+
+
+def worker(user_id, spot_ids, release):
+    client = app.test_client()
+    spot_id = random.choice(spot_ids)
+    response = client.post('/api/book-spot', json={
+        'spot_id': spot_id, 'user_id': user_id, 'vehicle_number': f'BENCH{spot_id}'
+    })
+    if response.status_code == 201 and release:
+        client.post(f"/api/release-spot/{response.get_json()['booking_id']}")
+    return response.status_code
+
+
+def check_double_bookings():
+    """Returns a list of human readable violations (empty if none)."""
+    violations = []
+    with app.app_context():
+        active = db.session.query(
+            Booking.spot_id, db.func.count(Booking.id)
+        ).filter(
+            Booking.status == 'Active'
+        ).group_by(Booking.spot_id).having(db.func.count(Booking.id) > 1).all()
+        for spot_id, count in active:
+            violations.append(f'spot {spot_id} has {count} Active bookings')
+
+        last_end = {}
+        rows = db.session.query(
+            Booking.spot_id, Booking.start_time, Booking.end_time
+        ).order_by(Booking.spot_id, Booking.start_time).all()
+        for spot_id, start, end in rows:
+            previous = last_end.get(spot_id)
+            if previous is not None and (previous is Ellipsis or start < previous):
+                violations.append(f'spot {spot_id} has overlapping bookings at {start}')
+            last_end[spot_id] = end if end is not None else Ellipsis
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--spots', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--no-release', action='store_true',
+                        help='only book (successes should equal the number of spots)')
+    args = parser.parse_args()
+
+    user_id, spot_ids = setup(args.spots)
+    release = not args.no_release
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        codes = list(pool.map(lambda _: worker(user_id, spot_ids, release), range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    booked = codes.count(201)
+    print(f'requests: {args.requests}  threads: {args.threads}  spots: {args.spots}')
+    print(f'booked: {booked}  conflicts (409): {codes.count(409)}  errors (5xx): {sum(c >= 500 for c in codes)}')
+    print(f'elapsed: {elapsed:.2f}s  bookings/sec: {booked / elapsed:.1f}  requests/sec: {args.requests / elapsed:.1f}')
+
+    violations = check_double_bookings()
+    if violations:
+        print(f'FAILED: {len(violations)} double booking(s)')
+        for violation in violations[:20]:
+            print('  ' + violation)
+        sys.exit(1)
+    print('OK: zero double bookings')
+
+
+if __name__ == '__main__':
+    main()
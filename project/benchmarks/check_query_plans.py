@@ -0,0 +1,223 @@
+"""
+Query-plan regression check.
+
+Seeds a scratch SQLite database, calls each API endpoint through the Flask
+test client, captures every SQL statement it runs and asks SQLite for its
+EXPLAIN QUERY PLAN. Exits non-zero if any statement falls back to a full
+scan of a table that the endpoint is not expected to read in full.
+
+Usage (from the project/ directory):
+    python benchmarks/check_query_plans.py [--verbose]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Point the app at a throwaway database before importing it
+DB_DIR = tempfile.mkdtemp(prefix='parking_plans_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(DB_DIR, 'plans.sqlite')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event  # noqa: E402
+
+from main import (app, db, User, ParkingLot, ParkingSpot, Booking, Billing,  # noqa: E402
+                  gate_event_applier, rebuild_revenue_rollup)
+
+LOTS, SPOTS_PER_LOT, USERS, BOOKINGS = 20, 50, 50, 5000
+
+# "SCAN booking" / "SCAN booking_1 USING INDEX ..." (ORM aliases get a _N suffix)
+SCAN_RE = re.compile(r'^SCAN (\w+?)(?:_\d+)?(?:\s|$)')
+
+
+
+def uses_partial_index(detail):
+    """A scan of a partial index (e.g. open lot deletion jobs) only reads the rows it covers."""
+    return any(f'USING INDEX {name}' in detail or f'USING COVERING INDEX {name}' in detail
+               for name in PARTIAL_INDEXES)
+
+
+PARTIAL_INDEXES = {
+    index.name for table in db.metadata.tables.values() for index in table.indexes
+    if index.dialect_options['sqlite'].get('where') is not None
+}
+
+# (method, url, json body, tables the endpoint may legitimately read in full)
+# Listing every lot is inherently a full read of parking_lot, and an unfiltered
+# profit summary aggregates the whole (small) rollup table.
+CASES = [
+    ('GET', '/api/lots?view=summary', None, {'parking_lot'}),
+    ('GET', '/api/lots', None, {'parking_lot', 'parking_spot'}),
+    ('GET', '/api/lots?lot_ids=3,4', None, set()),
+    ('GET', '/api/lots?lot_ids=3&view=summary', None, set()),
+    ('GET', '/api/my-bookings/7', None, set()),
+    ('GET', '/api/my-bookings/7?limit=20', None, set()),
+    ('GET', '/api/user-summary/7', None, set()),
+    ('GET', '/api/user-summary/7?limit=20', None, set()),
+    ('GET', '/api/summary/profit-by-lot', None, {'lot_revenue_daily', 'parking_lot'}),
+    ('GET', '/api/summary/profit-by-lot?from={recent}&to={today}', None, set()),
+    ('GET', '/api/summary/profit-by-lot?from={recent}&granularity=week', None, set()),
+    ('GET', '/api/user-details/7', None, set()),
+    # Search reads the lot catalog into memory once, then only the FTS index and the page
+    ('GET', '/api/lots/search?q=main', None, {'parking_lot', 'parking_spot'}),
+    ('GET', '/api/lots/search?q=lot 3&pincode=5600&min_free_spots=1', None, set()),
+    ('POST', '/api/book-spot', {'spot_id': '{free_spot}', 'user_id': 7, 'vehicle_number': 'PLAN1'}, set()),
+    ('POST', '/api/lots/5/auto-book', {'user_id': 8, 'vehicle_number': 'PLAN2'}, set()),
+    ('POST', '/api/release-spot/{active_booking}', None, set()),
+    ('POST', '/user-login-api', {'username': 'user7@example.com', 'password': 'wrong-password'}, set()),
+    ('PUT', '/api/lots/6', {'name': 'Renamed', 'maxSpots': SPOTS_PER_LOT + 5}, set()),
+    ('PUT', '/api/lots/6', {'maxSpots': SPOTS_PER_LOT}, set()),
+    ('PUT', '/api/lots/7', {'maxSpots': SPOTS_PER_LOT - 5}, set()), # Archives the removed spots' history
+    ('PUT', '/api/lots/4/tariff', {'peakStartHour': 8, 'peakEndHour': 11, 'peakMultiplier': 1.5}, set()),
+    # Re-billing loads every lot's tariff once
+    ('POST', '/api/admin/rebill', {'from': '{recent}', 'to': '{today}'}, {'parking_lot', 'tariff_plan'}),
+    # The first report sweeps the whole booking history into hourly buckets once;
+    # later ones read the buckets and sweep only the current hour
+    ('GET', '/api/analytics/occupancy?from={recent}', None,
+     {'parking_lot', 'booking', 'parking_spot', 'booking_archive', 'lot_occupancy_watermark'}),
+    ('GET', '/api/analytics/occupancy?from={recent}&granularity=day', None, {'parking_lot', 'lot_occupancy_watermark'}),
+    ('GET', '/api/analytics/occupancy?lot_ids=3,4&granularity=hour', None, {'lot_occupancy_watermark'}),
+    ('POST', '/api/book-spot', {'spot_id': '{reserve_spot}', 'user_id': 7, 'vehicle_number': 'PLAN3',
+                                'start_time': '{soon}', 'end_time': '{later}'}, set()),
+    ('POST', '/api/book-spot', {'spot_id': '{reserve_spot}', 'user_id': 8, 'vehicle_number': 'PLAN4',
+                                'start_time': '{later}', 'end_time': '{latest}'}, set()),
+    ('GET', '/api/lots/20/availability?start_time={soon}&end_time={latest}', None, set()),
+    ('GET', '/api/my-reservations/7', None, set()),
+    ('POST', '/api/reservations/1/check-in', None, set()),
+    ('POST', '/api/reservations/2/cancel', None, set()),
+    ('POST', '/api/gate-events', {'events': [
+        {'event_id': 'plan-1', 'lot_id': 5, 'vehicle_number': 'GATE1', 'timestamp': '{soon}', 'direction': 'entry'},
+        {'event_id': 'plan-2', 'lot_id': 5, 'vehicle_number': 'PLAN2', 'timestamp': '{soon}', 'direction': 'exit'},
+    ]}, set()),
+    ('GET', '/api/gate-events/status', None, set()),
+]
+
+
+def seed():
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        random.seed(42)
+
+        users = [User(username=f'user{i}@example.com', role='User', full_name=f'User {i}', password_hash='x')
+                 for i in range(1, USERS + 1)]
+        db.session.add_all(users)
+        db.session.flush()
+
+        lots = [ParkingLot(name=f'Lot {i}', address=f'{i} Main St', pincode=f'5600{i:02d}',
+                           price_per_hour=10 + i, max_spots=SPOTS_PER_LOT) for i in range(1, LOTS + 1)]
+        db.session.add_all(lots)
+        db.session.flush()
+        db.session.execute(ParkingSpot.__table__.insert(), [
+            {'lot_id': lot.id, 'spot_number': str(n), 'is_occupied': False}
+            for lot in lots for n in range(1, SPOTS_PER_LOT + 1)
+        ])
+        spot_ids = [spot_id for (spot_id,) in db.session.query(ParkingSpot.id)]
+
+        now = datetime.utcnow()
+        bookings, bills = [], []
+        for booking_id in range(1, BOOKINGS + 1):
+            start = now - timedelta(hours=random.randint(2, 24 * 365))
+            end = start + timedelta(hours=random.randint(1, 8))
+            bookings.append({'id': booking_id, 'spot_id': random.choice(spot_ids),
+                             'customer_id': random.choice(users).id, 'vehicle_number': f'KA{booking_id:05d}',
+                             'start_time': start, 'end_time': end, 'status': 'Completed'})
+            bills.append({'booking_id': booking_id, 'status': 'Completed',
+                          'final_cost': 10.0 * random.randint(1, 8), 'billing_time': end})
+        db.session.execute(Booking.__table__.insert(), bookings)
+        db.session.execute(Billing.__table__.insert(), bills)
+        db.session.commit()
+        rebuild_revenue_rollup()
+
+    client = app.test_client()
+    active = client.post('/api/book-spot', json={'spot_id': spot_ids[0], 'user_id': 7, 'vehicle_number': 'ACTIVE'})
+    return {
+        'free_spot': spot_ids[-1],
+        'active_booking': active.get_json()['booking_id'],
+        'today': now.date().isoformat(),
+        'recent': (now - timedelta(days=30)).date().isoformat(),
+        'reserve_spot': spot_ids[-2],
+        'soon': (now + timedelta(minutes=5)).isoformat(),
+        'later': (now + timedelta(hours=2)).isoformat(),
+        'latest': (now + timedelta(hours=4)).isoformat(),
+    }
+
+
+def fill(value, params):
+    if isinstance(value, str):
+        return value.format(**params)
+    if isinstance(value, dict):
+        return {key: fill(item, params) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill(item, params) for item in value]
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--verbose', action='store_true', help='print every statement and its plan')
+    args = parser.parse_args()
+
+    params = seed()
+    client = app.test_client()
+    tables = set(db.metadata.tables)
+    captured = []
+
+    with app.app_context():
+        engine = db.engine
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            verb = statement.lstrip().split(None, 1)[0].upper()
+            if not executemany and verb in ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH'):
+                captured.append((statement, parameters))
+
+        client.get('/api/lots?view=summary') # Warm the occupancy index (a one-off full read)
+        event.listen(engine, 'before_cursor_execute', capture)
+
+        failures = 0
+        for method, url, body, allowed in CASES:
+            url, body = fill(url, params), fill(body, params)
+            captured.clear()
+            response = client.open(url, method=method, json=body)
+            while gate_event_applier._thread is not None: # Count the background apply with its request
+                time.sleep(0.01)
+            statements = list(captured)
+
+            problems = []
+            with engine.connect() as conn:
+                for statement, parameters in statements:
+                    plan = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+                    details = [row[-1] for row in plan]
+                    scans = {m.group(1) for m in map(SCAN_RE.match, details)
+                             if m and not uses_partial_index(m.string)} & tables
+                    bad = scans - allowed
+                    if bad:
+                        problems.append((statement, details, bad))
+                    if args.verbose:
+                        print(f'    {" ".join(statement.split())[:160]}')
+                        for detail in details:
+                            print(f'      {detail}')
+
+            status = 'FAIL' if problems else 'ok'
+            print(f'{status:4} {method:6} {url} -> {response.status_code} ({len(statements)} statements)')
+            for statement, details, bad in problems:
+                failures += 1
+                print(f'     full scan of {", ".join(sorted(bad))}:')
+                print(f'       {" ".join(statement.split())[:300]}')
+                for detail in details:
+                    print(f'         {detail}')
+
+        event.remove(engine, 'before_cursor_execute', capture)
+
+    if failures:
+        print(f'\n{failures} statement(s) fall back to a full table scan.')
+        sys.exit(1)
+    print('\nAll queries use indexes.')
+
+
+if __name__ == '__main__':
+    main()
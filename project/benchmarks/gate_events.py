@@ -0,0 +1,337 @@
+"""
+Gate sensor ingestion load test.
+
+  1. Simulates vehicles entering and leaving lots over the last two hours
+     and sends the event stream to POST /api/gate-events in batches from
+     several threads, each a gate cluster sending its lots' events in
+     order, while gate_event_applier turns the journal into
+     bookings and bills in the background. Reports the sustained
+     ingestion rate, how far the applier fell behind, and the end-to-end
+     rate until the journal is drained.
+  2. Checks the result: one booking per stay with the sensor timestamps,
+     bills priced like release_spot, spots occupied exactly by the open
+     stays, and the revenue rollup equal to the bills.
+  3. Replays: resends a share of the batches (all journaled once, nothing
+     changes), and makes an apply transaction fail halfway (its events
+     stay pending and are applied exactly once on the next run, which the
+     background applier retries by itself).
+  4. Sends an exit before its entry: the exit is parked and closes the
+     stay once the entry arrives; one whose entry never comes is ignored
+     after GATE_EXIT_REORDER_MINUTES.
+  5. For comparison, drives the same kind of traffic through
+     /api/lots/<id>/auto-book and /api/release-spot, one request per event.
+
+Usage (from the project/ directory):
+    python benchmarks/gate_events.py --vehicles 50000 --threads 8 --batch 500
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+DB_DIR = tempfile.mkdtemp(prefix='parking_gates_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(DB_DIR, 'bench.sqlite')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from main import (app, db, Billing, Booking, GateEvent, LotRevenueDaily, ParkingSpot, User,  # noqa: E402
+                  calculate_bill, gate_event_applier, get_lot_tariff)
+
+
+def setup(lots, spots_per_lot):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(username='gates@example.com', role='User', full_name='Gate Bench', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    client = app.test_client()
+    lot_ids = [client.post('/api/lots', json={
+        'name': f'Gate Lot {n}', 'address': 'Bench Road', 'pincode': '000000', 'price': 10 + n,
+        'maxSpots': spots_per_lot
+    }).get_json()['id'] for n in range(lots)]
+    return user_id, lot_ids
+
+
+def simulate(lot_ids, vehicles, now):
+    """Time-ordered events and the expected stays {vehicle_number: (lot_id, entry, exit or None)}."""
+    stays, events = {}, []
+    for n in range(vehicles):
+        vehicle_number = f'GT{n:06d}'
+        lot_id = random.choice(lot_ids)
+        entry = now - timedelta(seconds=random.uniform(10 * 60, 2 * 3600))
+        leave = entry + timedelta(seconds=random.uniform(10 * 60, 40 * 60))
+        leave = leave if leave < now - timedelta(minutes=1) else None
+        stays[vehicle_number] = (lot_id, entry, leave)
+        events.append((entry, {'event_id': f'{lot_id}-{n}-in', 'lot_id': lot_id, 'vehicle_number': vehicle_number,
+                               'timestamp': entry.isoformat() + 'Z', 'direction': 'entry'}))
+        if leave:
+            events.append((leave, {'event_id': f'{lot_id}-{n}-out', 'lot_id': lot_id,
+                                   'vehicle_number': vehicle_number.lower(), # Sensors disagree on case
+                                   'timestamp': leave.isoformat() + 'Z', 'direction': 'exit'}))
+    events.sort(key=lambda event: event[0])
+    return stays, [event for _, event in events]
+
+
+def pending_events():
+    with app.app_context():
+        try:
+            return GateEvent.query.filter(GateEvent.status == 'pending').count()
+        finally:
+            db.session.remove()
+
+
+def cluster_batches(events, threads, batch_size):
+    """Splits the events into one time-ordered list of batches per gate cluster (lots dealt round-robin)."""
+    streams = [[] for _ in range(threads)]
+    for event in events:
+        streams[event['lot_id'] % threads].append(event)
+    return [[stream[i:i + batch_size] for i in range(0, len(stream), batch_size)] for stream in streams]
+
+
+def send(clusters):
+    """Posts each cluster's batches in order, clusters in parallel; returns (seconds, accepted, duplicates, max pending seen)."""
+    totals = {'accepted': 0, 'duplicates': 0, 'max_pending': 0}
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def post(batches):
+        client = app.test_client()
+        for batch in batches:
+            result = client.post('/api/gate-events', json={'events': batch})
+            assert result.status_code == 202, result.get_json()
+            body = result.get_json()
+            assert body['rejected'] == 0, body['errors'][:3]
+            with lock:
+                totals['accepted'] += body['accepted']
+                totals['duplicates'] += body['duplicates']
+
+    def watch():
+        while not done.wait(0.25):
+            totals['max_pending'] = max(totals['max_pending'], pending_events())
+
+    watcher = threading.Thread(target=watch)
+    watcher.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(clusters)) as pool:
+        list(pool.map(post, clusters))
+    elapsed = time.perf_counter() - started
+    done.set()
+    watcher.join()
+    return elapsed, totals['accepted'], totals['duplicates'], totals['max_pending']
+
+
+def wait_for_applier(timeout=600):
+    deadline = time.time() + timeout
+    while pending_events() or gate_event_applier._thread is not None:
+        assert time.time() < deadline, 'the applier did not drain the journal'
+        time.sleep(0.05)
+
+
+def state_summary():
+    with app.app_context():
+        return (
+            Booking.query.count(),
+            Booking.query.filter(Booking.status == 'Active').count(),
+            ParkingSpot.query.filter(ParkingSpot.is_occupied == True).count(),
+            round(db.session.query(db.func.sum(Billing.final_cost)).scalar() or 0, 6),
+            round(db.session.query(db.func.sum(LotRevenueDaily.total_revenue)).scalar() or 0, 6),
+            db.session.query(db.func.sum(LotRevenueDaily.bill_count)).scalar() or 0,
+        )
+
+
+def check(stays):
+    with app.app_context():
+        ignored = GateEvent.query.filter(GateEvent.status != 'applied').count()
+        assert ignored == 0, f'{ignored} events were not applied'
+        rows = db.session.query(Booking.vehicle_number, ParkingSpot.lot_id, Booking.start_time, Booking.end_time,
+                                Booking.status, Billing.final_cost).join(
+            ParkingSpot, ParkingSpot.id == Booking.spot_id).join(Billing, Billing.booking_id == Booking.id).all()
+        assert len(rows) == len(stays), (len(rows), len(stays))
+        for vehicle_number, lot_id, start, end, status, cost in rows:
+            expected_lot, entry, leave = stays[vehicle_number]
+            assert (lot_id, start, end) == (expected_lot, entry, leave), (vehicle_number, start, end)
+            assert status == ('Completed' if leave else 'Active')
+            if leave:
+                assert cost == calculate_bill(entry, leave, get_lot_tariff(lot_id).tariff)[1]
+        bookings, active, occupied, billed, revenue, bill_count = state_summary()
+        assert active == occupied, (active, occupied)
+        assert abs(billed - revenue) < 1e-6 and bill_count == bookings - active, (billed, revenue, bill_count)
+        clashes = db.session.query(Booking.spot_id).filter(Booking.status == 'Active').group_by(
+            Booking.spot_id).having(db.func.count() > 1).count()
+        assert clashes == 0
+    print(f"  {len(stays)} stays booked with the sensor timestamps, {active} still inside; "
+          f"bills, spots and revenue rollup consistent")
+
+
+def check_crash_replay(lot_ids):
+    """An apply transaction that fails halfway leaves its events pending; the next run applies them once."""
+    now = datetime.utcnow()
+    batch = []
+    for n in range(200):
+        lot_id = random.choice(lot_ids)
+        entry = now - timedelta(minutes=30)
+        batch.append({'event_id': f'crash-{n}-in', 'lot_id': lot_id, 'vehicle_number': f'CR{n:04d}',
+                      'timestamp': entry.isoformat(), 'direction': 'entry'})
+        if n % 2:
+            batch.append({'event_id': f'crash-{n}-out', 'lot_id': lot_id, 'vehicle_number': f'CR{n:04d}',
+                          'timestamp': (entry + timedelta(minutes=20)).isoformat(), 'direction': 'exit'})
+    before = state_summary()
+    record_revenue = main.record_revenue
+
+    def crash(*args, **kwargs):
+        raise RuntimeError('simulated crash')
+
+    main.record_revenue = crash
+    try:
+        with app.app_context():
+            with gate_event_applier._lock: # Keep the background applier out of it
+                gate_event_applier._thread = threading.current_thread()
+            app.test_client().post('/api/gate-events', json={'events': batch})
+            assert gate_event_applier.run_pending() == 0
+            assert state_summary() == before, 'a failed apply must not write anything'
+            assert pending_events() == len(batch)
+    finally:
+        main.record_revenue = record_revenue
+        with gate_event_applier._lock:
+            gate_event_applier._thread = None
+    with app.app_context():
+        assert gate_event_applier.run_pending() == len(batch)
+        assert gate_event_applier.run_pending() == 0
+        count = Booking.query.filter(Booking.vehicle_number.like('CR%')).count()
+        assert count == 200, count
+    after = state_summary()
+    assert after[0] == before[0] + 200 and after[1] == before[1] + 100
+    print("  a failed apply leaves its events pending; the next run applies each of them once")
+
+    failures = [RuntimeError('database is locked')]
+
+    def flaky(*args, **kwargs):
+        if failures:
+            raise failures.pop()
+        return record_revenue(*args, **kwargs)
+
+    main.record_revenue = flaky
+    try:
+        retry = [{**item, 'event_id': 'retry-' + item['event_id'], 'vehicle_number': 'RT' + item['vehicle_number']}
+                 for item in batch]
+        app.test_client().post('/api/gate-events', json={'events': retry})
+        wait_for_applier() # No further events arrive to wake it
+    finally:
+        main.record_revenue = record_revenue
+    assert not failures and state_summary()[0] == after[0] + 200
+    print("  the background applier retries a failed batch without waiting for new events")
+
+
+def event(event_id, lot_id, vehicle_number, moment, direction):
+    return {'event_id': event_id, 'lot_id': lot_id, 'vehicle_number': vehicle_number,
+            'timestamp': moment.isoformat() + 'Z', 'direction': direction}
+
+
+def event_status(event_id):
+    with app.app_context():
+        try:
+            return db.session.query(GateEvent.status).filter(GateEvent.event_id == event_id).scalar()
+        finally:
+            db.session.remove()
+
+
+def check_out_of_order(lot_id):
+    """An exit journaled before its entry waits for it; one whose entry never comes is dropped later."""
+    client = app.test_client()
+    now = datetime.utcnow()
+    entry, leave = now - timedelta(minutes=50), now - timedelta(minutes=20)
+    client.post('/api/gate-events', json={'events': [event('late-1-out', lot_id, 'LATE1', leave, 'exit')]})
+    wait_for_applier()
+    assert event_status('late-1-out') == 'parked'
+    assert client.get('/api/gate-events/status').get_json()['parked'] == 1
+    client.post('/api/gate-events', json={'events': [event('late-1-in', lot_id, 'LATE1', entry, 'entry')]})
+    wait_for_applier()
+    assert event_status('late-1-out') == event_status('late-1-in') == 'applied'
+    with app.app_context():
+        booking = Booking.query.filter(Booking.vehicle_number == 'LATE1').one()
+        assert (booking.status, booking.start_time, booking.end_time) == ('Completed', entry, leave)
+        assert not db.session.get(ParkingSpot, booking.spot_id).is_occupied
+
+    client.post('/api/gate-events', json={'events': [event('late-2-out', lot_id, 'LATE2', leave, 'exit')]})
+    wait_for_applier()
+    with app.app_context(): # Received longer ago than the reorder window
+        GateEvent.query.filter(GateEvent.event_id == 'late-2-out').update({'received_at': now - timedelta(
+            minutes=app.config['GATE_EXIT_REORDER_MINUTES'] + 1)})
+        db.session.commit()
+    client.post('/api/gate-events', json={'events': [event('late-3-in', lot_id, 'LATE3', entry, 'entry')]})
+    wait_for_applier()
+    assert event_status('late-2-out') == 'ignored'
+    print("  an exit sent before its entry closes the stay when the entry arrives; "
+          "one without an entry is ignored after the reorder window")
+
+
+def per_request_baseline(user_id, lot_ids, events, threads):
+    """Entries via auto-book and exits via release-spot: one request and one commit per event."""
+    bookings = {}
+
+    def entry(n):
+        response = app.test_client().post(f'/api/lots/{lot_ids[n % len(lot_ids)]}/auto-book',
+                                          json={'user_id': user_id, 'vehicle_number': f'BL{n:05d}'})
+        bookings[n] = response.get_json()['booking_id']
+
+    def leave(n):
+        assert app.test_client().post(f'/api/release-spot/{bookings[n]}').status_code == 200
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(entry, range(events // 2)))
+        list(pool.map(leave, range(events // 2)))
+    return events / (time.perf_counter() - started)
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--lots', type=int, default=40)
+    parser.add_argument('--spots-per-lot', type=int, default=500)
+    parser.add_argument('--vehicles', type=int, default=50000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--batch', type=int, default=500)
+    parser.add_argument('--baseline-events', type=int, default=4000)
+    args = parser.parse_args()
+    random.seed(11)
+
+    user_id, lot_ids = setup(args.lots, args.spots_per_lot)
+    stays, events = simulate(lot_ids, args.vehicles, datetime.utcnow())
+    clusters = cluster_batches(events, args.threads, args.batch)
+    print(f"{len(events)} events from {args.vehicles} vehicles in {args.lots} lots, "
+          f"batches of {args.batch} from {args.threads} gate clusters")
+
+    started = time.perf_counter()
+    elapsed, accepted, duplicates, max_pending = send(clusters)
+    assert (accepted, duplicates) == (len(events), 0)
+    wait_for_applier()
+    drained = time.perf_counter() - started
+    print(f"  ingestion: {len(events) / elapsed:,.0f} events/s journaled ({elapsed:.1f}s)")
+    print(f"  applied:   {len(events) / drained:,.0f} events/s end to end ({drained:.1f}s until the journal "
+          f"was drained, at most {max_pending} events pending)")
+    check(stays)
+
+    before = state_summary()
+    replayed = [random.sample(batches, max(1, len(batches) // 10)) for batches in clusters if batches]
+    _, accepted, duplicates, _ = send(replayed)
+    wait_for_applier()
+    assert accepted == 0 and duplicates == sum(len(batch) for batches in replayed for batch in batches)
+    assert state_summary() == before
+    print(f"  {duplicates} resent events journaled once, nothing changed")
+    check_crash_replay(lot_ids)
+    check_out_of_order(lot_ids[0])
+
+    rate = per_request_baseline(user_id, lot_ids, args.baseline_events, args.threads)
+    print(f"Per-request baseline (auto-book + release-spot): {rate:,.0f} events/s")
+    print("OK")
+
+
+if __name__ == '__main__':
+    main_()
@@ -0,0 +1,98 @@
+"""
+Hot/cold booking history check.
+
+Seeds a database, records the history endpoints' responses (full lists
+and every page of the paginated walk), the export and the profit report,
+runs compact_booking_history, and checks every response is unchanged
+while the live booking table shrank. Also times a few hot-path requests
+before and after.
+
+Usage (from the project/ directory):
+    python benchmarks/history_compaction.py --years 2 --older-than-days 30
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(
+    tempfile.mkdtemp(prefix='parking_compaction_'), 'bench.sqlite')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from main import app, db, ArchivedBooking, Booking, compact_booking_history, rebuild_revenue_rollup  # noqa: E402
+import seed_data  # noqa: E402
+
+SAMPLE_USERS = 20
+
+
+def walk(client, url, limit):
+    """Returns every page of a paginated endpoint as a list of JSON bodies."""
+    pages, cursor = [], None
+    while True:
+        page = client.get(f'{url}?limit={limit}' + (f'&after={cursor}' if cursor else '')).get_json()
+        pages.append(page)
+        cursor = page['next_cursor']
+        if not cursor:
+            return pages
+
+
+def snapshot(client, users):
+    responses = {}
+    for user_id in users:
+        for url in (f'/api/my-bookings/{user_id}', f'/api/user-summary/{user_id}'):
+            responses[url] = client.get(url).get_data()
+            responses[url + ' pages'] = walk(client, url, 7)
+    responses['export'] = client.get('/api/admin/export/bookings?format=ndjson').get_data()
+    responses['profit'] = client.get('/api/summary/profit-by-lot?granularity=month').get_data()
+    return responses
+
+
+def time_requests(client, users, rounds=5):
+    timings = []
+    for _ in range(rounds):
+        for user_id in users:
+            for url in (f'/api/my-bookings/{user_id}?limit=20', '/api/lots'):
+                started = time.perf_counter()
+                client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    seed_data.add_arguments(parser)
+    parser.add_argument('--older-than-days', type=int, default=30)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    with app.app_context():
+        seed_data.generate_from_args(args)
+        users = list(range(1, min(SAMPLE_USERS, args.users) + 1))
+        before = snapshot(client, users)
+        hot_before = time_requests(client, users)
+        live_before = Booking.query.count()
+
+        started = time.perf_counter()
+        archived = compact_booking_history(args.older_than_days, app.config['COMPACTION_CHUNK_SIZE'])
+        elapsed = time.perf_counter() - started
+        live_after = Booking.query.count()
+        assert ArchivedBooking.query.count() == archived == live_before - live_after
+
+        after = snapshot(client, users)
+        hot_after = time_requests(client, users)
+        rebuild_revenue_rollup()
+        rebuilt = client.get('/api/summary/profit-by-lot?granularity=month').get_data()
+
+    print(f"Archived {archived} bookings in {elapsed:.1f}s; live table {live_before} -> {live_after} rows")
+    print(f"Hot-path request median: {hot_before:.1f} ms -> {hot_after:.1f} ms")
+    changed = [key for key in before if before[key] != after[key]]
+    assert not changed, f"Responses changed after compaction: {changed[:5]}"
+    assert rebuilt == before['profit'], "Rebuilt rollup differs"
+    print(f"All {len(before)} responses identical after compaction.")
+
+
+if __name__ == '__main__':
+    main()
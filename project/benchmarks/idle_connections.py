@@ -0,0 +1,159 @@
+"""
+Concurrency test for server.py: many idle connections on one process.
+
+Starts `python server.py` on a seeded throwaway database, then:
+  1. opens --connections client connections, half of them idle
+     keep-alive connections (after one request) and half open
+     /api/lots/stream event streams;
+  2. with all of them open, times the read APIs and a book + release;
+  3. checks every stream received the resulting spot events;
+  4. reports the server's thread count and memory (from /proc).
+
+Usage (from the project/ directory):
+    python benchmarks/idle_connections.py --connections 4000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def http(reader, writer, method, path, body=None):
+    """Sends one request on an open connection and returns (status, body)."""
+    data = json.dumps(body).encode() if body is not None else b''
+    head = f'{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(data)}\r\n'
+    if body is not None:
+        head += 'Content-Type: application/json\r\n'
+    writer.write(head.encode() + b'\r\n' + data)
+    await writer.drain()
+    status, headers = await read_head(reader)
+    if headers.get('transfer-encoding') == 'chunked':
+        chunks = []
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            chunk = await reader.readexactly(size + 2)
+            if size == 0:
+                break
+            chunks.append(chunk[:-2])
+        return status, b''.join(chunks)
+    return status, await reader.readexactly(int(headers.get('content-length', 0)))
+
+
+async def read_head(reader):
+    lines = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        if name:
+            headers[name.strip().lower()] = value.strip()
+    return int(lines[0].split(' ')[1]), headers
+
+
+async def open_idle(port, path):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    status, _ = await http(reader, writer, 'GET', path)
+    assert status == 200, status
+    return reader, writer
+
+
+async def open_stream(port):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b'GET /api/lots/stream HTTP/1.1\r\nHost: localhost\r\n\r\n')
+    await writer.drain()
+    status, headers = await read_head(reader)
+    assert status == 200 and headers['content-type'].startswith('text/event-stream'), (status, headers)
+    return reader, writer
+
+
+async def wait_for_event(reader, event, timeout):
+    buffer = b''
+    deadline = time.monotonic() + timeout
+    while f'event: {event}'.encode() not in buffer:
+        buffer += await asyncio.wait_for(reader.read(65536), deadline - time.monotonic())
+    return True
+
+
+def proc_status(pid):
+    fields = {}
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            name, _, value = line.partition(':')
+            fields[name] = value.strip()
+    return int(fields['Threads']), fields['VmRSS']
+
+
+async def run(port, pid, connections, batch):
+    idle, streams = [], []
+    started = time.perf_counter()
+    for offset in range(0, connections, batch):
+        size = min(batch, connections - offset)
+        idle += await asyncio.gather(*(open_idle(port, '/api/lots?view=summary') for _ in range(size // 2)))
+        streams += await asyncio.gather(*(open_stream(port) for _ in range(size - size // 2)))
+    print(f"Opened {len(idle)} keep-alive + {len(streams)} stream connections in {time.perf_counter() - started:.1f}s")
+    threads, rss = proc_status(pid)
+    print(f"Server process: {threads} threads, {rss} resident")
+
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    timings = {}
+    for _ in range(20):
+        for path in ('/api/lots?view=summary', '/api/my-bookings/1?limit=20', '/api/user-summary/1?limit=20',
+                     '/api/summary/profit-by-lot'):
+            request_started = time.perf_counter()
+            status, _ = await http(reader, writer, 'GET', path)
+            assert status == 200, (path, status)
+            timings.setdefault(path, []).append((time.perf_counter() - request_started) * 1000)
+
+    _, body = await http(reader, writer, 'GET', '/api/lots?view=summary')
+    lot = next(lot for lot in json.loads(body) if lot['occupied'] < lot['maxSpots'])
+    request_started = time.perf_counter()
+    status, body = await http(reader, writer, 'POST', f"/api/lots/{lot['id']}/auto-book",
+                              {'user_id': 1, 'vehicle_number': 'IDLE1'})
+    assert status == 201, (status, body)
+    status, body = await http(reader, writer, 'POST', f"/api/release-spot/{json.loads(body)['booking_id']}")
+    assert status == 200, (status, body)
+    timings['book + release'] = [(time.perf_counter() - request_started) * 1000]
+    for path, values in timings.items():
+        print(f"  {path:32} median {statistics.median(values):6.1f} ms  max {max(values):6.1f} ms")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(wait_for_event(stream_reader, 'spot', 30) for stream_reader, _ in streams))
+    print(f"All {len(streams)} streams received the spot events within {time.perf_counter() - started:.2f}s")
+
+    threads, rss = proc_status(pid)
+    print(f"Server process afterwards: {threads} threads, {rss} resident")
+    for _, stream_writer in idle + streams:
+        stream_writer.close()
+    writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--connections', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=200, help='connections opened concurrently')
+    args = parser.parse_args()
+
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(
+        tempfile.mkdtemp(prefix='parking_idle_'), 'bench.sqlite'), PASSWORD_HASH_WORKERS='0')
+    subprocess.run([sys.executable, 'benchmarks/seed_data.py', '--lots', '10', '--spots-per-lot', '20',
+                    '--users', '50', '--years', '0.2'], cwd=PROJECT_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+    server = subprocess.Popen([sys.executable, 'server.py', '--port', '0'], cwd=PROJECT_DIR, env=env,
+                              stdout=subprocess.PIPE, text=True)
+    try:
+        line = server.stdout.readline()
+        assert line.startswith('Serving on'), line
+        port = int(line.split(':')[2].split(' ')[0])
+        asyncio.run(run(port, server.pid, args.connections, args.batch))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+if __name__ == '__main__':
+    main()
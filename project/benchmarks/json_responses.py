@@ -0,0 +1,120 @@
+"""
+Per-endpoint micro-benchmark of response building and JSON encoding.
+
+Seeds a throwaway database (with some history archived), then for each
+read endpoint:
+  1. requests it with Flask's default JSON provider (json module; its
+     datetime hook set to ISO 8601, as in serialization.py) and with
+     serialization.JSONProvider and checks the bodies are byte-identical;
+  2. reports the median request time with each provider, and the time to
+     encode the response alone with json and with serialization.dumps.
+Also checks the column projections of GET /api/lots against the ORM
+to_dict() output and times both.
+
+Usage (from the project/ directory):
+    python benchmarks/json_responses.py --years 1
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(
+    tempfile.mkdtemp(prefix='parking_json_'), 'bench.sqlite')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+from main import (app, db, ParkingLot, ParkingSpot, compact_booking_history, lot_row_dict,  # noqa: E402
+                  occupancy_index, spot_dicts_by_lot, LOT_COLUMNS)
+from serialization import JSONProvider, dumps, iso_default, orjson  # noqa: E402
+import seed_data  # noqa: E402
+
+ENDPOINTS = [
+    '/api/lots',
+    '/api/lots?view=summary',
+    '/api/lots/search?sort=price&limit=100',
+    '/api/my-bookings/{user_id}',
+    '/api/my-bookings/{user_id}?limit=50',
+    '/api/user-summary/{user_id}',
+    '/api/user-summary/{user_id}?limit=50',
+    '/api/summary/profit-by-lot',
+    '/api/summary/profit-by-lot?granularity=day',
+]
+
+
+def median_ms(function, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def check_lot_projections(runs):
+    def orm():
+        occupied = occupancy_index.occupied_counts()
+        spots_by_lot = {}
+        for spot in ParkingSpot.query.order_by(ParkingSpot.lot_id, ParkingSpot.id).all():
+            spots_by_lot.setdefault(spot.lot_id, []).append(spot)
+        result = [lot.to_dict(occupied=occupied.get(lot.id, 0), spots=spots_by_lot.get(lot.id, []))
+                  for lot in ParkingLot.query.order_by(ParkingLot.id).all()]
+        db.session.expunge_all() # Measure hydration, not identity-map hits
+        return result
+
+    def projected():
+        occupied = occupancy_index.occupied_counts()
+        spots_by_lot = spot_dicts_by_lot()
+        lots = [lot_row_dict(row, occupied.get(row.id, 0))
+                for row in db.session.query(*LOT_COLUMNS).order_by(ParkingLot.id)]
+        for lot in lots:
+            lot['spots'] = spots_by_lot.get(lot['id'], [])
+        return lots
+
+    assert orm() == projected(), 'Column projections differ from to_dict()'
+    print(f"GET /api/lots data: ORM to_dict {median_ms(orm, runs):.2f} ms, "
+          f"column projection {median_ms(projected, runs):.2f} ms (identical)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    seed_data.add_arguments(parser)
+    parser.add_argument('--runs', type=int, default=30)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    with app.app_context():
+        seed_data.generate_from_args(args)
+        compact_booking_history(90, app.config['COMPACTION_CHUNK_SIZE']) # Exercise the archive merges too
+        check_lot_projections(args.runs)
+
+    print(f"Encoder: {'orjson ' + orjson.__version__ if orjson else 'json (orjson not installed)'}")
+    print(f"{'endpoint':44} {'bytes':>8} {'flask json':>11} {'provider':>9} "
+          f"{'encode: json':>13} {'dumps':>7}")
+    flask_provider, fast_provider = DefaultJSONProvider(app), JSONProvider(app)
+    flask_provider.default = iso_default # Handlers return datetimes for the encoder to write
+    for endpoint in ENDPOINTS:
+        url = endpoint.format(user_id=7)
+        app.json = flask_provider
+        expected = client.get(url)
+        assert expected.status_code == 200, (url, expected.status_code)
+        flask_ms = median_ms(lambda: client.get(url), args.runs)
+        app.json = fast_provider
+        body = client.get(url).data
+        assert body == expected.data, f'{url}: response bytes differ'
+        fast_ms = median_ms(lambda: client.get(url), args.runs)
+
+        payload = json.loads(body)
+        json_ms = median_ms(lambda: json.dumps(payload, default=iso_default, sort_keys=True, separators=(',', ':')),
+                            args.runs)
+        dumps_ms = median_ms(lambda: dumps(payload), args.runs)
+        print(f"{url:44} {len(body):8} {flask_ms:8.2f} ms {fast_ms:6.2f} ms {json_ms:10.2f} ms {dumps_ms:4.2f} ms")
+    print("All responses byte-identical.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+"""
+In-process endpoint load driver.
+
+Seeds a scratch database with benchmarks/seed_data.py, then runs a
+workload mix through the Flask test client from a thread pool and reports
+per-endpoint p50/p95/p99 latency and throughput. Results can be saved as a
+named baseline (benchmarks/baselines/<name>.json) and later runs compared
+against it; the comparison exits non-zero when an endpoint's p95 grows by more than
+--tolerance (and --min-delta-ms). Baselines are only comparable on the same
+machine and data size.
+
+Workloads:
+  dashboard  user dashboard reads (lot summary, one lot's spots, history)
+  churn      book/release and auto-book/release cycles
+  admin      profit summaries, full lot listing, user summaries
+  mixed      all of the above, weighted like a normal day
+
+Usage (from the project/ directory):
+    python benchmarks/load_driver.py --workload mixed --duration 20 --save local
+    python benchmarks/load_driver.py --workload mixed --duration 20 --compare local
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(
+    tempfile.mkdtemp(prefix='parking_load_'), 'load.sqlite')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import seed_data  # noqa: E402
+from main import app  # noqa: E402
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+
+class Workload:
+    """Weighted endpoint actions over the seeded data. Each action returns [(label, seconds, status)]."""
+
+    def __init__(self, counts, spots_per_lot, rng):
+        self.lots = counts['lots']
+        self.users = counts['users']
+        self.spots = counts['spots']
+        self.spots_per_lot = spots_per_lot
+        self.rng = rng
+        self.today = date.today()
+
+    def call(self, client, label, method, url, **kwargs):
+        start = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        return (label, time.perf_counter() - start, response.status_code), response
+
+    # --- dashboard ---
+    def lot_summary(self, client):
+        return [self.call(client, 'GET /api/lots?view=summary', 'GET', '/api/lots?view=summary')[0]]
+
+    def lot_spots(self, client):
+        lot_id = self.rng.randint(1, self.lots)
+        return [self.call(client, 'GET /api/lots?lot_ids=<id>&view=full', 'GET', f'/api/lots?lot_ids={lot_id}&view=full')[0]]
+
+    def my_bookings(self, client):
+        user_id = self.rng.randint(1, self.users)
+        return [self.call(client, 'GET /api/my-bookings/<id>?limit=50', 'GET', f'/api/my-bookings/{user_id}?limit=50')[0]]
+
+    def user_details(self, client):
+        user_id = self.rng.randint(1, self.users)
+        return [self.call(client, 'GET /api/user-details/<id>', 'GET', f'/api/user-details/{user_id}')[0]]
+
+    # --- churn ---
+    def book_release(self, client):
+        spot_id = self.rng.randint(1, self.spots)
+        sample, response = self.call(client, 'POST /api/book-spot', 'POST', '/api/book-spot', json={
+            'spot_id': spot_id, 'user_id': self.rng.randint(1, self.users), 'vehicle_number': f'LOAD{spot_id}'})
+        samples = [sample]
+        if response.status_code == 201:
+            booking_id = response.get_json()['booking_id']
+            samples.append(self.call(client, 'POST /api/release-spot/<id>', 'POST', f'/api/release-spot/{booking_id}')[0])
+        return samples
+
+    def auto_book_release(self, client):
+        lot_id = self.rng.randint(1, self.lots)
+        sample, response = self.call(client, 'POST /api/lots/<id>/auto-book', 'POST', f'/api/lots/{lot_id}/auto-book', json={
+            'user_id': self.rng.randint(1, self.users), 'vehicle_number': f'AUTO{lot_id}'})
+        samples = [sample]
+        if response.status_code == 201:
+            booking_id = response.get_json()['booking_id']
+            samples.append(self.call(client, 'POST /api/release-spot/<id>', 'POST', f'/api/release-spot/{booking_id}')[0])
+        return samples
+
+    # --- admin ---
+    def profit(self, client):
+        return [self.call(client, 'GET /api/summary/profit-by-lot', 'GET', '/api/summary/profit-by-lot')[0]]
+
+    def profit_monthly(self, client):
+        since = (self.today - timedelta(days=365)).isoformat()
+        return [self.call(client, 'GET /api/summary/profit-by-lot?granularity=month', 'GET',
+                          f'/api/summary/profit-by-lot?from={since}&granularity=month')[0]]
+
+    def all_lots(self, client):
+        return [self.call(client, 'GET /api/lots', 'GET', '/api/lots')[0]]
+
+    def user_summary(self, client):
+        user_id = self.rng.randint(1, self.users)
+        return [self.call(client, 'GET /api/user-summary/<id>?limit=50', 'GET', f'/api/user-summary/{user_id}?limit=50')[0]]
+
+    def mix(self, name):
+        mixes = {
+            'dashboard': [(self.lot_summary, 4), (self.lot_spots, 3), (self.my_bookings, 2), (self.user_details, 1)],
+            'churn': [(self.book_release, 3), (self.auto_book_release, 1)],
+            'admin': [(self.profit, 3), (self.profit_monthly, 2), (self.all_lots, 1), (self.user_summary, 2)],
+            'mixed': [(self.lot_summary, 20), (self.lot_spots, 15), (self.my_bookings, 10), (self.user_details, 5),
+                      (self.book_release, 15), (self.auto_book_release, 5),
+                      (self.profit, 3), (self.profit_monthly, 2), (self.all_lots, 1), (self.user_summary, 2)],
+        }
+        actions, weights = zip(*mixes[name])
+        return actions, weights
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def run(workload_name, workload, threads, duration, seed):
+    actions, weights = workload.mix(workload_name)
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(worker_id):
+        rng = random.Random(seed * 1000 + worker_id)
+        client = app.test_client()
+        local = []
+        while time.perf_counter() < deadline:
+            action = rng.choices(actions, weights)[0]
+            local.extend(action(client))
+        with lock:
+            for label, seconds, status in local:
+                samples[label].append(seconds)
+                if status >= 500:
+                    errors[label] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    elapsed = time.perf_counter() - start
+
+    endpoints = {}
+    for label, values in sorted(samples.items()):
+        values.sort()
+        endpoints[label] = {
+            'count': len(values),
+            'errors': errors[label],
+            'rps': round(len(values) / elapsed, 1),
+            'p50_ms': round(percentile(values, 50) * 1000, 2),
+            'p95_ms': round(percentile(values, 95) * 1000, 2),
+            'p99_ms': round(percentile(values, 99) * 1000, 2),
+            'max_ms': round(values[-1] * 1000, 2),
+        }
+    total = sum(len(values) for values in samples.values())
+    return {'elapsed_s': round(elapsed, 2), 'requests': total, 'rps': round(total / elapsed, 1), 'endpoints': endpoints}
+
+
+def print_report(result):
+    print(f"\n{'endpoint':<52} {'count':>6} {'err':>4} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for label, row in result['endpoints'].items():
+        print(f"{label:<52} {row['count']:>6} {row['errors']:>4} {row['rps']:>7} "
+              f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} {row['max_ms']:>8}")
+    print(f"\n{result['requests']} requests in {result['elapsed_s']}s = {result['rps']} req/s (latencies in ms)")
+
+
+def compare(result, baseline, tolerance, min_delta_ms):
+    """Prints p50/p95 deltas against a baseline; returns the list of regressed endpoints."""
+    regressions = []
+    print(f"\nvs baseline '{baseline['name']}' ({baseline['meta']['recorded_at']}), tolerance {tolerance:.0%}:")
+    for label, row in result['endpoints'].items():
+        base = baseline['result']['endpoints'].get(label)
+        if base is None:
+            print(f"  {label:<52} new endpoint")
+            continue
+        delta = (row['p95_ms'] - base['p95_ms']) / base['p95_ms'] if base['p95_ms'] else 0
+        flag = ''
+        if delta > tolerance and row['p95_ms'] - base['p95_ms'] > min_delta_ms:
+            flag = '  REGRESSION'
+            regressions.append(label)
+        print(f"  {label:<52} p50 {base['p50_ms']:>7} -> {row['p50_ms']:<7} p95 {base['p95_ms']:>7} -> "
+              f"{row['p95_ms']:<7} ({delta:+.0%}){flag}")
+    base_rps = baseline['result']['rps']
+    print(f"  throughput {base_rps} -> {result['rps']} req/s ({(result['rps'] - base_rps) / base_rps:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workload', choices=['dashboard', 'churn', 'admin', 'mixed'], default='mixed')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20, help='seconds')
+    parser.add_argument('--warmup', type=float, default=2, help='seconds run before measuring')
+    parser.add_argument('--save', metavar='NAME', help='save the result as baselines/NAME.json')
+    parser.add_argument('--compare', metavar='NAME', help='compare with baselines/NAME.json')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 increase before failing')
+    parser.add_argument('--min-delta-ms', type=float, default=5, help='ignore p95 increases smaller than this')
+    seed_data.add_arguments(parser)
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f'{args.compare}.json')) as f:
+            baseline = json.load(f)
+
+    print(f"Seeding {app.config['SQLALCHEMY_DATABASE_URI']} ...")
+    start = time.perf_counter()
+    counts = seed_data.generate_from_args(args)
+    print(f"  {counts} in {time.perf_counter() - start:.1f}s")
+
+    app.logger.disabled = True
+    workload = Workload(counts, args.spots_per_lot, random.Random(args.seed))
+    if args.warmup:
+        run(args.workload, workload, args.threads, args.warmup, args.seed + 1)
+    result = run(args.workload, workload, args.threads, args.duration, args.seed)
+    print_report(result)
+
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f'{args.save}.json')
+        with open(path, 'w') as f:
+            json.dump({
+                'name': args.save,
+                'meta': {
+                    'recorded_at': datetime.utcnow().isoformat(timespec='seconds'),
+                    'workload': args.workload, 'threads': args.threads, 'duration': args.duration,
+                    'data': counts, 'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                    'cpus': os.cpu_count(), 'platform': platform.platform(),
+                },
+                'result': result,
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nSaved baseline {path}")
+
+    if baseline:
+        if baseline['meta']['workload'] != args.workload:
+            print(f"warning: baseline was recorded with workload '{baseline['meta']['workload']}'")
+        if baseline['meta']['data'] != counts:
+            print(f"warning: baseline was recorded with different data: {baseline['meta']['data']}")
+        regressions = compare(result, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} endpoint(s) regressed beyond {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
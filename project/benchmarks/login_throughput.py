@@ -0,0 +1,85 @@
+"""
+Login throughput benchmark for the password hashing pool.
+
+Seeds users with legacy (cheap pbkdf2) hashes, logs each one in once to
+check the transparent upgrade, then measures logins/sec through
+/user-login-api with hashing inline (0 workers) and on pools of 1..N
+processes.
+
+Usage (from the project/ directory):
+    python benchmarks/login_throughput.py --users 20 --logins 200 --threads 32
+    PASSWORD_HASH_METHOD=scrypt:16384:8:1 python benchmarks/login_throughput.py
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEGACY_METHOD = 'pbkdf2:sha256:1000'
+
+
+def run_logins(app, logins, threads, users):
+    def login(i):
+        response = app.test_client().post('/user-login-api', json={
+            'username': f'login{i % users}@example.com', 'password': f'password-{i % users}'
+        })
+        return response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        statuses = list(pool.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+    return elapsed, sum(1 for status in statuses if status != 200)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(prefix='parking_login_bench_'), 'bench.sqlite')
+    sys.path.insert(0, PROJECT_DIR)
+    from werkzeug.security import generate_password_hash
+    from main import app, db, User, password_hasher
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        for i in range(args.users):
+            db.session.add(User(username=f'login{i}@example.com', role='User', full_name=f'Login {i}',
+                                password_hash=generate_password_hash(f'password-{i}', LEGACY_METHOD)))
+        db.session.commit()
+
+    print(f"hash method: {password_hasher.method}  cores: {os.cpu_count()}  "
+          f"logins: {args.logins}  threads: {args.threads}")
+
+    # First login of every user upgrades the legacy hash
+    password_hasher.workers = args.max_workers
+    run_logins(app, args.users, args.threads, args.users)
+    with app.app_context():
+        upgraded = sum(1 for user in User.query.all() if not password_hasher.needs_rehash(user.password_hash))
+    print(f"upgraded legacy hashes: {upgraded}/{args.users}")
+
+    failures = 0
+    for workers in [0] + list(range(1, args.max_workers + 1)):
+        password_hasher.shutdown()
+        password_hasher.workers = workers
+        if workers:
+            run_logins(app, workers, workers, args.users) # Start the pool outside the timed run
+        elapsed, failed = run_logins(app, args.logins, args.threads, args.users)
+        failures += failed
+        label = 'inline' if workers == 0 else f'{workers} proc'
+        print(f"  {label:<8} {args.logins / elapsed:8.1f} logins/s  ({failed} failed)")
+    password_hasher.shutdown()
+    return 1 if failures or upgraded != args.users else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Background lot deletion check.
+
+Seeds a database, deletes the biggest lot through DELETE /api/lots/<id>
+while another thread keeps booking and releasing spots in a different
+lot, and reports:
+  - how long the DELETE request itself took (it only queues the job),
+  - booking latency while the deletion runs (no long write stalls),
+  - that a stay released while the job is queued does not reopen its
+    spot for booking,
+  - that open stays were billed, all bookings/bills were archived and
+    every row of the lot is gone,
+  - that the profit report equals a rebuilt rollup and kept the lot's
+    revenue.
+
+Usage (from the project/ directory):
+    python benchmarks/lot_deletion.py --spots-per-lot 200 --years 2
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(
+    tempfile.mkdtemp(prefix='parking_lot_delete_'), 'bench.sqlite')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from main import (app, db, ArchivedBilling, ArchivedBooking, Booking, ParkingLot,  # noqa: E402
+                  ParkingSpot, lot_deletion_worker, rebuild_revenue_rollup)
+import seed_data  # noqa: E402
+
+
+def profit_totals(client):
+    return {row['lot_id']: round(row['total_profit'], 2) for row in client.get('/api/summary/profit-by-lot').get_json()}
+
+
+def keep_booking(lot_id, user_id, stop, latencies):
+    client = app.test_client()
+    with app.app_context():
+        spot_ids = [spot_id for (spot_id,) in db.session.query(ParkingSpot.id).filter(
+            ParkingSpot.lot_id == lot_id, ParkingSpot.is_occupied == False).limit(20)]
+    i = 0
+    while not stop.is_set():
+        spot_id = spot_ids[i % len(spot_ids)]
+        i += 1
+        started = time.perf_counter()
+        response = client.post('/api/book-spot', json={'spot_id': spot_id, 'user_id': user_id, 'vehicle_number': 'KA01'})
+        if response.status_code == 201:
+            client.post(f"/api/release-spot/{response.get_json()['booking_id']}")
+        latencies.append((time.perf_counter() - started) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    seed_data.add_arguments(parser)
+    args = parser.parse_args()
+
+    with app.app_context():
+        seed_data.generate_from_args(args)
+        lot_id, bookings = db.session.query(ParkingSpot.lot_id, db.func.count(Booking.id)).join(
+            Booking, Booking.spot_id == ParkingSpot.id).group_by(ParkingSpot.lot_id).order_by(
+            db.func.count(Booking.id).desc()).first()
+        completed = Booking.query.join(ParkingSpot).filter(
+            ParkingSpot.lot_id == lot_id, Booking.status == 'Completed').count()
+        open_stay = db.session.query(Booking.id, Booking.spot_id).join(ParkingSpot).filter(
+            ParkingSpot.lot_id == lot_id, Booking.status == 'Active').first()
+        other_lot = db.session.query(ParkingLot.id).filter(ParkingLot.id != lot_id).order_by(ParkingLot.id).first()[0]
+    assert open_stay is not None, 'Need an open stay in the lot'
+    print(f"Deleting lot {lot_id}: {bookings} bookings ({completed} completed)")
+
+    client = app.test_client()
+    before = profit_totals(client)
+
+    stop, latencies = threading.Event(), []
+    booker = threading.Thread(target=keep_booking, args=(other_lot, 1, stop, latencies))
+    booker.start()
+    time.sleep(0.5)
+    latencies_before = len(latencies)
+
+    with lot_deletion_worker._lock: # Keep the job queued until the release below is checked
+        lot_deletion_worker._thread = threading.current_thread()
+    started = time.perf_counter()
+    response = client.delete(f'/api/lots/{lot_id}')
+    request_ms = (time.perf_counter() - started) * 1000
+    assert response.status_code == 202, response.get_json()
+    status_url = response.get_json()['status_url']
+    assert client.post(f'/api/release-spot/{open_stay.id}').status_code == 200
+    rebook = client.post('/api/book-spot', json={'spot_id': open_stay.spot_id, 'user_id': 1, 'vehicle_number': 'KA02'})
+    assert rebook.status_code == 409, rebook.get_json()
+    with lot_deletion_worker._lock:
+        lot_deletion_worker._thread = None
+    lot_deletion_worker.wake()
+    while True:
+        job = client.get(status_url).get_json()
+        if job['status'] in ('completed', 'failed'):
+            break
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    booker.join()
+
+    during = latencies[latencies_before:]
+    print(f"DELETE request: {request_ms:.1f} ms; job {job['status']} in {elapsed:.2f}s")
+    if latencies_before:
+        print(f"Bookings in another lot before: median {statistics.median(latencies[:latencies_before]):.1f} ms")
+    if during:
+        during.sort()
+        print(f"Bookings in another lot meanwhile: {len(during)}, "
+              f"median {statistics.median(during):.1f} ms, max {during[-1]:.1f} ms")
+    assert job['status'] == 'completed', job
+    assert job['archived_bookings'] == bookings, job
+    print("A stay released while the job was queued left its spot closed to bookings")
+
+    after = profit_totals(client)
+    with app.app_context():
+        assert db.session.get(ParkingLot, lot_id) is None
+        assert ParkingSpot.query.filter(ParkingSpot.lot_id == lot_id).count() == 0
+        assert ArchivedBooking.query.filter(ArchivedBooking.lot_id == lot_id).count() == bookings
+        assert ArchivedBooking.query.filter(ArchivedBooking.lot_id == lot_id, ArchivedBooking.status != 'Completed',
+                                            ).count() == 0, 'open stays must be billed before archiving'
+        assert ArchivedBilling.query.join(ArchivedBooking, ArchivedBooking.id == ArchivedBilling.booking_id).filter(
+            ArchivedBooking.lot_id == lot_id, ArchivedBilling.status == 'Completed').count() == bookings
+        rebuild_revenue_rollup()
+    rebuilt = profit_totals(client)
+    assert after[lot_id] == rebuilt[lot_id] and after[lot_id] > before[lot_id], (before[lot_id], after[lot_id], rebuilt[lot_id])
+    assert after == rebuilt
+    assert lot_id not in [lot['id'] for lot in client.get('/api/lots?view=summary').get_json()]
+    print(f"Lot rows removed, {bookings - completed} open stays billed, history archived, "
+          f"profit report matches a rebuilt rollup.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Timing benchmark for lot provisioning and online resize.
+
+Creates lots of increasing size through POST /api/lots, then grows and
+shrinks each one through PUT /api/lots/<id>, and prints wall-clock times.
+
+Usage (from the project/ directory):
+    python benchmarks/lot_provisioning.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Point the app at a throwaway database before importing it
+DB_DIR = tempfile.mkdtemp(prefix='parking_bench_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(DB_DIR, 'bench.sqlite')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app, db  # noqa: E402
+
+
+def timed(client, method, url, payload, expected_status):
+    started = time.perf_counter()
+    response = getattr(client, method)(url, json=payload)
+    elapsed = time.perf_counter() - started
+    if response.status_code != expected_status:
+        raise SystemExit(f'{method.upper()} {url} returned {response.status_code}: {response.get_data(as_text=True)[:200]}')
+    return response, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--resize-by', type=float, default=0.1,
+                        help='fraction of the lot to add and then remove (default: 0.1)')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    client = app.test_client()
+
+    print(f"{'spots':>8} {'create (s)':>11} {'grow (s)':>9} {'shrink (s)':>11}")
+    for size in args.sizes:
+        lot_payload = {'name': f'Bench {size}', 'address': 'Bench Road', 'pincode': '000000',
+                       'price': 10, 'maxSpots': size}
+        response, create_time = timed(client, 'post', '/api/lots', lot_payload, 201)
+        lot_id = response.get_json()['id']
+
+        delta = max(1, int(size * args.resize_by))
+        _, grow_time = timed(client, 'put', f'/api/lots/{lot_id}', {'maxSpots': size + delta}, 200)
+        _, shrink_time = timed(client, 'put', f'/api/lots/{lot_id}', {'maxSpots': size}, 200)
+        print(f'{size:>8} {create_time:>11.3f} {grow_time:>9.3f} {shrink_time:>11.3f}')
+
+
+if __name__ == '__main__':
+    main()
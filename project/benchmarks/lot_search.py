@@ -0,0 +1,71 @@
+"""
+Latency benchmark for GET /api/lots/search.
+
+Seeds a scratch database with many lots (benchmarks/seed_data.py, no
+booking history) and times a set of searches through the Flask test
+client, reporting p50/p95 per query. Exits non-zero if any p95 exceeds
+--budget-ms.
+
+Usage (from the project/ directory):
+    python benchmarks/lot_search.py --lots 10000 --budget-ms 10
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(
+    tempfile.mkdtemp(prefix='parking_search_'), 'search.sqlite')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import seed_data  # noqa: E402
+from main import app  # noqa: E402
+
+QUERIES = [
+    '/api/lots/search?q=lot 4217',
+    '/api/lots/search?q=market',                       # matches every lot
+    '/api/lots/search?q=market&limit=50',
+    '/api/lots/search?pincode=56004',
+    '/api/lots/search?pincode=560042&min_free_spots=5',
+    '/api/lots/search?max_price=15&sort=price',
+    '/api/lots/search?min_free_spots=8&sort=free_spots',
+    '/api/lots/search?q=road&pincode=5600&max_price=30&min_free_spots=1',
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--lots', type=int, default=10000)
+    parser.add_argument('--spots-per-lot', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--budget-ms', type=float, default=10)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    seed_data.generate(lots=args.lots, spots_per_lot=args.spots_per_lot, users=10, years=0, active_ratio=0.4)
+    print(f"Seeded {args.lots} lots in {time.perf_counter() - start:.1f}s")
+
+    client = app.test_client()
+    client.get(QUERIES[0]) # Load the occupancy index outside the timed runs
+    over_budget = 0
+    print(f"{'query':<72} {'hits':>5} {'p50 ms':>7} {'p95 ms':>7}")
+    for url in QUERIES:
+        timings = []
+        for _ in range(args.repeat):
+            t = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - t) * 1000)
+            assert response.status_code == 200, response.get_data(as_text=True)
+        timings.sort()
+        p50 = timings[len(timings) // 2]
+        p95 = timings[max(0, math.ceil(0.95 * len(timings)) - 1)]
+        over_budget += p95 > args.budget_ms
+        hits = len(response.get_json()['items'])
+        print(f"{url:<72} {hits:>5} {p50:>7.2f} {p95:>7.2f}{'  OVER BUDGET' if p95 > args.budget_ms else ''}")
+    return 1 if over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Occupancy analytics check and benchmark.
+
+  1. Times occupancy.sweep on synthetic stays (250k to 2M) to show the
+     cost per stay stays flat as the input grows.
+  2. Seeds a database (with part of the history archived), then times
+     GET /api/analytics/occupancy over the whole history: the first call
+     sweeps every booking into hourly buckets, repeated calls and a
+     one-month report only read the buckets.
+  3. Checks stored buckets against a brute-force count over the raw
+     intervals for a sample of lot-hours, and that a report served from
+     the buckets equals one recomputed from scratch (over days that have
+     ended: the current hour keeps changing between two requests).
+  4. Shrinks a lot, which archives the removed spot's past stays, and
+     checks the report is unchanged.
+  5. Checks that a lot without spots does not break the report.
+
+Usage (from the project/ directory):
+    python benchmarks/occupancy_analytics.py --years 1
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(
+    tempfile.mkdtemp(prefix='parking_occupancy_'), 'bench.sqlite')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from main import (app, db, LotOccupancyHourly, LotOccupancyWatermark, ParkingLot, ParkingSpot,  # noqa: E402
+                  booking_intervals, compact_booking_history, current_hour)
+from occupancy import SECONDS_PER_HOUR, sweep  # noqa: E402
+import seed_data  # noqa: E402
+
+
+def time_sweep():
+    rng = random.Random(1)
+    for size in (250_000, 500_000, 1_000_000, 2_000_000):
+        start, intervals = 0.0, []
+        for _ in range(size):
+            start += rng.expovariate(1 / 60) # One arrival a minute per lot on average
+            intervals.append((rng.randrange(20), start, start + rng.uniform(600, 6 * 3600)))
+        intervals.sort(key=lambda interval: interval[1])
+        started = time.perf_counter()
+        sweep(intervals, None, start + 7 * 3600)
+        elapsed = time.perf_counter() - started
+        print(f"  sweep of {size:>9,} stays: {elapsed:5.2f}s ({elapsed / size * 1e6:.2f} us per stay)")
+
+
+def brute_force(intervals, hour, now):
+    """(occupied_seconds, peak) of one hour from raw (start, end) intervals."""
+    hour_start, hour_end = hour * SECONDS_PER_HOUR, (hour + 1) * SECONDS_PER_HOUR
+    occupied, events = 0.0, []
+    for start, end in intervals:
+        end = now if end is None else end
+        overlap = min(end, hour_end) - max(start, hour_start)
+        if overlap > 0:
+            occupied += overlap
+            events += [(max(start, hour_start), 1), (min(end, hour_end), -1)]
+    count = peak = 0
+    for _, delta in sorted(events, key=lambda event: (event[0], event[1])): # Ends before starts
+        count += delta
+        peak = max(peak, count)
+    return occupied, peak
+
+
+def check_buckets(samples):
+    until = current_hour()
+    lot_ids = [lot_id for (lot_id,) in db.session.query(ParkingLot.id)]
+    intervals = {}
+    for lot_id, start, end in booking_intervals(None, datetime.utcnow()):
+        intervals.setdefault(lot_id, []).append((start, end))
+    first_hour = int(min(start for stays in intervals.values() for start, _ in stays) // SECONDS_PER_HOUR)
+    stored = {(row.lot_id, row.hour): (row.occupied_seconds, row.peak) for row in LotOccupancyHourly.query}
+    rng = random.Random(2)
+    for _ in range(samples):
+        lot_id, hour = rng.choice(lot_ids), rng.randrange(first_hour, until)
+        expected = brute_force(intervals.get(lot_id, []), hour, until * SECONDS_PER_HOUR)
+        actual = stored.get((lot_id, hour), (0.0, 0))
+        assert abs(actual[0] - expected[0]) < 1e-3 and actual[1] == expected[1], (lot_id, hour, actual, expected)
+    print(f"{samples} sampled lot-hours match a brute-force count of the raw intervals")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    seed_data.add_arguments(parser)
+    parser.add_argument('--samples', type=int, default=2000)
+    args = parser.parse_args()
+
+    print("Sweep line on synthetic stays (20 lots):")
+    time_sweep()
+
+    client = app.test_client()
+    with app.app_context():
+        seed_data.generate_from_args(args)
+        compact_booking_history(app.config['ARCHIVE_AFTER_DAYS'], app.config['COMPACTION_CHUNK_SIZE'])
+        today = datetime.utcnow().date()
+        first = (today - timedelta(days=int(args.years * 365) + 2)).isoformat()
+        whole = f'/api/analytics/occupancy?from={first}&to={today.isoformat()}'
+        # Compared reports end yesterday: the current hour keeps filling between two requests
+        closed = f'/api/analytics/occupancy?from={first}&to={(today - timedelta(days=1)).isoformat()}'
+        month = f"/api/analytics/occupancy?from={(today - timedelta(days=60)).isoformat()}" \
+                f"&to={(today - timedelta(days=31)).isoformat()}&granularity=day"
+
+        for label, url in (('first report (builds buckets)', whole), ('same report again', whole),
+                           ('one closed month, daily series', month), ('last 28 days (default)',
+                                                                       '/api/analytics/occupancy')):
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = time.perf_counter() - started
+            assert response.status_code == 200, response.get_json()
+            print(f"  {label:34} {elapsed * 1000:8.1f} ms")
+        print(f"  {LotOccupancyHourly.query.count()} hourly buckets stored")
+
+        check_buckets(args.samples)
+
+        cached = client.get(closed).get_json()
+        LotOccupancyHourly.query.delete()
+        LotOccupancyWatermark.query.delete()
+        db.session.commit()
+        assert client.get(closed).get_json() == cached, 'Report from stored buckets differs from a fresh sweep'
+        print("Report from stored buckets equals a fresh sweep")
+
+        last_spots = db.session.query(ParkingSpot.lot_id, db.func.max(ParkingSpot.id)).group_by(ParkingSpot.lot_id)
+        lot_id = next(lot_id for lot_id, spot_id in last_spots if not db.session.get(ParkingSpot, spot_id).is_occupied)
+        max_spots = db.session.get(ParkingLot, lot_id).max_spots
+        response = client.put(f'/api/lots/{lot_id}', json={'maxSpots': max_spots - 1}) # Archives a spot's stays
+        assert response.status_code == 200, response.get_json()
+        shrunk = client.get(closed).get_json()
+        for before, after in zip(cached, shrunk):
+            if before['lot_id'] == lot_id: # Only the spot count (and so utilization) changes
+                for key in ('max_spots', 'utilization', 'heatmap'):
+                    before.pop(key), after.pop(key)
+        assert shrunk == cached, 'Archived stays must stay in the report'
+        check_buckets(args.samples // 4)
+    print(f"Shrinking lot {lot_id} keeps its stays in the report.")
+
+    empty = client.post('/api/lots', json={'name': 'Empty Lot', 'address': 'Bench Road', 'pincode': '000000',
+                                           'price': 10, 'maxSpots': 0}).get_json()['id']
+    response = client.get('/api/analytics/occupancy')
+    assert response.status_code == 200, response.get_json()
+    row = next(row for row in response.get_json() if row['lot_id'] == empty)
+    assert row['utilization'] is None and row['heatmap'] is None
+    print("A lot without spots is reported without utilization.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Billing engine and re-billing check.
+
+  1. Prices a few hand-worked stays with billing.bill (peak, weekend,
+     daily cap, wrap-around peak window), then checks the vectorized
+     billing.bill_many against the scalar billing.bill on random stays
+     and tariffs, and times both.
+  2. Seeds a database (flat tariffs) and re-bills its whole history:
+     nothing may change, since seed_data priced it with calculate_bill.
+  3. Gives some lots time-of-day tariffs through PUT /api/lots/<id>/tariff,
+     re-bills a period through POST /api/admin/rebill and checks every
+     bill against the scalar billing.bill, and the profit report against
+     the bills.
+
+Usage (from the project/ directory):
+    python benchmarks/rebill.py --years 1
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(
+    tempfile.mkdtemp(prefix='parking_rebill_'), 'bench.sqlite')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from billing import Tariff, bill, bill_many, flat_tariff  # noqa: E402
+from main import app, db, Billing, Booking, ParkingSpot, get_lot_tariff, rebill_period  # noqa: E402
+import seed_data  # noqa: E402
+
+
+def check_examples():
+    monday = datetime(2026, 10, 12)  # A Monday
+    peak = Tariff(10.0, 8, 10, 2.0, 1.0, None)
+    assert bill(monday.replace(hour=7, minute=30), monday.replace(hour=10, minute=15), peak) == (3, 50.0)
+    night = Tariff(10.0, 22, 2, 3.0, 1.0, None)  # Window wraps past midnight
+    assert bill(monday.replace(hour=21), monday.replace(hour=23, minute=1), night) == (3, 70.0)
+    weekend = Tariff(10.0, None, None, 1.0, 1.5, None)
+    saturday = monday + timedelta(days=5)
+    assert bill(saturday - timedelta(hours=1), saturday + timedelta(hours=2), weekend) == (3, 40.0)
+    capped = Tariff(10.0, None, None, 1.0, 1.0, 50.0)
+    assert bill(monday.replace(hour=20), monday + timedelta(days=1, hours=10), capped) == (14, 90.0)  # 40 + capped 50
+    assert bill(monday, monday + timedelta(minutes=5), flat_tariff(12.5)) == (1, 12.5)
+    # Local time: 02:00 UTC is 07:30 at +05:30, outside the 08-10 peak until 08:00
+    assert bill(monday.replace(hour=2), monday.replace(hour=4), peak, utc_offset_minutes=330) == (2, 30.0)
+    print("Hand-worked tariffs: ok")
+
+
+def random_tariff(rng):
+    if rng.random() < 0.2:
+        return flat_tariff(rng.choice([10.0, 12.5, 20.0]))
+    start, end = rng.choice([(None, None), (8, 11), (22, 2), (5, 5), (rng.randrange(24), rng.randrange(24))])
+    return Tariff(rng.choice([10.0, 12.5, 17.3, 40.0]), start, end, rng.choice([1.0, 1.5, 2.25]),
+                  rng.choice([1.0, 0.8, 1.35]), rng.choice([None, None, 55.0, 123.45, 200.0]))
+
+
+def check_bill_many(count, stays_to_time):
+    rng = random.Random(7)
+    tariffs = {lot_id: random_tariff(rng) for lot_id in range(1, 41)}
+    origin = datetime(2026, 1, 1)
+
+    def random_stays(n):
+        stays = []
+        for _ in range(n):
+            start = origin + timedelta(seconds=rng.randrange(365 * 86400), microseconds=rng.randrange(10**6))
+            length = rng.choice([timedelta(0), timedelta(minutes=rng.randrange(1, 600)),
+                                 timedelta(hours=1), timedelta(hours=rng.randrange(1, 24 * 10))])
+            stays.append((start, start + length, rng.randrange(1, 43))) # Lots 41 and 42 have no tariff
+        return stays
+
+    for utc_offset in (0, 330, -210):
+        stays = random_stays(count)
+        expected = [bill(start, end, tariffs[lot_id], utc_offset) if lot_id in tariffs else None
+                    for start, end, lot_id in stays]
+        assert bill_many(stays, tariffs, utc_offset) == expected, f"bill_many differs from bill at {utc_offset}"
+    print(f"bill_many equals bill on {3 * count} random stays")
+
+    stays = random_stays(stays_to_time)
+    started = time.perf_counter()
+    bill_many(stays, tariffs)
+    vectorized = time.perf_counter() - started
+    started = time.perf_counter()
+    for start, end, lot_id in stays[:stays_to_time // 10]:
+        if lot_id in tariffs:
+            bill(start, end, tariffs[lot_id])
+    scalar = (time.perf_counter() - started) * 10
+    print(f"Pricing {stays_to_time:,} stays: bill_many {vectorized:.2f}s ({stays_to_time / vectorized:,.0f} bills/s), "
+          f"bill one by one ~{scalar:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    seed_data.add_arguments(parser)
+    parser.add_argument('--compare-stays', type=int, default=100_000)
+    parser.add_argument('--time-stays', type=int, default=2_000_000)
+    args = parser.parse_args()
+    check_examples()
+    check_bill_many(args.compare_stays, args.time_stays)
+
+    client = app.test_client()
+    with app.app_context():
+        seed_data.generate_from_args(args)
+        first_day = db.session.query(db.func.min(Billing.billing_time)).scalar().date()
+        last_day = db.session.query(db.func.max(Billing.billing_time)).scalar().date()
+
+        started = time.perf_counter()
+        stats = rebill_period(first_day, last_day)
+        elapsed = time.perf_counter() - started
+        print(f"Flat re-bill of all history: {stats['bills']} bills in {elapsed:.1f}s "
+              f"({stats['bills'] / elapsed:,.0f} bills/s), {stats['changed']} changed")
+        assert stats['changed'] == 0, stats
+
+        lot_ids = [1, 2, 3]
+        for lot_id in lot_ids:
+            response = client.put(f'/api/lots/{lot_id}/tariff', json={
+                'peakStartHour': 8, 'peakEndHour': 11, 'peakMultiplier': 1.5,
+                'weekendMultiplier': 0.8, 'dailyCap': 9 * get_lot_tariff(lot_id).price_per_hour
+            })
+            assert response.status_code == 200, response.get_json()
+
+        period_from = last_day - timedelta(days=30)
+        started = time.perf_counter()
+        response = client.post('/api/admin/rebill', json={'from': period_from.isoformat(), 'to': last_day.isoformat()})
+        elapsed = time.perf_counter() - started
+        stats = response.get_json()
+        assert response.status_code == 200, stats
+        print(f"Tariff re-bill of 30 days: {stats['bills']} bills in {elapsed:.2f}s, {stats['changed']} changed, "
+              f"revenue {stats['revenue_before']} -> {stats['revenue_after']}")
+        assert stats['changed'] > 0
+
+        rows = db.session.query(Booking.start_time, Booking.end_time, Billing.final_cost, Billing.billing_time,
+                                ParkingSpot.lot_id).join(Billing, Billing.booking_id == Booking.id).join(
+            ParkingSpot, ParkingSpot.id == Booking.spot_id).filter(Billing.status == 'Completed').all()
+        mismatches = 0
+        for start_time, end_time, final_cost, billing_time, lot_id in rows:
+            in_period = billing_time.date() >= period_from
+            tariff = get_lot_tariff(lot_id).tariff if in_period else flat_tariff(get_lot_tariff(lot_id).price_per_hour)
+            if bill(start_time, end_time, tariff)[1] != final_cost:
+                mismatches += 1
+        print(f"Checked {len(rows)} bills against the scalar billing.bill: {mismatches} mismatches")
+        assert mismatches == 0
+
+        profit = sum(row['total_profit'] for row in client.get('/api/summary/profit-by-lot').get_json())
+        billed = db.session.query(db.func.sum(Billing.final_cost)).filter(Billing.status == 'Completed').scalar()
+        assert abs(profit - billed) < 0.01, (profit, billed)
+
+        # release_spot prices with the same engine
+        spot_id = db.session.query(ParkingSpot.id).filter(ParkingSpot.lot_id == 1, ParkingSpot.is_occupied == False).first()[0]
+        booking_id = client.post('/api/book-spot', json={'spot_id': spot_id, 'user_id': 1, 'vehicle_number': 'KA01'}).get_json()['booking_id']
+        released = client.post(f'/api/release-spot/{booking_id}').get_json()
+        booking = db.session.get(Booking, booking_id)
+        assert released['final_cost'] == bill(booking.start_time, booking.end_time, get_lot_tariff(1).tariff)[1]
+    print("Profit report matches the bills; release_spot uses the tariff.")
+
+
+if __name__ == '__main__':
+    main()
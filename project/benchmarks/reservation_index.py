@@ -0,0 +1,212 @@
+"""
+Advance reservation check and benchmark.
+
+  1. Checks reservations.SpotSchedule against a brute-force list of
+     windows over random adds, removals and overlap queries.
+  2. Times free_spots() on a lot with many reservations per spot against
+     a scan of every reservation of the lot.
+  3. Fires concurrent reservations with random windows at a small lot
+     through POST /api/book-spot, then checks that no two holding
+     reservations of a spot overlap and that GET /api/lots/<id>/availability
+     matches a brute-force answer from the database.
+  4. Checks the walk-up rules: a walk-up is refused on a spot reserved
+     within RESERVATION_HOLD_MINUTES, and a check-in whose spot is taken
+     moves to another free spot.
+
+Usage (from the project/ directory):
+    python benchmarks/reservation_index.py --spots 20 --requests 2000 --threads 16
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+DB_DIR = tempfile.mkdtemp(prefix='parking_reservations_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(DB_DIR, 'bench.sqlite')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app, db, User, ParkingSpot, Reservation, HOLDING_STATUSES, reservation_index  # noqa: E402
+from reservations import SpotSchedule, free_spots  # noqa: E402
+
+
+def check_schedule(operations):
+    rng = random.Random(1)
+    schedule, windows = SpotSchedule(), {} # key -> (start, end)
+    for key in range(operations):
+        start = rng.randrange(10_000)
+        end = start + rng.randrange(1, 200)
+        overlapping = {other for other, (a, b) in windows.items() if a < end and start < b}
+        ignore = rng.choice(list(windows)) if windows and rng.random() < 0.3 else None
+        assert schedule.overlaps(start, end, ignore) == bool(overlapping - {ignore})
+        if rng.random() < 0.6:
+            assert schedule.add(key, start, end) == (not overlapping)
+            if not overlapping:
+                windows[key] = (start, end)
+        elif windows:
+            removed = rng.choice(list(windows))
+            schedule.remove(removed)
+            del windows[removed]
+        if rng.random() < 0.01:
+            before = rng.randrange(10_000)
+            schedule.prune(before)
+            windows = {other: (a, b) for other, (a, b) in windows.items() if b > before}
+        assert len(schedule) == len(windows)
+    print(f"SpotSchedule matches a brute-force list over {operations} random operations")
+
+
+def time_free_spots(spots, per_spot):
+    schedules, windows = {}, []
+    for spot_id in range(spots):
+        schedule = schedules[spot_id] = SpotSchedule()
+        for slot in range(per_spot):
+            start = slot * 100 + random.randrange(50) # Back to back, a few gaps
+            schedule.add(slot, start, start + 50)
+            windows.append((spot_id, start, start + 50))
+    spot_ids = list(range(spots))
+    queries = [(start, start + random.randrange(1, 300)) for start in random.sample(range(per_spot * 100), 200)]
+
+    started = time.perf_counter()
+    indexed = [free_spots(schedules, spot_ids, start, end) for start, end in queries]
+    indexed_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    started = time.perf_counter()
+    scanned = []
+    for start, end in queries[:20]:
+        busy = {spot_id for spot_id, a, b in windows if a < end and start < b}
+        scanned.append([spot_id for spot_id in spot_ids if spot_id not in busy])
+    scan_ms = (time.perf_counter() - started) * 1000 / 20
+    assert indexed[:20] == scanned
+    print(f"free_spots, {spots} spots x {per_spot} reservations: {indexed_ms:.3f} ms per query "
+          f"(scan of all {len(windows)} reservations: {scan_ms:.1f} ms)")
+
+
+def setup(spots):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        users = [User(username=f'reserve{i}@example.com', role='User', full_name=f'User {i}', password_hash='x')
+                 for i in range(2)]
+        db.session.add_all(users)
+        db.session.commit()
+        user_ids = [user.id for user in users]
+    reservation_index.reset()
+    lot = app.test_client().post('/api/lots', json={
+        'name': 'Reservation Lot', 'address': 'Bench Road', 'pincode': '000000', 'price': 10, 'maxSpots': spots
+    }).get_json()
+    return user_ids, lot['id'], [spot['id'] for spot in lot['spots']]
+
+
+def reserve(user_id, spot_ids, now):
+    start = now + timedelta(hours=2, minutes=15 * random.randrange(4 * 24 * 3))
+    end = start + timedelta(minutes=15 * random.randint(1, 16))
+    response = app.test_client().post('/api/book-spot', json={
+        'spot_id': random.choice(spot_ids), 'user_id': user_id, 'vehicle_number': 'RES',
+        'start_time': start.isoformat(), 'end_time': end.isoformat()
+    })
+    return response.status_code
+
+
+def check_overlaps():
+    violations = []
+    with app.app_context():
+        rows = db.session.query(Reservation.spot_id, Reservation.start_time, Reservation.end_time).filter(
+            Reservation.status.in_(HOLDING_STATUSES)
+        ).order_by(Reservation.spot_id, Reservation.start_time)
+        previous = None
+        for spot_id, start, end in rows:
+            if previous and previous[0] == spot_id and start < previous[2]:
+                violations.append(f"spot {spot_id}: {previous[1]}-{previous[2]} overlaps {start}-{end}")
+            previous = (spot_id, start, end)
+    return violations
+
+
+def check_availability(lot_id, spot_ids, now, queries):
+    client = app.test_client()
+    with app.app_context():
+        windows = db.session.query(Reservation.spot_id, Reservation.start_time, Reservation.end_time).filter(
+            Reservation.status.in_(HOLDING_STATUSES)).all()
+    timings = []
+    for _ in range(queries):
+        start = now + timedelta(hours=2, minutes=random.randrange(3 * 24 * 60))
+        end = start + timedelta(minutes=random.randint(1, 600))
+        started = time.perf_counter()
+        response = client.get(f'/api/lots/{lot_id}/availability',
+                              query_string={'start_time': start.isoformat(), 'end_time': end.isoformat()})
+        timings.append((time.perf_counter() - started) * 1000)
+        busy = {spot_id for spot_id, a, b in windows if a < end and start < b}
+        assert response.get_json()['spot_ids'] == [spot_id for spot_id in spot_ids if spot_id not in busy]
+    timings.sort()
+    print(f"{queries} availability answers match the database (median {timings[len(timings) // 2]:.2f} ms)")
+
+
+def check_walk_ups(user_ids, lot_id, spot_ids):
+    client = app.test_client()
+    now = datetime.utcnow()
+    free = client.get(f'/api/lots/{lot_id}/availability', query_string={
+        'start_time': now.isoformat(), 'end_time': (now + timedelta(hours=1, minutes=50)).isoformat()
+    }).get_json()['spot_ids']
+    assert len(free) >= 2, 'Need two spots free for the next two hours'
+    spot_id = free[0]
+    window = {'start_time': (now + timedelta(minutes=10)).isoformat(),
+              'end_time': (now + timedelta(hours=1)).isoformat()}
+    response = client.post('/api/book-spot', json={'spot_id': spot_id, 'user_id': user_ids[0],
+                                                   'vehicle_number': 'SOON', **window})
+    assert response.status_code == 201, response.get_json()
+    reservation_id = response.get_json()['reservation_id']
+
+    walk_up = client.post('/api/book-spot', json={'spot_id': spot_id, 'user_id': user_ids[1], 'vehicle_number': 'WALK'})
+    assert walk_up.status_code == 409, walk_up.get_json()
+    booked = {client.post(f'/api/lots/{lot_id}/auto-book', json={'user_id': user_ids[1], 'vehicle_number': 'AUTO'})
+              .get_json().get('spot_id') for _ in range(3)}
+    assert spot_id not in booked, 'auto-book must pass over reserved spots'
+    print("Walk-ups are kept off a spot reserved within the hold period")
+
+    with app.app_context(): # A walk-up that overstays (the spot is taken by other means)
+        db.session.query(ParkingSpot).filter(ParkingSpot.id == spot_id).update({'is_occupied': True})
+        db.session.commit()
+    response = client.post(f'/api/reservations/{reservation_id}/check-in')
+    assert response.status_code == 201, response.get_json()
+    assert response.get_json()['spot_id'] != spot_id
+    assert client.post(f'/api/reservations/{reservation_id}/check-in').status_code == 409
+    print(f"Check-in on a taken spot moved to spot {response.get_json()['spot_id']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--spots', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+    random.seed(7)
+
+    check_schedule(20_000)
+    time_free_spots(500, 200)
+
+    user_ids, lot_id, spot_ids = setup(args.spots)
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        statuses = list(pool.map(lambda i: reserve(user_ids[i % 2], spot_ids, now), range(args.requests)))
+    elapsed = time.perf_counter() - started
+    print(f"{args.requests} reservation requests in {elapsed:.2f}s ({args.requests / elapsed:.0f}/s): "
+          f"{statuses.count(201)} reserved, {statuses.count(409)} conflicts, "
+          f"{len(statuses) - statuses.count(201) - statuses.count(409)} other")
+    violations = check_overlaps()
+    for violation in violations[:20]:
+        print(f"  {violation}")
+    if violations:
+        print(f"FAIL: {len(violations)} overlapping reservations")
+        sys.exit(1)
+    print("No overlapping reservations")
+
+    check_availability(lot_id, spot_ids, now, args.queries)
+    check_walk_ups(user_ids, lot_id, spot_ids)
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
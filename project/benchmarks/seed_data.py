@@ -0,0 +1,172 @@
+"""
+Synthetic data generator.
+
+Fills the models in main.py with lots, spots, users and years of
+completed bookings + bills (plus a share of currently Active bookings),
+using Core executemany inserts in chunks so millions of rows load in
+seconds, then rebuilds the revenue rollup.
+
+Every user's password is `password123`.
+
+Usage (from the project/ directory):
+    python benchmarks/seed_data.py --lots 50 --spots-per-lot 100 --users 2000 --years 2
+    DATABASE_URL=sqlite:////tmp/big.sqlite python benchmarks/seed_data.py --years 5
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+if __name__ == '__main__':
+    # Point the app at a throwaway database (unless one was given) before importing it
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(prefix='parking_seed_'), 'seed.sqlite'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from billing import flat_tariff  # noqa: E402
+
+from main import (app, db, User, ParkingLot, ParkingSpot, Booking, Billing,  # noqa: E402
+                  calculate_bill, lot_search_index, occupancy_index, rebuild_revenue_rollup)
+
+CHUNK = 20000
+PASSWORD = 'password123'
+
+
+def insert_chunked(table, rows):
+    """Inserts an iterable of row dicts CHUNK at a time; returns the row count."""
+    count, chunk = 0, []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK:
+            db.session.execute(table.insert(), chunk)
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(table.insert(), chunk)
+        count += len(chunk)
+    return count
+
+
+def generate(lots=20, spots_per_lot=50, users=500, years=1.0, bookings_per_day=1.0,
+             active_ratio=0.3, seed=42, now=None):
+    """
+    Drops and recreates all tables and fills them with synthetic data.
+
+    Each spot gets back-to-back, non-overlapping bookings over the last
+    `years` years at about `bookings_per_day` per day (1-8 hours each),
+    billed with the same calculate_bill as release_spot. `active_ratio` of
+    the spots end with a still Active booking and are marked occupied.
+    Returns a dict of row counts.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.utcnow()
+    history_start = now - timedelta(days=365 * years)
+    mean_gap_hours = max(24.0 / bookings_per_day - 4.5, 0.1) # 4.5h = mean booking length
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        password_hash = generate_password_hash(PASSWORD, app.config['PASSWORD_HASH_METHOD'])
+        insert_chunked(User.__table__, (
+            {'id': i, 'username': f'user{i}@example.com', 'password_hash': password_hash,
+             'role': 'User', 'full_name': f'User {i}'}
+            for i in range(1, users + 1)
+        ))
+
+        prices = {lot_id: float(rng.choice([10, 15, 20, 25, 30, 40, 50])) for lot_id in range(1, lots + 1)}
+        tariffs = {lot_id: flat_tariff(price) for lot_id, price in prices.items()}
+        insert_chunked(ParkingLot.__table__, (
+            {'id': lot_id, 'name': f'Lot {lot_id}', 'address': f'{lot_id} Market Road',
+             'pincode': f'{560000 + lot_id % 100:06d}', 'price_per_hour': prices[lot_id], 'max_spots': spots_per_lot}
+            for lot_id in range(1, lots + 1)
+        ))
+
+        spots = [(spot_id, (spot_id - 1) // spots_per_lot + 1) for spot_id in range(1, lots * spots_per_lot + 1)]
+        active_spots = {spot_id for spot_id, _ in spots if rng.random() < active_ratio}
+        insert_chunked(ParkingSpot.__table__, (
+            {'id': spot_id, 'lot_id': lot_id, 'spot_number': str((spot_id - 1) % spots_per_lot + 1),
+             'is_occupied': spot_id in active_spots}
+            for spot_id, lot_id in spots
+        ))
+
+        def history_rows():
+            """Yields (booking, billing) row pairs, spot by spot."""
+            booking_id = 0
+            for spot_id, lot_id in spots:
+                start = history_start + timedelta(hours=rng.expovariate(1 / mean_gap_hours))
+                while True:
+                    end = start + timedelta(minutes=rng.randint(30, 8 * 60))
+                    if end >= now:
+                        break
+                    booking_id += 1
+                    final_cost = calculate_bill(start, end, tariffs[lot_id])[1]
+                    yield ({'id': booking_id, 'spot_id': spot_id, 'customer_id': rng.randint(1, users),
+                            'vehicle_number': f'KA{rng.randint(1, 99):02d}X{rng.randint(1000, 9999)}',
+                            'start_time': start, 'end_time': end, 'status': 'Completed'},
+                           {'id': booking_id, 'booking_id': booking_id, 'status': 'Completed',
+                            'final_cost': final_cost, 'billing_time': end})
+                    start = end + timedelta(hours=rng.expovariate(1 / mean_gap_hours))
+                if spot_id in active_spots:
+                    booking_id += 1
+                    yield ({'id': booking_id, 'spot_id': spot_id, 'customer_id': rng.randint(1, users),
+                            'vehicle_number': f'KA{rng.randint(1, 99):02d}A{rng.randint(1000, 9999)}',
+                            'start_time': now - timedelta(minutes=rng.randint(5, 600)), 'end_time': None,
+                            'status': 'Active'},
+                           {'id': booking_id, 'booking_id': booking_id, 'status': 'Reserved',
+                            'final_cost': None, 'billing_time': None})
+
+        booking_count = 0
+        bookings, bills = [], []
+        for booking, bill in history_rows():
+            bookings.append(booking)
+            bills.append(bill)
+            if len(bookings) == CHUNK:
+                booking_count += insert_chunked(Booking.__table__, bookings)
+                insert_chunked(Billing.__table__, bills)
+                bookings, bills = [], []
+        booking_count += insert_chunked(Booking.__table__, bookings)
+        insert_chunked(Billing.__table__, bills)
+        db.session.commit()
+
+        rebuild_revenue_rollup()
+        occupancy_index.reset()
+        lot_search_index.reset()
+
+    return {'users': users, 'lots': lots, 'spots': len(spots), 'active': len(active_spots),
+            'bookings': booking_count, 'bills': booking_count}
+
+
+def add_arguments(parser):
+    parser.add_argument('--lots', type=int, default=20)
+    parser.add_argument('--spots-per-lot', type=int, default=50)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--years', type=float, default=1.0, help='years of booking history')
+    parser.add_argument('--bookings-per-day', type=float, default=1.0, help='per spot')
+    parser.add_argument('--active-ratio', type=float, default=0.3, help='share of spots currently occupied')
+    parser.add_argument('--seed', type=int, default=42)
+
+
+def generate_from_args(args):
+    return generate(lots=args.lots, spots_per_lot=args.spots_per_lot, users=args.users, years=args.years,
+                    bookings_per_day=args.bookings_per_day, active_ratio=args.active_ratio, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    add_arguments(parser)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    counts = generate_from_args(args)
+    print(f"Seeded {app.config['SQLALCHEMY_DATABASE_URI']} in {time.perf_counter() - start:.1f}s")
+    for key, value in counts.items():
+        print(f"  {key:<9} {value}")
+
+
+if __name__ == '__main__':
+    main()
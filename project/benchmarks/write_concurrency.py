@@ -0,0 +1,124 @@
+"""
+Multi-process write benchmark for the SQLite engine profile.
+
+Starts several worker processes (each with its own app instance and
+connection pool, like a multi-worker WSGI server) that book and release
+spots against one shared database file, then reports throughput and how
+many requests failed with "database is locked".
+
+Compare the tuned profile with plain SQLite defaults:
+    python benchmarks/write_concurrency.py --processes 4 --requests 300
+    SQLITE_TUNED=0 python benchmarks/write_concurrency.py --processes 4 --requests 300
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app(db_path):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+    # Each worker only knows about its own bookings
+    os.environ.setdefault('OCCUPANCY_INDEX_MAX_AGE', '1')
+    sys.path.insert(0, PROJECT_DIR)
+    import main
+    return main
+
+
+def setup(db_path, spots, users):
+    main = load_app(db_path)
+    with main.app.app_context():
+        main.db.drop_all()
+        main.db.create_all()
+        user_ids = []
+        for i in range(users):
+            user = main.User(username=f'bench{i}@example.com', role='User', full_name=f'Bench {i}')
+            user.password_hash = 'unused' # Logins are not exercised here
+            main.db.session.add(user)
+            main.db.session.flush()
+            user_ids.append(user.id)
+        main.db.session.commit()
+        mode = main.db.session.execute(main.db.text('PRAGMA journal_mode')).scalar()
+    lot = main.app.test_client().post('/api/lots', json={
+        'name': 'Write Bench Lot', 'address': 'Bench Road', 'pincode': '000000',
+        'price': 10, 'maxSpots': spots
+    }).get_json()
+    return user_ids, [spot['id'] for spot in lot['spots']], mode
+
+
+def worker(db_path, user_ids, spot_ids, requests, seed, barrier, results):
+    main = load_app(db_path)
+    main.app.logger.disabled = True
+    client = main.app.test_client()
+    rng = random.Random(seed)
+    counts = Counter()
+    barrier.wait() # Start timing once every worker has imported the app
+    start = time.perf_counter()
+    for _ in range(requests):
+        spot_id = rng.choice(spot_ids)
+        try:
+            response = client.post('/api/book-spot', json={
+                'spot_id': spot_id, 'user_id': rng.choice(user_ids), 'vehicle_number': f'W{spot_id}'
+            })
+            counts[f'book {response.status_code}'] += 1
+            if response.status_code == 201:
+                released = client.post(f"/api/release-spot/{response.get_json()['booking_id']}")
+                counts[f'release {released.status_code}'] += 1
+        except Exception as e:
+            counts['locked' if 'locked' in str(e) else type(e).__name__] += 1
+    results.put((counts, time.perf_counter() - start))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=300, help='book attempts per process')
+    parser.add_argument('--spots', type=int, default=20)
+    parser.add_argument('--users', type=int, default=10)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='parking_write_bench_'), 'bench.sqlite')
+    ctx = multiprocessing.get_context('spawn') # Fresh interpreter + engine per worker
+    setup_queue = ctx.Queue()
+    setup_proc = ctx.Process(target=_setup_entry, args=(db_path, args.spots, args.users, setup_queue))
+    setup_proc.start()
+    user_ids, spot_ids, mode = setup_queue.get()
+    setup_proc.join()
+
+    results = ctx.Queue()
+    barrier = ctx.Barrier(args.processes)
+    procs = [ctx.Process(target=worker, args=(db_path, user_ids, spot_ids, args.requests, seed, barrier, results))
+             for seed in range(args.processes)]
+    for proc in procs:
+        proc.start()
+    totals, elapsed = Counter(), 0.0
+    for _ in procs:
+        counts, seconds = results.get()
+        totals.update(counts)
+        elapsed = max(elapsed, seconds)
+    for proc in procs:
+        proc.join()
+
+    attempts = sum(v for k, v in totals.items() if k.startswith('book ')) + totals['locked']
+    failures = totals['locked'] + totals['book 500'] + totals['release 500']
+    print(f"SQLITE_TUNED={os.environ.get('SQLITE_TUNED', '1')} journal_mode={mode}")
+    print(f"{args.processes} processes, {attempts} book attempts in {elapsed:.2f}s "
+          f"({attempts / elapsed:.0f} attempts/s)")
+    for key, value in sorted(totals.items()):
+        print(f"  {key:<14} {value}")
+    print(f"Failed writes (locked / 500): {failures}")
+    return 1 if failures else 0
+
+
+def _setup_entry(db_path, spots, users, queue):
+    queue.put(setup(db_path, spots, users))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""
+Billing engine.
+
+Prices a stay from its (start_time, end_time) and the lot's Tariff. Every
+started hour is billed, with a minimum of one hour, at the rate in force
+when that hour starts:
+  - price_per_hour on weekdays, times peak_multiplier for hours starting
+    in [peak_start_hour, peak_end_hour) (the window may wrap past midnight),
+  - price_per_hour times weekend_multiplier on Saturdays and Sundays,
+and each calendar day's charge is capped at daily_cap. Hours and days are
+local time, `utc_offset_minutes` ahead of the stored UTC timestamps.
+
+A flat tariff (no peak window, multipliers of 1, no cap) is billed as
+hours * price_per_hour, exactly as before tariffs existed.
+
+bill() prices one stay (release_spot) and is the reference; bill_many()
+prices a batch of stays (re-billing a period) with NumPy arrays and
+returns exactly what bill() returns for each of them: same rate table,
+and every sum is added in the same order, so the floats match bit for bit.
+
+No Flask or database imports: main.py loads tariffs and writes results.
+"""
+import math
+from collections import namedtuple
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+
+HOURS_PER_WEEK = 7 * 24
+MICROSECONDS_PER_HOUR = 3600 * 10**6
+MICROSECONDS_PER_DAY = 24 * MICROSECONDS_PER_HOUR
+EPOCH = datetime(1970, 1, 1)
+EPOCH_WEEKDAY = 3 # 1970-01-01 was a Thursday
+MICROSECOND = timedelta(microseconds=1)
+
+Tariff = namedtuple(
+    'Tariff',
+    'price_per_hour peak_start_hour peak_end_hour peak_multiplier weekend_multiplier daily_cap'
+)
+
+
+def flat_tariff(price_per_hour):
+    """The tariff of a lot without a tariff plan: one price around the clock."""
+    return Tariff(price_per_hour, None, None, 1.0, 1.0, None)
+
+
+def is_flat(tariff):
+    return ((tariff.peak_start_hour is None or tariff.peak_multiplier == 1)
+            and tariff.weekend_multiplier == 1 and tariff.daily_cap is None)
+
+
+def billed_hours(start_time, end_time):
+    """Every started hour is billed, with a minimum of one hour."""
+    hours = math.ceil((end_time - start_time).total_seconds() / 3600)
+    return hours if hours >= 1 else 1
+
+
+def in_peak(tariff, hour):
+    start, end = tariff.peak_start_hour, tariff.peak_end_hour
+    if start is None or end is None or start == end:
+        return False
+    if start < end:
+        return start <= hour < end
+    return hour >= start or hour < end # Window wraps past midnight
+
+
+@lru_cache(maxsize=1024)
+def hourly_rates(tariff):
+    """Rate of each hour of the week, indexed by weekday * 24 + hour (Monday 00:00 = 0)."""
+    rates = []
+    for weekday in range(7):
+        for hour in range(24):
+            if weekday >= 5:
+                rates.append(tariff.price_per_hour * tariff.weekend_multiplier)
+            elif in_peak(tariff, hour):
+                rates.append(tariff.price_per_hour * tariff.peak_multiplier)
+            else:
+                rates.append(tariff.price_per_hour)
+    return tuple(rates)
+
+
+def price_stay(start_time, hours, tariff, utc_offset_minutes):
+    """Cost of `hours` billed hours starting at start_time under a non-flat tariff, rounded to cents."""
+    rates = hourly_rates(tariff)
+    cap = tariff.daily_cap
+    local = start_time + timedelta(minutes=utc_offset_minutes)
+    hour_of_day = local.hour
+    slot = local.weekday() * 24 + hour_of_day
+    total = day_total = 0.0
+    for _ in range(hours):
+        day_total += rates[slot]
+        slot = (slot + 1) % HOURS_PER_WEEK
+        hour_of_day += 1
+        if hour_of_day == 24: # The next hour starts a new calendar day
+            total += day_total if cap is None or day_total < cap else cap
+            day_total = 0.0
+            hour_of_day = 0
+    total += day_total if cap is None or day_total < cap else cap
+    return round(total, 2)
+
+
+def bill(start_time, end_time, tariff, utc_offset_minutes=0):
+    """Returns (duration_hours, final_cost) for one stay."""
+    hours = billed_hours(start_time, end_time)
+    if is_flat(tariff):
+        return hours, hours * tariff.price_per_hour
+    return hours, price_stay(start_time, hours, tariff, utc_offset_minutes)
+
+
+def microseconds(times):
+    """Naive datetimes as int64 microseconds since EPOCH (much faster than np.array(..., 'datetime64[us]'))."""
+    return np.fromiter(((time - EPOCH) // MICROSECOND for time in times), np.int64, len(times))
+
+
+def round_cents(values):
+    """[round(value, 2) for value in values] as an array, with Python's exact rounding."""
+    scaled = values * 100
+    rounded = np.rint(scaled) / 100
+    # Only a product within an ulp of half a cent may round differently from the exact value
+    for i in np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) <= np.spacing(scaled)):
+        rounded[i] = round(float(values[i]), 2)
+    return rounded
+
+
+def run_sums(values, starts, lengths):
+    """
+    Sum of each run values[start:start + length], added left to right from
+    0.0 like price_stay's loop (np.add.reduceat may add in another order).
+    One pass per position, over the runs still that long.
+    """
+    totals = np.zeros(len(starts))
+    active = np.flatnonzero(lengths > 0)
+    position = 0
+    while active.size:
+        totals[active] += values[starts[active] + position]
+        position += 1
+        active = active[lengths[active] > position]
+    return totals
+
+
+def price_stays(start_times, hours, tariff_ids, rate_table, caps, utc_offset_minutes):
+    """
+    price_stay over arrays: start times (microseconds since EPOCH), billed
+    hours and the tariff (row of rate_table, caps with inf for no cap) of
+    each stay. Returns the costs rounded to cents.
+    """
+    local = start_times + utc_offset_minutes * 60 * 10**6
+    days = local // MICROSECONDS_PER_DAY
+    first_hour = (local - days * MICROSECONDS_PER_DAY) // MICROSECONDS_PER_HOUR # Local hour of day the stay starts in
+    first_weekday = (days + EPOCH_WEEKDAY) % 7
+
+    # One element per local calendar day of each stay, covering its hours [low, high)
+    day_counts = (first_hour + hours - 1) // 24 + 1
+    day_offset = np.cumsum(day_counts) - day_counts
+    stay_of_day = np.repeat(np.arange(len(hours)), day_counts)
+    day = np.arange(day_counts.sum()) - day_offset[stay_of_day]
+    low = np.where(day == 0, first_hour[stay_of_day], 0)
+    high = np.minimum(24, (first_hour + hours)[stay_of_day] - day * 24)
+    rows = tariff_ids[stay_of_day] * 7 + (first_weekday[stay_of_day] + day) % 7 # Row of the (tariff, weekday)
+
+    # Whole days come from a per-(tariff, weekday) table, summed in order by cumsum;
+    # the first and last day of a stay add their hours one pass per hour
+    day_totals = np.cumsum(rate_table.reshape(-1, 24), axis=1)[:, -1][rows]
+    partial = np.flatnonzero(high - low < 24)
+    day_totals[partial] = run_sums(rate_table, rows[partial] * 24 + low[partial], high[partial] - low[partial])
+
+    capped = np.minimum(day_totals, caps[tariff_ids[stay_of_day]])
+    return round_cents(run_sums(capped, day_offset, day_counts))
+
+
+def bill_many(stays, tariffs, utc_offset_minutes=0):
+    """
+    Prices a batch of stays, given as (start_time, end_time, lot_id), with
+    tariffs mapping lot_id -> Tariff. Returns a list of (duration_hours,
+    final_cost), or None for a stay whose lot has no tariff.
+    """
+    stays = list(stays)
+    results = [None] * len(stays)
+    lot_ids = [lot_id for lot_id, tariff in tariffs.items() if tariff is not None]
+    tariff_id = {lot_id: i for i, lot_id in enumerate(lot_ids)}
+    known = [i for i, stay in enumerate(stays) if stay[2] in tariff_id]
+    if not known:
+        return results
+
+    start_times = microseconds([stays[i][0] for i in known])
+    end_times = microseconds([stays[i][1] for i in known])
+    tariff_ids = np.fromiter((tariff_id[stays[i][2]] for i in known), np.int64, len(known))
+    # billed_hours: every started hour, at least one (exact integer ceiling)
+    hours = np.maximum(-((start_times - end_times) // MICROSECONDS_PER_HOUR), 1)
+
+    prices = np.array([tariffs[lot_id].price_per_hour for lot_id in lot_ids], dtype=np.float64)
+    costs = hours * prices[tariff_ids]
+    flat = np.array([is_flat(tariffs[lot_id]) for lot_id in lot_ids])[tariff_ids]
+    priced = np.flatnonzero(~flat)
+    if priced.size:
+        rate_table = np.array([hourly_rates(tariffs[lot_id]) for lot_id in lot_ids], dtype=np.float64).ravel()
+        caps = np.array([np.inf if tariffs[lot_id].daily_cap is None else tariffs[lot_id].daily_cap
+                         for lot_id in lot_ids], dtype=np.float64)
+        costs[priced] = price_stays(start_times[priced], hours[priced], tariff_ids[priced], rate_table, caps,
+                                    utc_offset_minutes)
+
+    for i, duration, cost in zip(known, hours.tolist(), costs.tolist()):
+        results[i] = (duration, cost)
+    return results
@@ -1,38 +1,409 @@
-from flask import Flask, request, jsonify, render_template, redirect, url_for, flash
-from sqlalchemy.orm import joinedload
-from sqlalchemy import desc
+from flask import (Flask, Response, abort, request, jsonify, render_template, redirect, url_for, flash,
+                   g, has_app_context, has_request_context, stream_with_context)
+from sqlalchemy import desc, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError, OperationalError
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS 
-from datetime import datetime
+from datetime import datetime, date, timedelta, timezone
+import asyncio
+import base64
+import click
+import bisect
+import csv
+import hashlib
+import heapq
+import io
 import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+import multiprocessing
+from collections import Counter, OrderedDict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import math # <-- ADDED FOR BILLING CALCULATION
 from werkzeug.security import generate_password_hash, check_password_hash # ADDED SECURITY IMPORTS
+from config import Config, engine_options
+from billing import Tariff, bill, bill_many, flat_tariff
+from serialization import JSONProvider
+from occupancy import EPOCH, SECONDS_PER_HOUR, epoch_seconds, sweep, weekday
+from reservations import SpotSchedule, free_spots
 
 # --- CONFIGURATION ---
 app = Flask(__name__, template_folder='templates', static_folder='static') 
-app.config['SECRET_KEY'] = 'a_secure_secret_key_for_sessions' 
+app.config.from_object(Config) # See config.py; every value can be set via environment variables
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+app.json = JSONProvider(app) # Same output as Flask's default, encoded faster (see serialization.py)
 CORS(app) 
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///parking_system.sqlite'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+
+@event.listens_for(Engine, 'connect')
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Applies the SQLite tuning from config.py to every new connection."""
+    if not isinstance(dbapi_connection, sqlite3.Connection) or not app.config['SQLITE_TUNED']:
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}")
+    cursor.execute(f"PRAGMA journal_mode = {app.config['SQLITE_JOURNAL_MODE']}")
+    cursor.execute(f"PRAGMA synchronous = {app.config['SQLITE_SYNCHRONOUS']}")
+    cursor.execute(f"PRAGMA mmap_size = {int(app.config['SQLITE_MMAP_SIZE'])}")
+    cursor.execute(f"PRAGMA cache_size = -{int(app.config['SQLITE_CACHE_SIZE_KB'])}") # Negative = KiB
+    cursor.close()
+
+
 db = SQLAlchemy(app)
 
+
+# --- INSTRUMENTATION (/metrics) ---
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+# name -> (type, help, label names, histogram buckets)
+METRIC_DEFINITIONS = {
+    'parking_http_requests_total': (
+        'counter', 'HTTP requests by route, method and status code.', ('method', 'route', 'status'), None),
+    'parking_http_request_duration_seconds': (
+        'histogram', 'Time spent in the request handler.', ('method', 'route'), LATENCY_BUCKETS),
+    'parking_db_statements_per_request': (
+        'histogram', 'SQL statements executed per request.', ('method', 'route'), STATEMENT_BUCKETS),
+    'parking_db_time_per_request_seconds': (
+        'histogram', 'Time spent executing SQL per request.', ('method', 'route'), LATENCY_BUCKETS),
+    'parking_db_slow_queries_total': (
+        'counter', 'SQL statements slower than SLOW_QUERY_MS.', ('route',), None),
+    'parking_db_repeated_statement_requests_total': (
+        'counter', 'Requests that ran one statement more than N_PLUS_ONE_THRESHOLD times (likely N+1).', ('route',), None),
+    'parking_password_hash_duration_seconds': (
+        'histogram', 'Password hashing and verification time, including pool queueing.', ('op',), LATENCY_BUCKETS),
+    'parking_profiler_dumps_total': (
+        'counter', 'Stack profiles written for slow requests.', ('route',), None),
+}
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class MetricsRegistry:
+    """
+    Counters and cumulative histograms, rendered in the Prometheus text format.
+    Note: values are per process; scrape every worker.
+    """
+
+    def __init__(self, definitions):
+        self.definitions = definitions
+        self._lock = threading.Lock()
+        self._values = {name: {} for name in definitions}
+
+    def inc(self, name, *labels, amount=1):
+        with self._lock:
+            series = self._values[name]
+            series[labels] = series.get(labels, 0) + amount
+
+    def observe(self, name, *labels, value):
+        buckets = self.definitions[name][3]
+        with self._lock:
+            series = self._values[name].get(labels)
+            if series is None:
+                series = self._values[name][labels] = [[0] * len(buckets), 0.0, 0] # bucket counts, sum, count
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self, extra=()):
+        """
+        Returns the exposition text. `extra` adds metrics computed at scrape time
+        as (name, type, help, label names, {labels: value}) tuples.
+        """
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, label_names, buckets) in self.definitions.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in sorted(self._values[name].items()):
+                    if kind != 'histogram':
+                        lines.append(f'{name}{format_labels(label_names, labels)} {value}')
+                        continue
+                    counts, total, count = value
+                    for bound, bucket_count in zip(buckets, counts):
+                        lines.append(f'{name}_bucket{format_labels(label_names + ("le",), labels + (bound,))} {bucket_count}')
+                    lines.append(f'{name}_bucket{format_labels(label_names + ("le",), labels + ("+Inf",))} {count}')
+                    lines.append(f'{name}_sum{format_labels(label_names, labels)} {total}')
+                    lines.append(f'{name}_count{format_labels(label_names, labels)} {count}')
+        for name, kind, help_text, label_names, values in extra:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(values.items()):
+                lines.append(f'{name}{format_labels(label_names, labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry(METRIC_DEFINITIONS)
+
+
+def current_route():
+    """Route template of the current request (not the raw path, to keep label cardinality bounded)."""
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    return 'unmatched' if has_request_context() else 'none'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    context.statement_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    """Adds the statement to the current request's totals and logs it if slow."""
+    elapsed = time.perf_counter() - context.statement_started
+    if not has_app_context():
+        return
+    if elapsed * 1000 >= app.config['SLOW_QUERY_MS']:
+        route = current_route()
+        metrics.inc('parking_db_slow_queries_total', route)
+        app.logger.warning(f"Slow query ({elapsed * 1000:.1f} ms) on {route}: {' '.join(statement.split())[:2000]}")
+    stats = g.get('sql_stats')
+    if stats is not None:
+        stats['count'] += 1
+        stats['seconds'] += elapsed
+        stats['statements'][statement] += 1
+
+
+@app.before_request
+def start_request_metrics():
+    if not app.config['METRICS_ENABLED']:
+        return
+    g.request_started = time.perf_counter()
+    g.sql_stats = {'count': 0, 'seconds': 0.0, 'statements': Counter()}
+    if app.config['PROFILE_SLOW_REQUEST_MS']:
+        request_profiler.start()
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    stats = g.pop('sql_stats')
+    method, route = request.method, current_route()
+
+    metrics.inc('parking_http_requests_total', method, route, str(response.status_code))
+    metrics.observe('parking_http_request_duration_seconds', method, route, value=elapsed)
+    metrics.observe('parking_db_statements_per_request', method, route, value=stats['count'])
+    metrics.observe('parking_db_time_per_request_seconds', method, route, value=stats['seconds'])
+
+    if stats['statements']:
+        statement, repeats = stats['statements'].most_common(1)[0]
+        if repeats > app.config['N_PLUS_ONE_THRESHOLD']:
+            metrics.inc('parking_db_repeated_statement_requests_total', route)
+            app.logger.warning(f"Possible N+1 on {method} {route}: statement ran {repeats} times: "
+                               f"{' '.join(statement.split())[:500]}")
+
+    if app.config['PROFILE_SLOW_REQUEST_MS']:
+        stacks = request_profiler.stop()
+        if stacks and elapsed * 1000 >= app.config['PROFILE_SLOW_REQUEST_MS']:
+            path = request_profiler.dump(stacks, method, route, elapsed)
+            metrics.inc('parking_profiler_dumps_total', route)
+            app.logger.warning(f"Slow request {method} {route} ({elapsed * 1000:.0f} ms); stack profile: {path}")
+
+    response.headers['Server-Timing'] = (
+        f'app;dur={elapsed * 1000:.1f}, db;dur={stats["seconds"] * 1000:.1f};desc="{stats["count"]} queries"'
+    )
+    return response
+
+
+class RequestProfiler:
+    """
+    Optional sampling profiler for slow requests (PROFILE_SLOW_REQUEST_MS > 0).
+
+    A daemon thread samples the stacks of threads currently handling a
+    request every PROFILE_SAMPLE_INTERVAL_MS. Requests slower than the
+    threshold get their samples written to PROFILE_DIR in the folded
+    format ("outer;inner;leaf count" per line) read by flamegraph.pl and
+    speedscope.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = {}  # thread id -> Counter of folded stacks
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample_forever, name='request-profiler', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            return self._active.pop(threading.get_ident(), None)
+
+    def _sample_forever(self):
+        while True:
+            time.sleep(app.config['PROFILE_SAMPLE_INTERVAL_MS'] / 1000)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, stacks in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[self.fold(frame)] += 1
+
+    @staticmethod
+    def fold(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def dump(self, stacks, method, route, elapsed):
+        directory = app.config['PROFILE_DIR'] or os.path.join(app.instance_path, 'profiles')
+        os.makedirs(directory, exist_ok=True)
+        slug = ''.join(ch if ch.isalnum() else '_' for ch in route).strip('_') or 'root'
+        path = os.path.join(directory, f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}_{method}_{slug}_{elapsed * 1000:.0f}ms.folded")
+        with open(path, 'w') as f:
+            for stack, count in stacks.most_common():
+                f.write(f'{stack} {count}\n')
+        return path
+
+
+request_profiler = RequestProfiler()
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint."""
+    caches = {'users': user_cache, 'lots': lot_cache}
+    extra = [
+        ('parking_cache_hits_total', 'counter', 'Read-through cache hits.', ('cache',),
+         {(name, ): cache.hits for name, cache in caches.items()}),
+        ('parking_cache_misses_total', 'counter', 'Read-through cache misses.', ('cache',),
+         {(name, ): cache.misses for name, cache in caches.items()}),
+        ('parking_cache_entries', 'gauge', 'Entries currently held by each cache.', ('cache',),
+         {(name, ): cache.stats()['size'] for name, cache in caches.items()}),
+    ]
+    return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4')
+# ------------------------------------------------
+
+
+# --- PASSWORD HASHING ---
+
+class PasswordHasher:
+    """
+    Runs Werkzeug password hashing on a bounded process pool.
+
+    Hashing is deliberately CPU-heavy; doing it on the request thread holds
+    the GIL and serializes logins. The pool is started on first use with one
+    process per core (PASSWORD_HASH_WORKERS) and at most
+    PASSWORD_HASH_MAX_PENDING hashes are queued; further callers wait.
+    With PASSWORD_HASH_WORKERS=0 hashing runs inline.
+    """
+
+    def __init__(self, method, workers, max_pending):
+        self.method = method
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._executor = None
+        # Werkzeug expands defaults (e.g. 'scrypt' -> 'scrypt:32768:8:1'); hash once, at startup,
+        # to learn the prefix, so that no login pays for it on its request thread
+        self._method_prefix = generate_password_hash('', method).split('$', 1)[0]
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: workers must not inherit the app's threads and DB connections
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def _run(self, op, fn, *args):
+        started = time.perf_counter()
+        try:
+            return self._call(fn, *args)
+        finally:
+            metrics.observe('parking_password_hash_duration_seconds', op, value=time.perf_counter() - started)
+
+    def _call(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        with self._slots:
+            try:
+                return self._get_executor().submit(fn, *args).result()
+            except BrokenProcessPool:
+                app.logger.error("Password hashing pool died; restarting it")
+                with self._lock:
+                    self._executor = None
+                return fn(*args)
+
+    def hash(self, password):
+        return self._run('hash', generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run('verify', check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True if pwhash was made with a different method or cost than configured."""
+        return pwhash.split('$', 1)[0] != self._method_prefix
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+password_hasher = PasswordHasher(
+    app.config['PASSWORD_HASH_METHOD'],
+    app.config['PASSWORD_HASH_WORKERS'],
+    app.config['PASSWORD_HASH_MAX_PENDING'],
+)
+# -------------------------
+
 # --- DATABASE MODELS (SQLAlchemy) ---
 
 class User(db.Model):
     __tablename__ = 'user'
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), unique=True, nullable=False) # This will be the email
-    password_hash = db.Column(db.String(128), nullable=False) # Hashed password
+    password_hash = db.Column(db.String(255), nullable=False) # Hashed password (scrypt hashes are 162 chars)
     role = db.Column(db.String(10), nullable=False) 
     full_name = db.Column(db.String(100))
 
     def set_password(self, password):
         """Hashes the password before storing."""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
         """Checks the plain text password against the stored hash."""
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+
+    def upgrade_password_hash(self, password):
+        """
+        Re-hashes a verified password if it was stored with an outdated method
+        or cost. Returns True if password_hash changed (caller commits).
+        """
+        if not password_hasher.needs_rehash(self.password_hash):
+            return False
+        self.set_password(password)
+        return True
     
 class ParkingSpot(db.Model):
     __tablename__ = 'parking_spot'
@@ -53,6 +424,11 @@ class ParkingSpot(db.Model):
     # One-to-many relationship: One spot can have many bookings over time
     bookings = db.relationship('Booking', back_populates='spot', cascade="all, delete-orphan", lazy='dynamic')
 
+    __table_args__ = (
+        # Per-lot spot listing and occupied/free counts
+        db.Index('ix_parking_spot_lot_occupied', 'lot_id', 'is_occupied'),
+    )
+
     def to_dict(self):
         """Converts spot instance to a dictionary for JSON."""
         return {
@@ -76,11 +452,17 @@ class ParkingLot(db.Model):
     # --- MODIFIED THIS RELATIONSHIP ---
     spots = db.relationship('ParkingSpot', back_populates='lot', lazy='dynamic', cascade="all, delete-orphan") 
 
-    def to_dict(self):
-        """Converts lot instance to a dictionary for JSON response, including spot details."""
-        occupied_count = self.spots.filter(ParkingSpot.is_occupied == True).count()
+    def to_dict(self, occupied=None, spots=None, include_spots=True):
+        """Converts lot instance to a dictionary for JSON response, including spot details.
+
+        Bulk callers (GET /api/lots) pass pre-computed `occupied` and `spots`
+        so no per-lot queries are issued; `include_spots=False` drops the
+        per-spot array for summary views.
+        """
+        if occupied is None:
+            occupied = self.spots.filter(ParkingSpot.is_occupied == True).count()
         
-        return {
+        data = {
             'id': self.id,
             'name': self.name,
             'number': f'#{self.id}', 
@@ -88,9 +470,60 @@ class ParkingLot(db.Model):
             'pincode': self.pincode,
             'price': self.price_per_hour,
             'maxSpots': self.max_spots,
-            'occupied': occupied_count,
-            'spots': [spot.to_dict() for spot in self.spots.all()] 
+            'occupied': occupied
         }
+        if include_spots:
+            if spots is None:
+                spots = self.spots.all()
+            data['spots'] = [spot.to_dict() for spot in spots]
+        return data
+
+# Full-text index over lot names/addresses for GET /api/lots/search (SQLite FTS5).
+# External-content table kept in sync by triggers, so writers need no changes.
+LOT_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS parking_lot_fts USING fts5("
+    "name, address, content='parking_lot', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS parking_lot_fts_insert AFTER INSERT ON parking_lot BEGIN "
+    "INSERT INTO parking_lot_fts(rowid, name, address) VALUES (new.id, new.name, new.address); END",
+    "CREATE TRIGGER IF NOT EXISTS parking_lot_fts_delete AFTER DELETE ON parking_lot BEGIN "
+    "INSERT INTO parking_lot_fts(parking_lot_fts, rowid, name, address) VALUES ('delete', old.id, old.name, old.address); END",
+    "CREATE TRIGGER IF NOT EXISTS parking_lot_fts_update AFTER UPDATE OF name, address ON parking_lot BEGIN "
+    "INSERT INTO parking_lot_fts(parking_lot_fts, rowid, name, address) VALUES ('delete', old.id, old.name, old.address); "
+    "INSERT INTO parking_lot_fts(rowid, name, address) VALUES (new.id, new.name, new.address); END",
+)
+
+
+def create_lot_search_index(connection):
+    """
+    Creates the parking_lot_fts index and its triggers if missing, filling it
+    from existing lots. SQLite only; other databases (or SQLite builds
+    without FTS5) fall back to substring matching in search_lots.
+    Returns True if the index was created.
+    """
+    if connection.dialect.name != 'sqlite':
+        return False
+    if connection.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'parking_lot_fts'").first():
+        return False
+    try:
+        for ddl in LOT_FTS_DDL:
+            connection.exec_driver_sql(ddl)
+    except OperationalError as e:
+        app.logger.error(f"Could not create lot search index (is FTS5 available?): {e}")
+        return False
+    connection.exec_driver_sql("INSERT INTO parking_lot_fts(parking_lot_fts) VALUES ('rebuild')")
+    return True
+
+
+@event.listens_for(ParkingLot.__table__, 'after_create')
+def create_lot_search_index_with_table(target, connection, **kw):
+    create_lot_search_index(connection)
+
+
+@event.listens_for(ParkingLot.__table__, 'before_drop')
+def drop_lot_search_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql("DROP TABLE IF EXISTS parking_lot_fts")
+
 
 class Booking(db.Model):
     __tablename__ = 'booking'
@@ -119,6 +552,24 @@ class Booking(db.Model):
     user = db.relationship('User')
     spot = db.relationship('ParkingSpot' , back_populates='bookings')
 
+    __table_args__ = (
+        # At most one Active booking per spot, enforced by the database
+        db.Index('uq_booking_active_spot', 'spot_id', unique=True,
+                 sqlite_where=db.text("status = 'Active'"),
+                 postgresql_where=db.text("status = 'Active'")),
+        # Keyset pagination of a user's history (my-bookings / user-summary)
+        db.Index('ix_booking_customer_start', 'customer_id', 'start_time', 'id'),
+        db.Index('ix_booking_customer_id', 'customer_id', 'id'),
+        # A spot's booking history (ParkingSpot.bookings, lot resize/delete)
+        db.Index('ix_booking_spot_status', 'spot_id', 'status'),
+        # Stays overlapping a time range (occupancy analytics)
+        db.Index('ix_booking_end_time', 'end_time'),
+        # The open stay of a vehicle (gate exit events)
+        db.Index('ix_booking_vehicle_status', 'vehicle_number', 'status'),
+        # Ids move to booking_archive and must never be handed out again
+        {'sqlite_autoincrement': True},
+    )
+
 
 # --- ADD THIS NEW MODEL ---
 class Billing(db.Model):
@@ -140,6 +591,12 @@ class Billing(db.Model):
     # Creates the one-to-one link back to the Booking
     booking = db.relationship('Booking', back_populates='billing') 
 
+    __table_args__ = (
+        # Completed-bill aggregations (revenue rollup rebuild)
+        db.Index('ix_billing_status_time', 'status', 'billing_time'),
+        {'sqlite_autoincrement': True}, # See Booking
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -151,523 +608,4266 @@ class Billing(db.Model):
 # -------------------------
 
 
-# --- FRONTEND ROUTES ---
+class LotRevenueDaily(db.Model):
+    """
+    Revenue rollup: completed billing totals per lot per (UTC) day.
+    Maintained by release_spot in the same transaction as the Billing,
+    rebuildable from scratch with `flask --app main rebuild-revenue-rollup`.
+    Rows outlive their lot (no foreign key): a deleted lot's revenue stays
+    in the profit reports under its archived name.
+    """
+    __tablename__ = 'lot_revenue_daily'
+    lot_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    total_revenue = db.Column(db.Float, nullable=False, default=0)
+    bill_count = db.Column(db.Integer, nullable=False, default=0)
 
-@app.route('/')
-def serve_index_page():
-    """Serves the main (Admin) Login page (index.html)."""
-    return render_template('index.html')
+    __table_args__ = (
+        # Date-range profit queries across all lots
+        db.Index('ix_lot_revenue_daily_day', 'day', 'lot_id'),
+    )
 
-@app.route('/login', methods=['POST'])
-def handle_login():
-    """Handles Admin login form submission."""
-    username = request.form.get('username')
-    password = request.form.get('password')
 
-    user = User.query.filter_by(username=username).first()
+class LotOccupancyHourly(db.Model):
+    """
+    Occupancy analytics buckets: per lot per UTC hour, the occupied
+    spot-seconds and the peak number of occupied spots (see occupancy.py).
+    Written once an hour has passed by extend_occupancy_buckets; hours
+    without occupancy have no row. Removed with the lot by run_lot_deletion.
+    """
+    __tablename__ = 'lot_occupancy_hourly'
+    lot_id = db.Column(db.Integer, primary_key=True)
+    hour = db.Column(db.Integer, primary_key=True) # Hours since 1970-01-01 00:00 UTC
+    occupied_seconds = db.Column(db.Float, nullable=False)
+    peak = db.Column(db.Integer, nullable=False)
 
-    if user and user.check_password(password) and user.role == 'Admin':
-        # NOTE: In a real app, you would start a session here
-        return redirect(url_for('serve_admin_dashboard'))
-    else:
-        flash('Invalid username or password, or insufficient permissions.', 'error')
-        return redirect(url_for('serve_index_page')) # <-- Corrected redirect
 
-@app.route('/admin-dashboard')
-def serve_admin_dashboard():
-    return render_template('admin_page.html')
+class LotOccupancyWatermark(db.Model):
+    """Buckets of a lot's hours before computed_until are complete. No row: none computed yet."""
+    __tablename__ = 'lot_occupancy_watermark'
+    lot_id = db.Column(db.Integer, primary_key=True)
+    computed_until = db.Column(db.Integer, nullable=False) # Hour number
 
-@app.route('/admin-summary')
-def serve_admin_summary():
-    return render_template('admin_summary.html')
 
-# --- NEW USER PAGE ROUTE ---
-@app.route('/user-dashboard-page')
-def serve_user_dashboard_page():
-    """Serves the User page (user_page.html)."""
-    return render_template('user_dashboard.html')
-# ------------------------------
 
-@app.route('/user-summary')
-def serve_user_summary():
-    return render_template('user_summary.html')
+class TariffPlan(db.Model):
+    """
+    Time-of-day pricing for a lot, applied on top of its price_per_hour by
+    billing.py. Lots without a plan bill a flat price_per_hour.
+    """
+    __tablename__ = 'tariff_plan'
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id', ondelete='CASCADE'), primary_key=True)
+    peak_start_hour = db.Column(db.Integer, nullable=True) # Weekday peak window [start, end), local hours
+    peak_end_hour = db.Column(db.Integer, nullable=True)
+    peak_multiplier = db.Column(db.Float, nullable=False, default=1.0)
+    weekend_multiplier = db.Column(db.Float, nullable=False, default=1.0)
+    daily_cap = db.Column(db.Float, nullable=True) # Most charged per calendar day
 
-# --- ADD THIS NEW ROUTE TO main.py ---
-@app.route('/my-booking')
-def serve_my_booking_page():
-    """Serves the 'My Booking' page (my_booking.html)."""
-    return render_template('my_booking.html')
 
-@app.route('/user-page')
-def serve_user_page():
-    """Serves the User page (user_page.html) after they log in."""
-    # NOTE: In a real app, this route would check if a session exists
-    return render_template('user_page.html')
+def make_tariff(price_per_hour, plan):
+    """billing.Tariff for a lot's price and its TariffPlan (or a row of its columns, or None)."""
+    if plan is None or plan.lot_id is None:
+        return flat_tariff(price_per_hour)
+    return Tariff(price_per_hour, plan.peak_start_hour, plan.peak_end_hour,
+                  plan.peak_multiplier, plan.weekend_multiplier, plan.daily_cap)
 
-# --- RENAMED ROUTE ---
-@app.route('/register-page') 
-def serve_user_reg_page():
-    """Serves the User Registration page (user_reg.html)."""
-    return render_template('user_reg.html')
-# ------------------------------
 
-# --- NEW USER LOGIN PAGE ROUTE ---
-@app.route('/user-login')
-def serve_user_login_page():
-    """Serves the new User Login page (user_login.html)."""
-    return render_template('user_login.html')
-# ------------------------------
+TARIFF_COLUMNS = (TariffPlan.lot_id, TariffPlan.peak_start_hour, TariffPlan.peak_end_hour,
+                  TariffPlan.peak_multiplier, TariffPlan.weekend_multiplier, TariffPlan.daily_cap)
+TariffRow = namedtuple('TariffRow', 'lot_id peak_start_hour peak_end_hour peak_multiplier weekend_multiplier daily_cap')
 
 
-# --- UTILITY ROUTE FOR SETUP (TEMPORARY) ---
+class Reservation(db.Model):
+    """
+    A spot held for a future window [start_time, end_time): Upcoming ->
+    CheckedIn (an Active Booking is created on arrival) or Cancelled.
+    Windows of Upcoming and CheckedIn reservations of a spot never overlap;
+    an Upcoming one whose window has passed is a no-show.
+    """
+    __tablename__ = 'reservation'
+    id = db.Column(db.Integer, primary_key=True)
+    spot_id = db.Column(db.Integer, db.ForeignKey('parking_spot.id', ondelete='CASCADE'), nullable=False)
+    customer_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
+    vehicle_number = db.Column(db.String(20), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='Upcoming')
+    booking_id = db.Column(db.Integer, db.ForeignKey('booking.id', ondelete='SET NULL'), nullable=True) # Set on check-in
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
-@app.route('/setup-admin')
-def setup_admin():
-    """Temporary route to create the initial admin user if none exists."""
-    with app.app_context():
-        admin_exists = User.query.filter_by(role='Admin').first()
-        if admin_exists:
-            return "Admin user already set up."
-        
-        new_admin = User(username='admin', role='Admin', full_name='System Admin')
-        new_admin.set_password('password123') 
-        
-        db.session.add(new_admin)
-        db.session.commit()
-        return "Initial Admin User ('admin' / 'password123') created successfully!"
+    __table_args__ = (
+        # Windows of a spot overlapping a time range (availability checks)
+        db.Index('ix_reservation_spot_end', 'spot_id', 'end_time'),
+        # A user's current reservations
+        db.Index('ix_reservation_customer_end', 'customer_id', 'end_time'),
+        # Loading the ReservationIndex
+        db.Index('ix_reservation_end_time', 'end_time'),
+    )
 
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'spot_id': self.spot_id,
+            'customer_id': self.customer_id,
+            'vehicle_number': self.vehicle_number,
+            'start_time': self.start_time.isoformat(),
+            'end_time': self.end_time.isoformat(),
+            'status': self.status,
+            'booking_id': self.booking_id
+        }
 
-# --- API ROUTES ---
 
-# --- ADD THIS NEW API ROUTE FOR PROFIT SUMMARY ---
-@app.route('/api/summary/profit-by-lot', methods=['GET'])
-def get_profit_summary():
-    """Calculates the total profit for each parking lot based on completed billings."""
-    try:
-        # Query to join Billing, Booking, ParkingSpot, and ParkingLot
-        # and filter for completed billings
-        profit_data = db.session.query(
-            ParkingLot.id,
-            ParkingLot.name,
-            db.func.sum(Billing.final_cost) # Sum the final_cost for each lot
-        ).select_from(Billing).join(
-            Booking, Billing.booking_id == Booking.id
-        ).join(
-            ParkingSpot, Booking.spot_id == ParkingSpot.id
-        ).join(
-            ParkingLot, ParkingSpot.lot_id == ParkingLot.id
-        ).filter(
-            Billing.status == 'Completed' # Only include completed/paid bills
-        ).group_by(
-            ParkingLot.id, ParkingLot.name # Group by lot to sum costs per lot
-        ).order_by(
-            ParkingLot.id # Optional: order by lot ID
-        ).all()
+HOLDING_STATUSES = ('Upcoming', 'CheckedIn') # Reservations that keep their window
 
-        results = [
-            {
-                'lot_id': lot_id,
-                'lot_name': lot_name,
-                'total_profit': total_profit if total_profit is not None else 0 # Handle cases with no profit yet
-            }
-            for lot_id, lot_name, total_profit in profit_data
-        ]
 
-        return jsonify(results), 200
+# --- ARCHIVE TABLES (COLD BOOKING HISTORY) ---
+# Completed bookings and bills moved out of the live tables, either because
+# their lot was deleted or by `flask compact-bookings` once they are old.
+# The live booking/billing tables then hold only active and recent rows.
+# No foreign keys: the spot and lot they referred to may no longer exist,
+# so the lot id and spot number are copied onto the archived booking.
 
-    except Exception as e:
-        app.logger.error(f"Error calculating profit summary: {e}")
-        return jsonify({'error': 'An internal server error occurred while calculating profit.'}), 500
-# ----------------------------------------------
+class ArchivedLot(db.Model):
+    __tablename__ = 'parking_lot_archive'
+    id = db.Column(db.Integer, primary_key=True) # Id the lot had while live
+    name = db.Column(db.String(100), nullable=False)
+    address = db.Column(db.String(200), nullable=False)
+    pincode = db.Column(db.String(10), nullable=False)
+    price_per_hour = db.Column(db.Float, nullable=False)
+    max_spots = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
-@app.route('/register', methods=['POST'])
-def register_user():
-    """Handles the user registration API call from script.js."""
-    
-    data = request.get_json()
-    if not data:
-        return jsonify({'error': 'No data provided'}), 400
 
-    username = data.get('username') # This is the email
-    password = data.get('password')
-    full_name = data.get('full_name')
+class ArchivedBooking(db.Model):
+    __tablename__ = 'booking_archive'
+    id = db.Column(db.Integer, primary_key=True) # Id the booking had while live
+    spot_id = db.Column(db.Integer, nullable=False)
+    lot_id = db.Column(db.Integer, nullable=False)
+    spot_number = db.Column(db.String(10), nullable=False)
+    customer_id = db.Column(db.Integer, nullable=True)
+    vehicle_number = db.Column(db.String(20), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=True)
+    status = db.Column(db.String(10), nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False)
 
-    if not username or not password or not full_name:
-        return jsonify({'error': 'Missing required fields'}), 400
-    if len(password) < 8:
-        return jsonify({'error': 'Password must be at least 8 characters long'}), 400
+    __table_args__ = (
+        db.Index('ix_booking_archive_customer_start', 'customer_id', 'start_time', 'id'),
+        db.Index('ix_booking_archive_lot', 'lot_id'),
+        db.Index('ix_booking_archive_end_time', 'end_time'), # See Booking
+    )
 
-    existing_user = User.query.filter_by(username=username).first()
-    if existing_user:
-        return jsonify({'error': 'Username (email) already exists'}), 409 # 409 Conflict
 
-    try:
-        new_user = User(
-            username=username,
-            full_name=full_name,
-            role='User'  # Default role for new signups
-        )
-        new_user.set_password(password) # Hash the password
+class ArchivedBilling(db.Model):
+    __tablename__ = 'billing_archive'
+    id = db.Column(db.Integer, primary_key=True) # Id the bill had while live
+    booking_id = db.Column(db.Integer, nullable=False, unique=True)
+    status = db.Column(db.String(20), nullable=False)
+    final_cost = db.Column(db.Float, nullable=True)
+    billing_time = db.Column(db.DateTime, nullable=True)
+    archived_at = db.Column(db.DateTime, nullable=False)
 
-        db.session.add(new_user)
+    __table_args__ = (
+        db.Index('ix_billing_archive_status_time', 'status', 'billing_time'),
+    )
+
+
+def archive_bookings(booking_ids, archived_at):
+    """
+    Copies the given Completed bookings and their bills into the archive
+    tables with INSERT ... SELECT (no rows pass through Python), then
+    deletes them from the live tables. Runs in the caller's transaction.
+    Returns the number of bookings archived.
+    """
+    if not booking_ids:
+        return 0
+    db.session.execute(ArchivedBooking.__table__.insert().from_select(
+        ['id', 'spot_id', 'lot_id', 'spot_number', 'customer_id', 'vehicle_number',
+         'start_time', 'end_time', 'status', 'archived_at'],
+        db.select(
+            Booking.id, Booking.spot_id, ParkingSpot.lot_id, ParkingSpot.spot_number, Booking.customer_id,
+            Booking.vehicle_number, Booking.start_time, Booking.end_time, Booking.status,
+            db.literal(archived_at, db.DateTime)
+        ).join(ParkingSpot, ParkingSpot.id == Booking.spot_id).where(Booking.id.in_(booking_ids))
+    ))
+    db.session.execute(ArchivedBilling.__table__.insert().from_select(
+        ['id', 'booking_id', 'status', 'final_cost', 'billing_time', 'archived_at'],
+        db.select(
+            Billing.id, Billing.booking_id, Billing.status, Billing.final_cost, Billing.billing_time,
+            db.literal(archived_at, db.DateTime)
+        ).where(Billing.booking_id.in_(booking_ids))
+    ))
+    db.session.execute(db.delete(Billing).where(Billing.booking_id.in_(booking_ids)))
+    return db.session.execute(db.delete(Booking).where(Booking.id.in_(booking_ids))).rowcount
+
+
+def compact_booking_history(older_than_days, chunk_size):
+    """
+    Moves Completed bookings that ended more than `older_than_days` ago, and
+    their bills, to the archive tables, chunk_size bookings per transaction.
+    Walks the booking primary key, so each chunk costs the same. The newest
+    booking and bill always stay live: on databases created before the
+    tables used AUTOINCREMENT, SQLite would otherwise reuse their ids.
+    Returns the number of bookings archived.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    newest_booking = db.session.query(db.func.max(Booking.id)).scalar()
+    newest_bill_booking = db.session.query(Billing.booking_id).order_by(Billing.id.desc()).limit(1).scalar()
+    keep = {newest_booking, newest_bill_booking} - {None}
+    archived, last_id = 0, 0
+    while True:
+        booking_ids = db.session.execute(
+            db.select(Booking.id).where(
+                Booking.id > last_id,
+                Booking.status == 'Completed',
+                Booking.end_time < cutoff
+            ).order_by(Booking.id).limit(chunk_size)
+        ).scalars().all()
+        if not booking_ids:
+            return archived
+        last_id = booking_ids[-1]
+        archived += archive_bookings([booking_id for booking_id in booking_ids if booking_id not in keep], datetime.utcnow())
         db.session.commit()
 
-        return jsonify({'message': 'Registration successful! You can now login.'}), 201
 
-    except Exception as e:
-        db.session.rollback()
-        app.logger.error(f"Error during registration: {e}")
-        return jsonify({'error': 'An internal server error occurred.'}), 500
+@app.cli.command('compact-bookings')
+@click.option('--older-than-days', type=int, default=None,
+              help='Archive completed bookings that ended this many days ago (default: ARCHIVE_AFTER_DAYS).')
+def compact_bookings_command(older_than_days):
+    """Moves old completed bookings and bills to the archive tables. Run it periodically (e.g. nightly cron)."""
+    db.create_all() # Creates the archive tables on databases that predate them
+    if older_than_days is None:
+        older_than_days = app.config['ARCHIVE_AFTER_DAYS']
+    started = time.perf_counter()
+    archived = compact_booking_history(older_than_days, app.config['COMPACTION_CHUNK_SIZE'])
+    print(f"Archived {archived} bookings older than {older_than_days} days in {time.perf_counter() - started:.1f}s.")
+# ------------------------------------------------
 
-# --- USER LOGIN API ROUTE (CORRECTED) ---
-@app.route('/user-login-api', methods=['POST'])
-def handle_user_login():
-    """Handles the user login API call from user_login.js."""
-    
-    data = request.get_json()
-    if not data:
-        return jsonify({'error': 'No data provided'}), 400
+# --- IN-MEMORY OCCUPANCY INDEX ---
 
-    username = data.get('username') # This is the email
-    password = data.get('password')
+class OccupancyIndex:
+    """
+    Per-lot free-list of spot ids, mirrored from parking_spot.is_occupied.
 
-    if not username or not password:
-        return jsonify({'error': 'Missing email or password'}), 400
+    Loaded lazily on first use and kept up to date by the write endpoints
+    after each successful commit. The database stays authoritative: callers
+    that claim a spot from the index still verify it against the row.
+    Note: the index is per process.
+    """
 
-    # Find the user by their email
-    user = User.query.filter_by(username=username).first()
+    def __init__(self, max_age=None):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._loaded_at = 0.0
+        self.max_age = max_age  # Seconds before a reload; None keeps the index until reset()
+        self._free = {}      # lot_id -> set of free spot ids
+        self._spots = {}     # lot_id -> set of all spot ids
+        self._spot_lot = {}  # spot_id -> lot_id
 
-    # Check if user exists, password is correct, AND role is 'User'
-    if user and user.check_password(password) and user.role == 'User':
-        # NOTE: This is where you would create a user session
+    def _ensure_loaded(self):
+        # Caller must hold self._lock
+        if self._loaded:
+            if self.max_age is None or time.monotonic() - self._loaded_at < self.max_age:
+                return
+            # Stale: other worker processes may have booked or released spots
+            self._free, self._spots, self._spot_lot = {}, {}, {}
+        for (lot_id,) in db.session.query(ParkingLot.id).all():
+            self._free[lot_id] = set()
+            self._spots[lot_id] = set()
+        rows = db.session.query(ParkingSpot.id, ParkingSpot.lot_id, ParkingSpot.is_occupied).all()
+        for spot_id, lot_id, is_occupied in rows:
+            self._free.setdefault(lot_id, set())
+            self._spots.setdefault(lot_id, set()).add(spot_id)
+            self._spot_lot[spot_id] = lot_id
+            if not is_occupied:
+                self._free[lot_id].add(spot_id)
+        self._loaded = True
+        self._loaded_at = time.monotonic()
+
+    def reset(self):
+        """Drops the index so it is rebuilt from the database on next use."""
+        with self._lock:
+            self._loaded = False
+            self._free, self._spots, self._spot_lot = {}, {}, {}
+
+    def add_spots(self, lot_id, spot_ids):
+        """Registers new (free) spots for a lot, creating the lot entry if needed."""
+        with self._lock:
+            if not self._loaded:
+                return  # Picked up by the initial load
+            free = self._free.setdefault(lot_id, set())
+            spots = self._spots.setdefault(lot_id, set())
+            for spot_id in spot_ids:
+                self._spot_lot[spot_id] = lot_id
+                spots.add(spot_id)
+                free.add(spot_id)
+
+    def remove_lot(self, lot_id):
+        with self._lock:
+            if not self._loaded:
+                return
+            for spot_id in self._spots.pop(lot_id, ()):
+                self._spot_lot.pop(spot_id, None)
+            self._free.pop(lot_id, None)
+
+    def remove_spots(self, lot_id, spot_ids):
+        with self._lock:
+            if not self._loaded:
+                return
+            for spot_id in spot_ids:
+                self._spot_lot.pop(spot_id, None)
+                self._spots.get(lot_id, set()).discard(spot_id)
+                self._free.get(lot_id, set()).discard(spot_id)
+
+    def mark_occupied(self, spot_id):
+        with self._lock:
+            self._ensure_loaded()
+            lot_id = self._spot_lot.get(spot_id)
+            if lot_id is not None:
+                self._free[lot_id].discard(spot_id)
+
+    def mark_free_many(self, spot_ids):
+        for spot_id in spot_ids:
+            self.mark_free(spot_id)
+
+    def mark_free(self, spot_id):
+        with self._lock:
+            self._ensure_loaded()
+            lot_id = self._spot_lot.get(spot_id)
+            if lot_id is not None:
+                self._free[lot_id].add(spot_id)
+
+    def is_occupied(self, spot_id):
+        """Returns True/False, or None if the spot is unknown to the index."""
+        with self._lock:
+            self._ensure_loaded()
+            lot_id = self._spot_lot.get(spot_id)
+            if lot_id is None:
+                return None
+            return spot_id not in self._free[lot_id]
+
+    def claim_free(self, lot_id, exclude=()):
+        """
+        Removes and returns any free spot id of the lot that is not in
+        `exclude`, or None if there is none. O(1) without exclusions.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            free = self._free.get(lot_id)
+            if not free:
+                return None
+            if not exclude:
+                return free.pop()
+            spot_id = next((spot_id for spot_id in free if spot_id not in exclude), None)
+            free.discard(spot_id)
+            return spot_id
+
+    def lot_of(self, spot_id):
+        """Returns the lot id a spot belongs to, or None if unknown."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._spot_lot.get(spot_id)
+
+    def free_counts(self, lot_ids=None):
+        """Returns {lot_id: free_count} without touching the database."""
+        with self._lock:
+            self._ensure_loaded()
+            if lot_ids is None:
+                lot_ids = self._free.keys()
+            return {lot_id: len(self._free[lot_id]) for lot_id in lot_ids if lot_id in self._free}
+
+    def occupied_counts(self, lot_ids=None):
+        """Returns {lot_id: occupied_count} without touching the database."""
+        with self._lock:
+            self._ensure_loaded()
+            if lot_ids is None:
+                lot_ids = self._spots.keys()
+            return {
+                lot_id: len(self._spots[lot_id]) - len(self._free[lot_id])
+                for lot_id in lot_ids if lot_id in self._spots
+            }
+
+    def lot_spots(self, lot_id):
+        """Returns (sorted spot ids, set of free spot ids) of a lot, or None if the lot is unknown."""
+        with self._lock:
+            self._ensure_loaded()
+            if lot_id not in self._spots:
+                return None
+            return sorted(self._spots[lot_id]), set(self._free[lot_id])
+
+
+occupancy_index = OccupancyIndex(max_age=app.config['OCCUPANCY_INDEX_MAX_AGE'])
+# ---------------------------------
+
+
+# --- IN-MEMORY RESERVATION INDEX ---
+
+class ReservationIndex:
+    """
+    Per-lot reservation schedules: lot_id -> {spot_id: reservations.SpotSchedule}
+    of the Upcoming and CheckedIn windows that have not ended yet.
+
+    Loaded lazily and kept up to date by the reservation endpoints after
+    each successful commit, like OccupancyIndex (and reloaded after the
+    same max_age). It answers availability queries and narrows candidate
+    spots; the database stays authoritative (see reserved_spot_ids).
+    Note: the index is per process.
+    """
+
+    def __init__(self, max_age=None):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._loaded_at = 0.0
+        self.max_age = max_age
+        self._lots = {} # lot_id -> {spot_id: SpotSchedule}
+
+    def _ensure_loaded(self):
+        # Caller must hold self._lock
+        if self._loaded and (self.max_age is None or time.monotonic() - self._loaded_at < self.max_age):
+            return
+        self._lots = {}
+        rows = db.session.query(
+            Reservation.id, Reservation.spot_id, ParkingSpot.lot_id, Reservation.start_time, Reservation.end_time
+        ).join(ParkingSpot, ParkingSpot.id == Reservation.spot_id).filter(
+            Reservation.end_time > datetime.utcnow(),
+            Reservation.status.in_(HOLDING_STATUSES)
+        )
+        for reservation_id, spot_id, lot_id, start, end in rows:
+            self._schedule(lot_id, spot_id).add(reservation_id, start, end)
+        self._loaded = True
+        self._loaded_at = time.monotonic()
+
+    def _schedule(self, lot_id, spot_id):
+        schedules = self._lots.setdefault(lot_id, {})
+        schedule = schedules.get(spot_id)
+        if schedule is None:
+            schedule = schedules[spot_id] = SpotSchedule()
+        return schedule
+
+    def reset(self):
+        """Drops the index so it is rebuilt from the database on next use."""
+        with self._lock:
+            self._loaded = False
+            self._lots = {}
+
+    def add(self, lot_id, spot_id, reservation_id, start, end):
+        with self._lock:
+            if not self._loaded:
+                return # Picked up by the initial load
+            schedule = self._schedule(lot_id, spot_id)
+            schedule.prune(datetime.utcnow())
+            schedule.add(reservation_id, start, end)
+
+    def remove(self, lot_id, spot_id, reservation_id):
+        with self._lock:
+            schedule = self._lots.get(lot_id, {}).get(spot_id)
+            if schedule is not None:
+                schedule.remove(reservation_id)
+
+    def remove_lot(self, lot_id):
+        with self._lock:
+            self._lots.pop(lot_id, None)
+
+    def reserved_spots(self, lot_id, start, end):
+        """Set of the lot's spot ids with a reservation overlapping [start, end)."""
+        with self._lock:
+            self._ensure_loaded()
+            return {spot_id for spot_id, schedule in self._lots.get(lot_id, {}).items()
+                    if schedule.first_overlap(start, end) is not None}
+
+    def free_spots(self, lot_id, spot_ids, start, end):
+        """The spot_ids (of this lot) without a reservation overlapping [start, end), in order."""
+        with self._lock:
+            self._ensure_loaded()
+            return free_spots(self._lots.get(lot_id, {}), spot_ids, start, end)
+
+
+reservation_index = ReservationIndex(max_age=app.config['OCCUPANCY_INDEX_MAX_AGE'])
+# ---------------------------------
+
+
+# --- LIVE OCCUPANCY FEED (SERVER-SENT EVENTS) ---
+
+class OccupancyFeed:
+    """
+    In-process publish/subscribe log of occupancy deltas for GET /api/lots/stream.
+
+    Every published event gets the next version number. The most recent
+    events are kept in a ring buffer so a reconnecting client can resume
+    from its last version; if that version has fallen out of the buffer the
+    client is told to reload its snapshot instead. Note: the feed is per process.
+    """
+
+    def __init__(self, history=5000):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=history) # (version, event, data, SSE text)
+        self._version = 0
+        self._async_waiters = set() # (loop, future) of event-loop subscribers (server.py)
+
+    @property
+    def version(self):
+        with self._cond:
+            return self._version
+
+    def publish(self, event, data):
+        with self._cond:
+            self._version += 1
+            # Formatted once here rather than once per subscribed stream
+            self._events.append((self._version, event, data, format_sse(self._version, event, data)))
+            self._cond.notify_all()
+            version = self._version
+            waiters, self._async_waiters = self._async_waiters, set()
+        futures_by_loop = {}
+        for loop, future in waiters:
+            futures_by_loop.setdefault(loop, []).append(future)
+        for loop, futures in futures_by_loop.items():
+            loop.call_soon_threadsafe(resolve_futures, futures) # One wake-up per event loop
+        return version
+
+    def _events_since(self, since):
+        oldest = self._events[0][0] if self._events else self._version + 1
+        if since > self._version or since < oldest - 1:
+            return None
+        return [item for item in self._events if item[0] > since]
+
+    def wait_for_events(self, since, timeout):
+        """
+        Returns the events newer than `since`, waiting up to `timeout` seconds
+        for one to arrive. Returns None if `since` cannot be resumed from.
+        """
+        with self._cond:
+            if since == self._version:
+                self._cond.wait(timeout)
+            return self._events_since(since)
+
+    async def wait_for_events_async(self, since, timeout):
+        """wait_for_events for coroutines: waits on the event loop instead of blocking a thread."""
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if since != self._version:
+                return self._events_since(since)
+            waiter = (loop, loop.create_future())
+            self._async_waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # Also on cancellation (shutdown): a stale waiter would make publish wake a closed loop
+            with self._cond:
+                self._async_waiters.discard(waiter)
+        with self._cond:
+            return self._events_since(since)
+
+
+def resolve_futures(futures):
+    for future in futures:
+        if not future.done():
+            future.set_result(None)
+
+
+occupancy_feed = OccupancyFeed()
+
+
+def publish_spot_change(spot_id):
+    """Publishes a spot's new state and its lot's occupied count (call after commit + index update)."""
+    lot_id = occupancy_index.lot_of(spot_id)
+    if lot_id is None:
+        return
+    occupancy_feed.publish('spot', {
+        'lotId': lot_id,
+        'spotId': spot_id,
+        'status': 1 if occupancy_index.is_occupied(spot_id) else 0,
+        'occupied': occupancy_index.occupied_counts([lot_id]).get(lot_id, 0)
+    })
+
+
+def publish_lot_change(action, lot_data):
+    """Publishes a lot created/updated/deleted event. `lot_data` is a summary lot dict (no spots)."""
+    occupancy_feed.publish('lot', {'action': action, 'lotId': lot_data['id'], 'lot': lot_data})
+
+
+def format_sse(version, event, data):
+    return f"id: {version}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class EventStream:
+    """
+    Body of an occupancy feed stream, from version `since` on. Any WSGI
+    server iterates it, which blocks a thread per open stream; server.py
+    iterates it with `async for` instead, so an idle stream holds no thread.
+    Both yield the same bytes: events, or a comment line every `heartbeat`
+    seconds.
+    """
+    heartbeat = 15
+
+    def __init__(self, since):
+        self.since = since
+
+    def format_events(self, events):
+        if events is None:
+            self.since = occupancy_feed.version
+            return format_sse(self.since, 'reset', {'version': self.since}).encode()
+        if not events:
+            return b': keep-alive\n\n'
+        self.since = events[-1][0]
+        return ''.join(item[3] for item in events).encode()
+
+    def __iter__(self):
+        yield b'retry: 3000\n\n'
+        while True:
+            yield self.format_events(occupancy_feed.wait_for_events(self.since, timeout=self.heartbeat))
+
+    async def __aiter__(self):
+        yield b'retry: 3000\n\n'
+        while True:
+            yield self.format_events(await occupancy_feed.wait_for_events_async(self.since, timeout=self.heartbeat))
+# ------------------------------------------------
+
+
+# --- CHANGE VERSIONS (ETAG / CONDITIONAL GET) ---
+
+class ChangeVersions:
+    """
+    Counters bumped by the write endpoints after each commit.
+
+    Keys are 'global' (bumped by every write), ('lot', id), ('user', id),
+    'catalog' (lot metadata: names, tariffs, lots added/removed) and
+    'revenue' (completed bills). Read endpoints build their ETag from the
+    counters their response depends on, so unchanged data is answered with
+    a 304 without touching the database. ETags include a per-process epoch,
+    so a restarted (or different) process never matches an old ETag.
+    Note: the counters are per process, so a write on another worker does
+    not change them. With max_age set, ETags also include the current
+    max_age-long time window and expire with it, so a write made on another
+    worker shows within max_age, as with the other per-process indexes.
+    """
+
+    def __init__(self, max_age=None):
+        self._lock = threading.Lock()
+        self._versions = {}
+        self.epoch = uuid.uuid4().hex[:12]
+        self.max_age = max_age  # Seconds an ETag stays valid; None: until a local write
+
+    def bump(self, *keys):
+        with self._lock:
+            for key in ('global',) + keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+
+    def get(self, *keys):
+        with self._lock:
+            return tuple(self._versions.get(key, 0) for key in keys)
+
+    def etag(self, *parts):
+        """Returns a strong ETag value for the given versions and request parameters."""
+        window = int(time.time() // self.max_age) if self.max_age else None
+        return hashlib.sha1(repr((self.epoch, window) + parts).encode()).hexdigest()
+
+
+change_versions = ChangeVersions(max_age=app.config['OCCUPANCY_INDEX_MAX_AGE'])
+
+
+def not_modified(etag, headers=None):
+    """Returns a 304 if the request's If-None-Match matches `etag`, else None."""
+    if etag not in request.if_none_match:
+        return None
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    for key, value in (headers or {}).items():
+        response.headers[key] = value
+    return response
+
+
+def with_etag(response, etag):
+    """Attaches `etag` to a 200 response; browsers revalidate it on every fetch."""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+# ------------------------------------------------
+
+
+# --- READ-THROUGH CACHES ---
+
+UserIdentity = namedtuple('UserIdentity', 'id username role full_name')
+LotTariff = namedtuple('LotTariff', 'id name address pincode price_per_hour max_spots tariff')
+
+
+class LRUCache:
+    """
+    Bounded, thread-safe LRU cache with hit/miss counters.
+
+    Values must be immutable snapshots (never ORM instances, which are
+    bound to the session that loaded them). Writers call invalidate()
+    after committing; a load that overlapped an invalidate() of its key
+    may have read the old row, so its result is returned but not cached.
+    Note: the cache is per process; set a ttl when running several workers.
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, loaded_at)
+        self._generations = {}         # key -> invalidate() count
+        self._clears = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, loader):
+        """Returns the cached value for key, calling loader() on a miss. None results are not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl is None or time.monotonic() - entry[1] < self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = (self._clears, self._generations.get(key, 0))
+        value = loader()
+        if value is not None:
+            with self._lock:
+                if generation != (self._clears, self._generations.get(key, 0)):
+                    return value # Invalidated while loading
+                self._entries[key] = (value, time.monotonic())
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._clears += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None
+            }
+
+
+user_cache = LRUCache(app.config['USER_CACHE_SIZE'], ttl=app.config['CACHE_TTL'])
+lot_cache = LRUCache(app.config['LOT_CACHE_SIZE'], ttl=app.config['CACHE_TTL'])
+
+
+def get_user_identity(user_id):
+    """Cached UserIdentity for user_id, or None if there is no such user."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    def load():
+        row = db.session.query(User.id, User.username, User.role, User.full_name).filter(User.id == user_id).first()
+        return UserIdentity(*row) if row else None
+
+    return user_cache.get_or_load(user_id, load)
+
+
+def get_lot_tariff(lot_id):
+    """Cached LotTariff (metadata, price and billing.Tariff) for lot_id, or None if there is no such lot."""
+    try:
+        lot_id = int(lot_id)
+    except (TypeError, ValueError):
+        return None
+
+    def load():
+        row = db.session.query(
+            ParkingLot.id, ParkingLot.name, ParkingLot.address, ParkingLot.pincode,
+            ParkingLot.price_per_hour, ParkingLot.max_spots, *TARIFF_COLUMNS
+        ).outerjoin(TariffPlan, TariffPlan.lot_id == ParkingLot.id).filter(ParkingLot.id == lot_id).first()
+        if row is None:
+            return None
+        return LotTariff(*row[:6], make_tariff(row[4], TariffRow(*row[6:])))
+
+    return lot_cache.get_or_load(lot_id, load)
+
+
+@app.route('/api/cache-stats', methods=['GET'])
+def get_cache_stats():
+    """Hit/miss counters of the in-process read-through caches."""
+    return jsonify({'users': user_cache.stats(), 'lots': lot_cache.stats()}), 200
+# ------------------------------------------------
+
+
+# --- FRONTEND ROUTES ---
+
+@app.route('/')
+def serve_index_page():
+    """Serves the main (Admin) Login page (index.html)."""
+    return render_template('index.html')
+
+def save_upgraded_password_hash(user, password):
+    """Transparently upgrades an outdated hash after a successful login; never fails the login."""
+    try:
+        if user.upgrade_password_hash(password):
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error upgrading password hash for user {user.id}: {e}")
+
+
+@app.route('/login', methods=['POST'])
+def handle_login():
+    """Handles Admin login form submission."""
+    username = request.form.get('username')
+    password = request.form.get('password')
+
+    user = User.query.filter_by(username=username).first()
+
+    if user and user.check_password(password) and user.role == 'Admin':
+        save_upgraded_password_hash(user, password)
+        # NOTE: In a real app, you would start a session here
+        return redirect(url_for('serve_admin_dashboard'))
+    else:
+        flash('Invalid username or password, or insufficient permissions.', 'error')
+        return redirect(url_for('serve_index_page')) # <-- Corrected redirect
+
+@app.route('/admin-dashboard')
+def serve_admin_dashboard():
+    return render_template('admin_page.html')
+
+@app.route('/admin-summary')
+def serve_admin_summary():
+    return render_template('admin_summary.html')
+
+# --- NEW USER PAGE ROUTE ---
+@app.route('/user-dashboard-page')
+def serve_user_dashboard_page():
+    """Serves the User page (user_page.html)."""
+    return render_template('user_dashboard.html')
+# ------------------------------
+
+@app.route('/user-summary')
+def serve_user_summary():
+    return render_template('user_summary.html')
+
+# --- ADD THIS NEW ROUTE TO main.py ---
+@app.route('/my-booking')
+def serve_my_booking_page():
+    """Serves the 'My Booking' page (my_booking.html)."""
+    return render_template('my_booking.html')
+
+@app.route('/user-page')
+def serve_user_page():
+    """Serves the User page (user_page.html) after they log in."""
+    # NOTE: In a real app, this route would check if a session exists
+    return render_template('user_page.html')
+
+# --- RENAMED ROUTE ---
+@app.route('/register-page') 
+def serve_user_reg_page():
+    """Serves the User Registration page (user_reg.html)."""
+    return render_template('user_reg.html')
+# ------------------------------
+
+# --- NEW USER LOGIN PAGE ROUTE ---
+@app.route('/user-login')
+def serve_user_login_page():
+    """Serves the new User Login page (user_login.html)."""
+    return render_template('user_login.html')
+# ------------------------------
+
+
+# --- UTILITY ROUTE FOR SETUP (TEMPORARY) ---
+
+@app.route('/setup-admin')
+def setup_admin():
+    """Temporary route to create the initial admin user if none exists."""
+    with app.app_context():
+        admin_exists = User.query.filter_by(role='Admin').first()
+        if admin_exists:
+            return "Admin user already set up."
+        
+        new_admin = User(username='admin', role='Admin', full_name='System Admin')
+        new_admin.set_password('password123') 
+        
+        db.session.add(new_admin)
+        db.session.commit()
+        user_cache.invalidate(new_admin.id)
+        return "Initial Admin User ('admin' / 'password123') created successfully!"
+
+
+# --- API ROUTES ---
+
+def record_revenue(lot_id, day, amount, bills=1):
+    """
+    Adds `amount` and `bills` to the (lot_id, day) rollup row with an upsert.
+    Negative values subtract (used when bill history is removed).
+    Runs in the caller's transaction.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    table = LotRevenueDaily.__table__
+    stmt = insert(table).values(lot_id=lot_id, day=day, total_revenue=amount, bill_count=bills)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.lot_id, table.c.day],
+        set_={
+            'total_revenue': table.c.total_revenue + stmt.excluded.total_revenue,
+            'bill_count': table.c.bill_count + stmt.excluded.bill_count
+        }
+    )
+    db.session.execute(stmt)
+
+
+def rebuild_revenue_rollup(date_from=None, date_to=None):
+    """
+    Recomputes lot_revenue_daily from all completed billings, live and
+    archived; with date_from/date_to only the (inclusive) range of days.
+    Returns the number of rollup rows.
+    """
+    live_filters = [Billing.status == 'Completed', Billing.billing_time.isnot(None)]
+    archived_filters = [ArchivedBilling.status == 'Completed', ArchivedBilling.billing_time.isnot(None)]
+    rollup_filters = []
+    if date_from:
+        since = datetime.combine(date_from, datetime.min.time())
+        live_filters.append(Billing.billing_time >= since)
+        archived_filters.append(ArchivedBilling.billing_time >= since)
+        rollup_filters.append(LotRevenueDaily.day >= date_from)
+    if date_to:
+        until = datetime.combine(date_to + timedelta(days=1), datetime.min.time())
+        live_filters.append(Billing.billing_time < until)
+        archived_filters.append(ArchivedBilling.billing_time < until)
+        rollup_filters.append(LotRevenueDaily.day <= date_to)
+
+    live_bills = db.select(
+        ParkingSpot.lot_id.label('lot_id'),
+        db.func.date(Billing.billing_time).label('day'),
+        Billing.final_cost.label('final_cost')
+    ).select_from(Billing).join(
+        Booking, Billing.booking_id == Booking.id
+    ).join(
+        ParkingSpot, Booking.spot_id == ParkingSpot.id
+    ).where(
+        *live_filters
+    )
+    archived_bills = db.select(
+        ArchivedBooking.lot_id,
+        db.func.date(ArchivedBilling.billing_time),
+        ArchivedBilling.final_cost
+    ).select_from(ArchivedBilling).join(
+        ArchivedBooking, ArchivedBilling.booking_id == ArchivedBooking.id
+    ).where(
+        *archived_filters
+    )
+    bills = db.union_all(live_bills, archived_bills).subquery()
+    totals = db.select(
+        bills.c.lot_id,
+        bills.c.day,
+        db.func.sum(bills.c.final_cost),
+        db.func.count()
+    ).group_by(
+        bills.c.lot_id, bills.c.day
+    )
+
+    LotRevenueDaily.query.filter(*rollup_filters).delete(synchronize_session=False)
+    db.session.execute(
+        LotRevenueDaily.__table__.insert().from_select(
+            ['lot_id', 'day', 'total_revenue', 'bill_count'], totals
+        )
+    )
+    db.session.commit()
+    return LotRevenueDaily.query.filter(*rollup_filters).count()
+
+
+@app.cli.command('rebuild-revenue-rollup')
+def rebuild_revenue_rollup_command():
+    """Backfills the lot_revenue_daily rollup from the billing table."""
+    db.create_all() # Creates the rollup table on databases that predate it
+    rows = rebuild_revenue_rollup()
+    print(f"Revenue rollup rebuilt: {rows} (lot, day) rows.")
+
+
+def bucket_start(day, granularity):
+    """Returns the first day of the day/week/month bucket containing `day` (weeks start on Monday)."""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+# --- ADD THIS NEW API ROUTE FOR PROFIT SUMMARY ---
+@app.route('/api/summary/profit-by-lot', methods=['GET'])
+def get_profit_summary():
+    """
+    Calculates the total profit for each parking lot based on completed billings.
+    Answered from the lot_revenue_daily rollup, so the cost depends on the
+    number of (lot, day) buckets, not the number of bills.
+
+    Query parameters (all optional):
+      from=YYYY-MM-DD, to=YYYY-MM-DD   inclusive billing date range (UTC)
+      granularity=day|week|month       also break totals down per period
+    """
+    try:
+        date_from = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else None
+        date_to = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'error': 'from/to must be dates in YYYY-MM-DD format.'}), 400
+
+    granularity = request.args.get('granularity')
+    if granularity not in (None, 'day', 'week', 'month'):
+        return jsonify({'error': "Invalid granularity. Use 'day', 'week' or 'month'."}), 400
+
+    etag = change_versions.etag('profit', date_from, date_to, granularity, change_versions.get('revenue', 'catalog'))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    try:
+        filters = []
+        if date_from:
+            filters.append(LotRevenueDaily.day >= date_from)
+        if date_to:
+            filters.append(LotRevenueDaily.day <= date_to)
+        # Deleted lots keep their revenue, reported under the archived name
+        lot_name = db.func.coalesce(ParkingLot.name, ArchivedLot.name)
+
+        if granularity is None:
+            profit_data = db.session.query(
+                LotRevenueDaily.lot_id,
+                lot_name,
+                db.func.sum(LotRevenueDaily.total_revenue) # Sum the daily totals for each lot
+            ).select_from(LotRevenueDaily).outerjoin(
+                ParkingLot, LotRevenueDaily.lot_id == ParkingLot.id
+            ).outerjoin(
+                ArchivedLot, LotRevenueDaily.lot_id == ArchivedLot.id
+            ).filter(
+                *filters
+            ).group_by(
+                LotRevenueDaily.lot_id, lot_name # Group by lot to sum costs per lot
+            ).order_by(
+                LotRevenueDaily.lot_id # Optional: order by lot ID
+            ).all()
+
+            results = [
+                {
+                    'lot_id': lot_id,
+                    'lot_name': lot_name,
+                    'total_profit': total_profit if total_profit is not None else 0 # Handle cases with no profit yet
+                }
+                for lot_id, lot_name, total_profit in profit_data
+            ]
+            return with_etag(jsonify(results), etag), 200
+
+        daily_rows = db.session.query(
+            LotRevenueDaily.lot_id,
+            lot_name,
+            LotRevenueDaily.day,
+            LotRevenueDaily.total_revenue
+        ).select_from(LotRevenueDaily).outerjoin(
+            ParkingLot, LotRevenueDaily.lot_id == ParkingLot.id
+        ).outerjoin(
+            ArchivedLot, LotRevenueDaily.lot_id == ArchivedLot.id
+        ).filter(
+            *filters
+        ).order_by(
+            LotRevenueDaily.day, LotRevenueDaily.lot_id # Walks ix_lot_revenue_daily_day
+        ).all()
+
+        # Fold daily buckets into the requested granularity
+        periods = {}
+        for lot_id, lot_name, day, revenue in daily_rows:
+            key = (lot_id, bucket_start(day, granularity))
+            if key not in periods:
+                periods[key] = {'lot_id': lot_id, 'lot_name': lot_name, 'period': key[1], 'total_profit': 0}
+            periods[key]['total_profit'] += revenue or 0
+
+        return with_etag(jsonify([periods[key] for key in sorted(periods)]), etag), 200
+
+    except Exception as e:
+        app.logger.error(f"Error calculating profit summary: {e}")
+        return jsonify({'error': 'An internal server error occurred while calculating profit.'}), 500
+# ----------------------------------------------
+
+@app.route('/register', methods=['POST'])
+def register_user():
+    """Handles the user registration API call from script.js."""
+    
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+
+    username = data.get('username') # This is the email
+    password = data.get('password')
+    full_name = data.get('full_name')
+
+    if not username or not password or not full_name:
+        return jsonify({'error': 'Missing required fields'}), 400
+    if len(password) < 8:
+        return jsonify({'error': 'Password must be at least 8 characters long'}), 400
+
+    existing_user = User.query.filter_by(username=username).first()
+    if existing_user:
+        return jsonify({'error': 'Username (email) already exists'}), 409 # 409 Conflict
+
+    try:
+        new_user = User(
+            username=username,
+            full_name=full_name,
+            role='User'  # Default role for new signups
+        )
+        new_user.set_password(password) # Hash the password
+
+        db.session.add(new_user)
+        db.session.commit()
+        user_cache.invalidate(new_user.id)
+
+        return jsonify({'message': 'Registration successful! You can now login.'}), 201
+
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error during registration: {e}")
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+
+# --- USER LOGIN API ROUTE (CORRECTED) ---
+@app.route('/user-login-api', methods=['POST'])
+def handle_user_login():
+    """Handles the user login API call from user_login.js."""
+    
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+
+    username = data.get('username') # This is the email
+    password = data.get('password')
+
+    if not username or not password:
+        return jsonify({'error': 'Missing email or password'}), 400
+
+    # Find the user by their email
+    user = User.query.filter_by(username=username).first()
+
+    # Check if user exists, password is correct, AND role is 'User'
+    if user and user.check_password(password) and user.role == 'User':
+        save_upgraded_password_hash(user, password)
+        # NOTE: This is where you would create a user session
+        
+        # On success, return a message and the URL to redirect to
+        return jsonify({
+            'message': 'Login successful! Redirecting...',
+            'user_id': user.id, # <-- CRITICAL FIX: Added user_id
+            'redirect_url': url_for('serve_user_dashboard_page') # <-- CRITICAL FIX: Point to correct function
+        }), 200
+    else:
+        # On failure, return a generic error
+        return jsonify({'error': 'Invalid email or password.'}), 401 # 401 Unauthorized
+# ------------------------------
+
+# --- ADD THIS NEW API ROUTE FOR USER DETAILS ---
+@app.route('/api/user-details/<int:user_id>', methods=['GET'])
+def get_user_details(user_id):
+    """Fetches details for a specific user, like their full name."""
+    
+    # Check if user exists
+    user = get_user_identity(user_id)
+    if user is None:
+        abort(404)
+    
+    try:
+        # Return only the necessary details 
+        return jsonify({
+            'user_id': user.id,
+            'full_name': user.full_name 
+            # Add other details here if needed later
+        }), 200
+        
+    except Exception as e:
+        app.logger.error(f"Error fetching details for user {user_id}: {e}")
+        return jsonify({'error': 'An internal server error occurred while fetching user details.'}), 500
+# ---------------------------------------------
+
+
+def claim_spot(spot_id):
+    """
+    Atomically marks a free spot as occupied.
+    Issues a single conditional UPDATE that touches at most one row, so two
+    concurrent requests can never both claim the same spot. Spots of a lot
+    being deleted are never claimed. Returns True if this transaction won
+    the spot. The caller must commit or roll back.
+    """
+    claimed = ParkingSpot.query.filter(
+        ParkingSpot.id == spot_id,
+        ParkingSpot.is_occupied == False,
+        ParkingSpot.lot_id.notin_(lots_being_deleted())
+    ).update({ParkingSpot.is_occupied: True}, synchronize_session=False)
+    return claimed == 1
+
+
+def claim_spots(spot_ids):
+    """
+    Bulk version of claim_spot: one conditional UPDATE for all spot_ids.
+    Returns the set of ids this transaction claimed (missing or already
+    occupied spots are left out). The caller must commit or roll back.
+    """
+    if not spot_ids:
+        return set()
+    if not db.engine.dialect.update_returning:
+        return {spot_id for spot_id in spot_ids if claim_spot(spot_id)}
+    rows = db.session.execute(
+        db.update(ParkingSpot)
+        .where(ParkingSpot.id.in_(list(spot_ids)), ParkingSpot.is_occupied == False,
+               ParkingSpot.lot_id.notin_(lots_being_deleted()))
+        .values(is_occupied=True)
+        .returning(ParkingSpot.id)
+        .execution_options(synchronize_session=False)
+    )
+    return {spot_id for (spot_id,) in rows}
+
+
+def vacate_spots(spot_ids):
+    """
+    Marks spots free again: after a release, or to undo claim_spot(s) on
+    spots this transaction claimed but cannot use. Spots of a lot being
+    deleted stay occupied, so nothing can claim them again.
+    """
+    ParkingSpot.query.filter(
+        ParkingSpot.id.in_(list(spot_ids)),
+        ParkingSpot.lot_id.notin_(lots_being_deleted())
+    ).update({ParkingSpot.is_occupied: False}, synchronize_session=False)
+
+
+def walk_up_window():
+    """The window a walk-up booking made now must find free of reservations (see RESERVATION_HOLD_MINUTES)."""
+    now = datetime.utcnow()
+    return now, now + timedelta(minutes=app.config['RESERVATION_HOLD_MINUTES'])
+
+
+def reserved_spot_ids(spot_ids, start, end=None, ignore=None):
+    """
+    The ids among spot_ids with an Upcoming or CheckedIn reservation
+    overlapping [start, end) (end=None: any time after start), leaving out
+    reservation `ignore`. The database check behind reservation_index:
+    run it after claiming or locking the spots, so that it cannot race a
+    concurrent reservation.
+    """
+    if not spot_ids:
+        return set()
+    query = db.session.query(Reservation.spot_id).filter(
+        Reservation.spot_id.in_(list(spot_ids)),
+        Reservation.end_time > start,
+        Reservation.status.in_(HOLDING_STATUSES)
+    )
+    if end is not None:
+        query = query.filter(Reservation.start_time < end)
+    if ignore is not None:
+        query = query.filter(Reservation.id != ignore)
+    return {spot_id for (spot_id,) in query.distinct()}
+
+
+def calculate_bill(start_time, end_time, tariff):
+    """Returns (duration_hours, final_cost) for a stay under a lot's billing.Tariff (see billing.bill)."""
+    return bill(start_time, end_time, tariff, app.config['TARIFF_UTC_OFFSET_MINUTES'])
+
+
+def create_booking_records(spot_id, user_id, vehicle_number):
+    """Adds an Active Booking and its Reserved Billing for a claimed spot to the session."""
+    # 1. Create the new booking
+    new_booking = Booking(
+        spot_id=spot_id,
+        customer_id=user_id,
+        vehicle_number=vehicle_number,
+        status='Active' 
+    )
+    
+    # 2. Create the corresponding billing record
+    new_billing = Billing(
+        status='Reserved',
+        final_cost=None,
+        billing_time=None
+    )
+    
+    # 3. Link them together
+    new_booking.billing = new_billing
+    
+    # 4. Add to session (Flask-SQLAlchemy handles adding both new_booking and new_billing)
+    db.session.add(new_booking)
+    return new_booking, new_billing
+
+
+# --- /api/book-spot ROUTE (DEFINED ONLY ONCE) ---
+@app.route('/api/book-spot', methods=['POST'])
+def book_spot():
+    """
+    Handles a new booking request from a user.
+    Creates BOTH a Booking record and a Billing record.
+    The spot is claimed with a conditional UPDATE (see claim_spot) and the
+    uq_booking_active_spot index guarantees at most one Active booking per spot.
+    Spots reserved within RESERVATION_HOLD_MINUTES are refused.
+    With start_time and end_time the spot is reserved for that window
+    instead (see reserve_spot).
+    """
+    
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+
+    spot_id = data.get('spot_id')
+    user_id = data.get('user_id')
+    vehicle_number = data.get('vehicle_number')
+
+    if not all([spot_id, user_id, vehicle_number]):
+        return jsonify({'error': 'Missing required booking information'}), 400
+
+    try:
+        spot_id = int(spot_id)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid parking spot ID'}), 404
+    if data.get('start_time') is not None or data.get('end_time') is not None:
+        return reserve_spot(spot_id, user_id, vehicle_number, data)
+    # No early 409 from occupancy_index/reservation_index: they are per process and
+    # may be stale, so the conditional UPDATE and the reservation query decide
+    window = walk_up_window()
+
+    user = get_user_identity(user_id)
+    if not user:
+        return jsonify({'error': 'Invalid user ID'}), 404
+
+    try:
+        # 1. Claim the spot; 0 rows updated means it is missing or already taken
+        if not claim_spot(spot_id):
+            db.session.rollback()
+            if db.session.get(ParkingSpot, spot_id) is None:
+                return jsonify({'error': 'Invalid parking spot ID'}), 404
+            occupancy_index.mark_occupied(spot_id) # Index was stale
+            return jsonify({'error': 'This spot is already occupied. Please select another.'}), 409
+        if reserved_spot_ids([spot_id], *window):
+            db.session.rollback()
+            return jsonify({'error': 'This spot is reserved for an upcoming booking. Please select another.'}), 409
+
+        # 2. Create booking + billing in the same transaction
+        new_booking, new_billing = create_booking_records(spot_id, user.id, vehicle_number)
+        db.session.commit()
+        occupancy_index.mark_occupied(spot_id)
+        change_versions.bump(('lot', occupancy_index.lot_of(spot_id)), ('user', user.id))
+        publish_spot_change(spot_id)
+
+        return jsonify({
+            'message': 'Booking successful!',
+            'booking_id': new_booking.id,
+            'billing_id': new_billing.id,
+            'status': new_billing.status
+        }), 201
+
+    except IntegrityError:
+        # uq_booking_active_spot rejected a second Active booking for this spot
+        db.session.rollback()
+        return jsonify({'error': 'This spot is already occupied. Please select another.'}), 409
+
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error booking spot: {e}")
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+# -----------------------------------------
+
+
+# --- AUTO-ASSIGN ANY FREE SPOT IN A LOT ---
+@app.route('/api/lots/<int:lot_id>/auto-book', methods=['POST'])
+def auto_book_spot(lot_id):
+    """
+    Books any free spot in the given lot.
+    The spot is picked from the in-memory occupancy index in O(1), passing
+    over spots reserved within RESERVATION_HOLD_MINUTES.
+    """
+    
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+
+    user_id = data.get('user_id')
+    vehicle_number = data.get('vehicle_number')
+
+    if not all([user_id, vehicle_number]):
+        return jsonify({'error': 'Missing required booking information'}), 400
+
+    lot = get_lot_tariff(lot_id)
+    user = get_user_identity(user_id)
+
+    if not lot:
+        return jsonify({'error': 'Invalid parking lot ID'}), 404
+    if not user:
+        return jsonify({'error': 'Invalid user ID'}), 404
+
+    window = walk_up_window()
+    reserved = reservation_index.reserved_spots(lot_id, *window)
+    while True:
+        spot_id = occupancy_index.claim_free(lot_id, exclude=reserved)
+        if spot_id is None:
+            return jsonify({'error': 'No free spots available in this lot.'}), 409
+
+        try:
+            if not claim_spot(spot_id):
+                # Index was stale (e.g. booked by another process); the claim already
+                # removed it from the free-list, so just try the next one
+                db.session.rollback()
+                continue
+            if reserved_spot_ids([spot_id], *window):
+                # Reserved in another process: free, but not for a walk-up
+                db.session.rollback()
+                occupancy_index.mark_free(spot_id)
+                reserved.add(spot_id)
+                continue
+
+            new_booking, new_billing = create_booking_records(spot_id, user.id, vehicle_number)
+            db.session.commit()
+
+        except IntegrityError:
+            db.session.rollback()
+            continue
+
+        except Exception as e:
+            db.session.rollback()
+            occupancy_index.mark_free(spot_id)
+            app.logger.error(f"Error auto-booking in lot {lot_id}: {e}")
+            return jsonify({'error': 'An internal server error occurred.'}), 500
+
+        change_versions.bump(('lot', lot_id), ('user', user.id))
+        publish_spot_change(spot_id)
+        spot_number = db.session.query(ParkingSpot.spot_number).filter(ParkingSpot.id == spot_id).scalar()
+        return jsonify({
+            'message': 'Booking successful!',
+            'booking_id': new_booking.id,
+            'billing_id': new_billing.id,
+            'spot_id': spot_id,
+            'spot_number': spot_number,
+            'status': new_billing.status
+        }), 201
+# -----------------------------------------
+
+
+# --- ADVANCE RESERVATIONS (see reservations.py) ---
+
+def parse_utc_datetime(value):
+    """Naive UTC datetime from ISO 8601 text; without an offset the time is taken as UTC."""
+    moment = datetime.fromisoformat(str(value))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def read_reservation_window(args, now):
+    """
+    Returns (start, end, error) from args['start_time'] / args['end_time'].
+    A window that has already begun is held from now.
+    """
+    try:
+        start = parse_utc_datetime(args['start_time'])
+        end = parse_utc_datetime(args['end_time'])
+    except (KeyError, TypeError, ValueError):
+        return None, None, 'start_time and end_time must be ISO 8601 date-times.'
+    if end <= start:
+        return None, None, 'end_time must be after start_time.'
+    if end <= now:
+        return None, None, 'This window has already passed.'
+    start = max(start, now)
+    if end - start > timedelta(hours=app.config['RESERVATION_MAX_HOURS']):
+        return None, None, f"A reservation can last at most {app.config['RESERVATION_MAX_HOURS']} hours."
+    if start > now + timedelta(days=app.config['RESERVATION_MAX_DAYS_AHEAD']):
+        return None, None, f"Reservations open {app.config['RESERVATION_MAX_DAYS_AHEAD']} days ahead."
+    return start, end, None
+
+
+def reserve_spot(spot_id, user_id, vehicle_number, data):
+    """
+    book_spot with start_time/end_time: reserves the spot for [start, end).
+
+    The spot row is locked with a no-op UPDATE, so the overlap check and
+    the insert cannot interleave with another reservation or a walk-up
+    claim of the same spot. A spot occupied now counts as taken for the
+    next RESERVATION_HOLD_MINUTES (see walk_up_window).
+    """
+    now = datetime.utcnow()
+    start, end, error = read_reservation_window(data, now)
+    if error:
+        return jsonify({'error': error}), 400
+
+    user = get_user_identity(user_id)
+    if not user:
+        return jsonify({'error': 'Invalid user ID'}), 404
+
+    try:
+        ParkingSpot.query.filter(ParkingSpot.id == spot_id).update(
+            {ParkingSpot.is_occupied: ParkingSpot.is_occupied}, synchronize_session=False
+        )
+        spot = db.session.query(ParkingSpot.lot_id, ParkingSpot.is_occupied).filter(
+            ParkingSpot.id == spot_id,
+            ParkingSpot.lot_id.notin_(lots_being_deleted())
+        ).first()
+        if spot is None:
+            db.session.rollback()
+            return jsonify({'error': 'Invalid parking spot ID'}), 404
+        if spot.is_occupied and start < now + timedelta(minutes=app.config['RESERVATION_HOLD_MINUTES']):
+            db.session.rollback()
+            return jsonify({'error': 'This spot is occupied now. Please select another spot or a later time.'}), 409
+        if reserved_spot_ids([spot_id], start, end):
+            db.session.rollback()
+            return jsonify({'error': 'This spot is already reserved for part of that time.'}), 409
+
+        reservation = Reservation(
+            spot_id=spot_id,
+            customer_id=user.id,
+            vehicle_number=vehicle_number,
+            start_time=start,
+            end_time=end,
+            status='Upcoming'
+        )
+        db.session.add(reservation)
+        db.session.commit()
+
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error reserving spot {spot_id}: {e}")
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+
+    reservation_index.add(spot.lot_id, spot_id, reservation.id, start, end)
+    return jsonify({
+        'message': 'Reservation successful!',
+        'reservation_id': reservation.id,
+        'spot_id': spot_id,
+        'start_time': start,
+        'end_time': end,
+        'status': reservation.status
+    }), 201
+
+
+@app.route('/api/lots/<int:lot_id>/availability', methods=['GET'])
+def get_lot_availability(lot_id):
+    """
+    Spots of a lot free for ?start_time=...&end_time=... (ISO 8601, UTC), i.e.
+    the spots POST /api/book-spot can reserve for that window. Answered from
+    the occupancy and reservation indexes without a database query: one
+    binary search per spot, whatever the number of reservations.
+    """
+    now = datetime.utcnow()
+    start, end, error = read_reservation_window(request.args, now)
+    if error:
+        return jsonify({'error': error}), 400
+    spots = occupancy_index.lot_spots(lot_id)
+    if spots is None:
+        return jsonify({'error': 'Invalid parking lot ID'}), 404
+
+    spot_ids, free = spots
+    if start < now + timedelta(minutes=app.config['RESERVATION_HOLD_MINUTES']):
+        spot_ids = [spot_id for spot_id in spot_ids if spot_id in free] # Occupied spots are taken for now
+    available = reservation_index.free_spots(lot_id, spot_ids, start, end)
+    return jsonify({
+        'lot_id': lot_id,
+        'start_time': start,
+        'end_time': end,
+        'free_spots': len(available),
+        'spot_ids': available
+    }), 200
+
+
+def claim_for_reservation(reservation, lot_id, now):
+    """
+    Claims the reservation's spot or, if it is taken or still held by an
+    earlier reservation, another spot of the lot free until the reservation
+    ends. Returns the claimed spot id, or None. The caller must commit or
+    roll back.
+    """
+    candidates = [reservation.spot_id]
+    spots = occupancy_index.lot_spots(lot_id) if lot_id is not None else None
+    if spots is not None:
+        spot_ids, free = spots
+        candidates += reservation_index.free_spots(
+            lot_id, [spot_id for spot_id in spot_ids if spot_id in free and spot_id != reservation.spot_id],
+            now, reservation.end_time
+        )
+    for spot_id in candidates:
+        if not claim_spot(spot_id):
+            continue
+        if reserved_spot_ids([spot_id], now, reservation.end_time, ignore=reservation.id):
+            vacate_spots([spot_id])
+            continue
+        return spot_id
+    return None
+
+
+@app.route('/api/reservations/<int:reservation_id>/check-in', methods=['POST'])
+def check_in_reservation(reservation_id):
+    """
+    Turns an Upcoming reservation into an Active booking (billed from now,
+    like any booking) when the customer arrives, from
+    RESERVATION_EARLY_CHECKIN_MINUTES before its start until its end. The
+    reservation keeps the spot until its window ends.
+    """
+    reservation = db.session.get(Reservation, reservation_id)
+    if reservation is None:
+        return jsonify({'error': 'Reservation not found'}), 404
+    if reservation.status != 'Upcoming':
+        return jsonify({'error': f'This reservation is {reservation.status}, not Upcoming.'}), 409
+    now = datetime.utcnow()
+    if now >= reservation.end_time:
+        return jsonify({'error': 'This reservation has expired.'}), 409
+    opens = reservation.start_time - timedelta(minutes=app.config['RESERVATION_EARLY_CHECKIN_MINUTES'])
+    if now < opens:
+        return jsonify({'error': f'Check-in opens at {opens.isoformat()}.'}), 409
+
+    lot_id = occupancy_index.lot_of(reservation.spot_id)
+    reserved_spot_id = reservation.spot_id
+    try:
+        spot_id = claim_for_reservation(reservation, lot_id, now)
+        if spot_id is None:
+            db.session.rollback()
+            return jsonify({'error': 'Your spot is still occupied and the lot has no other free spot.'}), 409
+
+        new_booking, new_billing = create_booking_records(spot_id, reservation.customer_id, reservation.vehicle_number)
+        db.session.flush() # Assigns new_booking.id
+        # Conditional, so only one of two concurrent check-ins (or a cancellation) wins
+        checked_in = Reservation.query.filter(
+            Reservation.id == reservation.id,
+            Reservation.status == 'Upcoming'
+        ).update({
+            Reservation.status: 'CheckedIn',
+            Reservation.spot_id: spot_id,
+            Reservation.booking_id: new_booking.id
+        }, synchronize_session=False)
+        if checked_in != 1:
+            db.session.rollback()
+            return jsonify({'error': 'This reservation was checked in or cancelled concurrently.'}), 409
+        db.session.commit()
+
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'This spot was booked concurrently. Please retry.'}), 409
+
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error checking in reservation {reservation_id}: {e}")
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+
+    occupancy_index.mark_occupied(spot_id)
+    if spot_id != reserved_spot_id:
+        reservation_index.remove(lot_id, reserved_spot_id, reservation_id)
+        reservation_index.add(lot_id, spot_id, reservation_id, reservation.start_time, reservation.end_time)
+    change_versions.bump(('lot', lot_id), ('user', reservation.customer_id))
+    publish_spot_change(spot_id)
+    spot_number = db.session.query(ParkingSpot.spot_number).filter(ParkingSpot.id == spot_id).scalar()
+    return jsonify({
+        'message': 'Check-in successful!',
+        'reservation_id': reservation_id,
+        'booking_id': new_booking.id,
+        'billing_id': new_billing.id,
+        'spot_id': spot_id,
+        'spot_number': spot_number,
+        'status': new_billing.status
+    }), 201
+
+
+@app.route('/api/reservations/<int:reservation_id>/cancel', methods=['POST'])
+def cancel_reservation(reservation_id):
+    """Cancels an Upcoming reservation, freeing its window."""
+    reservation = db.session.get(Reservation, reservation_id)
+    if reservation is None:
+        return jsonify({'error': 'Reservation not found'}), 404
+    try:
+        cancelled = Reservation.query.filter(
+            Reservation.id == reservation_id,
+            Reservation.status == 'Upcoming'
+        ).update({Reservation.status: 'Cancelled'}, synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error cancelling reservation {reservation_id}: {e}")
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+    if cancelled != 1:
+        return jsonify({'error': 'Only Upcoming reservations can be cancelled.'}), 409
+
+    reservation_index.remove(occupancy_index.lot_of(reservation.spot_id), reservation.spot_id, reservation_id)
+    return jsonify({'message': 'Reservation cancelled.', 'reservation_id': reservation_id, 'status': 'Cancelled'}), 200
+
+
+@app.route('/api/my-reservations/<int:user_id>', methods=['GET'])
+def get_my_reservations(user_id):
+    """A user's reservations whose window has not ended, soonest first."""
+    user = User.query.get_or_404(user_id)
+    try:
+        rows = db.session.query(
+            Reservation.id,
+            ParkingLot.id,
+            ParkingLot.name,
+            Reservation.spot_id,
+            ParkingSpot.spot_number,
+            Reservation.vehicle_number,
+            Reservation.start_time,
+            Reservation.end_time,
+            Reservation.status,
+            Reservation.booking_id
+        ).select_from(Reservation).join(
+            ParkingSpot, Reservation.spot_id == ParkingSpot.id
+        ).join(
+            ParkingLot, ParkingSpot.lot_id == ParkingLot.id
+        ).filter(
+            Reservation.customer_id == user.id,
+            Reservation.end_time > datetime.utcnow()
+        ).order_by(Reservation.start_time, Reservation.id)
+        return jsonify([
+            {
+                'reservation_id': reservation_id,
+                'parking_location': f"Lot #{lot_id}: {lot_name}",
+                'spot_id': spot_id,
+                'spot_number': spot_number,
+                'vehicle_number': vehicle_number,
+                'start_time': start_time,
+                'end_time': end_time,
+                'status': status, # 'Upcoming', 'CheckedIn' or 'Cancelled'
+                'booking_id': booking_id
+            }
+            for (reservation_id, lot_id, lot_name, spot_id, spot_number, vehicle_number,
+                 start_time, end_time, status, booking_id) in rows
+        ]), 200
+    except Exception as e:
+        app.logger.error(f"Error fetching reservations for user {user_id}: {e}")
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+# -----------------------------------------
+
+
+# --- KEYSET PAGINATION HELPERS ---
+
+def encode_cursor(*values):
+    """Packs the sort key of the last returned row into an opaque cursor string."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Reverses encode_cursor. Raises ValueError for malformed cursors."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def parse_page_args(default_limit=50, max_limit=500):
+    """
+    Reads ?limit= and ?after= from the request.
+    Returns (None, None) when the caller did not ask for pagination.
+    Raises ValueError on invalid values.
+    """
+    limit = request.args.get('limit')
+    after = request.args.get('after')
+    if limit is None and after is None:
+        return None, None
+    limit = int(limit) if limit is not None else default_limit
+    if limit < 1 or limit > max_limit:
+        raise ValueError(f'limit must be between 1 and {max_limit}')
+    return limit, (decode_cursor(after) if after else None)
+
+
+def merge_newest_first(live, archived, limit):
+    """
+    Merges live and archived history rows, each a list of (sort_key, item)
+    already sorted newest first, into one newest-first list. With a limit
+    each side was fetched with limit + 1 rows. Returns (rows, has_more).
+    """
+    rows = list(heapq.merge(live, archived, key=lambda row: row[0], reverse=True))
+    if limit is not None and len(rows) > limit:
+        return rows[:limit], True
+    return rows, False
+# ---------------------------------
+
+
+# --- NEW API ROUTE FOR "MY BOOKING" PAGE ---
+@app.route('/api/my-bookings/<int:user_id>', methods=['GET'])
+def get_my_bookings(user_id):
+    """
+    Fetches all bookings for a specific user, newest first.
+
+    With ?limit=N (and ?after=<cursor> for later pages) returns one page as
+    {'items': [...], 'next_cursor': <cursor or null>}. Pages are found by
+    keyset on (start_time, id) so every page costs the same however deep it is.
+    """
+    try:
+        limit, after = parse_page_args()
+        if after is not None:
+            after = (datetime.fromisoformat(after[0]), int(after[1]))
+    except (ValueError, TypeError, IndexError) as e:
+        return jsonify({'error': f'Invalid pagination parameters: {e}'}), 400
+
+    etag = change_versions.etag('my-bookings', user_id, limit, after, change_versions.get(('user', user_id), 'catalog'))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    # Check if user exists
+    user = User.query.get_or_404(user_id)
+    
+    try:
+        # Booking and lot columns only, as plain rows (no ORM objects)
+        bookings_query = db.session.query(
+            Booking.id,
+            ParkingLot.id,
+            ParkingLot.name,
+            Booking.vehicle_number,
+            Booking.start_time,
+            Booking.status
+        ).select_from(Booking).join(
+            ParkingSpot, Booking.spot_id == ParkingSpot.id
+        ).join(
+            ParkingLot, ParkingSpot.lot_id == ParkingLot.id
+        ).filter(
+            Booking.customer_id == user.id
+        ).order_by(
+            Booking.start_time.desc(), # Show newest first
+            Booking.id.desc()
+        )
+        # Older completed bookings live in booking_archive (see compact_booking_history)
+        archived_query = db.session.query(
+            ArchivedBooking.id,
+            ArchivedBooking.lot_id,
+            db.func.coalesce(ParkingLot.name, ArchivedLot.name),
+            ArchivedBooking.vehicle_number,
+            ArchivedBooking.start_time,
+            ArchivedBooking.status
+        ).outerjoin(
+            ParkingLot, ArchivedBooking.lot_id == ParkingLot.id
+        ).outerjoin(
+            ArchivedLot, ArchivedBooking.lot_id == ArchivedLot.id
+        ).filter(
+            ArchivedBooking.customer_id == user.id
+        ).order_by(
+            ArchivedBooking.start_time.desc(),
+            ArchivedBooking.id.desc()
+        )
+        if after is not None:
+            bookings_query = bookings_query.filter(db.tuple_(Booking.start_time, Booking.id) < after)
+            archived_query = archived_query.filter(db.tuple_(ArchivedBooking.start_time, ArchivedBooking.id) < after)
+        if limit is not None:
+            bookings_query = bookings_query.limit(limit + 1) # One extra row tells us if there is a next page
+            archived_query = archived_query.limit(limit + 1)
+
+        # Both queries return the same row shape
+        live, archived = [
+            [
+                ((start_time, booking_id), {
+                    'booking_id': booking_id,
+                    'parking_location': f"Lot #{lot_id}: {lot_name}",
+                    'vehicle_number': vehicle_number,
+                    'time_stamp': start_time, # Show when it started (the encoder writes ISO 8601)
+                    'status': status # 'Active' or 'Completed'
+                })
+                for booking_id, lot_id, lot_name, vehicle_number, start_time, status in query
+            ]
+            for query in (bookings_query, archived_query)
+        ]
+        rows, has_more = merge_newest_first(live, archived, limit)
+
+        next_cursor = None
+        if has_more:
+            last_start, last_id = rows[-1][0]
+            next_cursor = encode_cursor(last_start.isoformat(), last_id)
+        results = [result for _, result in rows]
+
+        if limit is not None:
+            return with_etag(jsonify({'items': results, 'next_cursor': next_cursor}), etag), 200
+        return with_etag(jsonify(results), etag), 200
+        
+    except Exception as e:
+        app.logger.error(f"Error fetching bookings for user {user_id}: {e}")
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+# -----------------------------------------
+
+# --- ADD THIS NEW API ROUTE FOR USER SUMMARY ---
+@app.route('/api/user-summary/<int:user_id>', methods=['GET'])
+def get_user_summary(user_id):
+    """
+    Fetches all billing records for a specific user, most recent booking first.
+
+    Supports the same ?limit= / ?after= keyset pagination as /api/my-bookings,
+    keyed on the booking id.
+    """
+    try:
+        limit, after = parse_page_args()
+        if after is not None:
+            after = int(after[0])
+    except (ValueError, TypeError, IndexError) as e:
+        return jsonify({'error': f'Invalid pagination parameters: {e}'}), 400
+
+    etag = change_versions.etag('user-summary', user_id, limit, after, change_versions.get(('user', user_id), 'catalog'))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    # Check if user exists
+    user = User.query.get_or_404(user_id)
+    
+    try:
+        # Billing and booking columns only, as plain rows (no ORM objects)
+        billing_records = db.session.query(
+            Billing.id,
+            Billing.booking_id,
+            Booking.customer_id,
+            Billing.final_cost,
+            Billing.billing_time,
+            Booking.start_time,
+            Billing.status
+        ).join(Booking, Billing.booking_id == Booking.id).filter(
+            Booking.customer_id == user.id
+        ).order_by(
+            # --- MODIFIED SORT ORDER ---
+            desc(Booking.id) # Sort by Booking ID descending (most recent booking first)
+            # --- END MODIFICATION ---
+        )
+        # Bills of archived bookings (see compact_booking_history)
+        archived_query = db.session.query(
+            ArchivedBilling.id,
+            ArchivedBilling.booking_id,
+            ArchivedBooking.customer_id,
+            ArchivedBilling.final_cost,
+            ArchivedBilling.billing_time,
+            ArchivedBooking.start_time,
+            ArchivedBilling.status
+        ).join(
+            ArchivedBooking, ArchivedBilling.booking_id == ArchivedBooking.id
+        ).filter(
+            ArchivedBooking.customer_id == user.id
+        ).order_by(
+            ArchivedBooking.id.desc()
+        )
+        if after is not None:
+            billing_records = billing_records.filter(Booking.id < after)
+            archived_query = archived_query.filter(ArchivedBooking.id < after)
+        if limit is not None:
+            billing_records = billing_records.limit(limit + 1)
+            archived_query = archived_query.limit(limit + 1)
+
+        # Both queries return the same row shape; the encoder writes datetimes as ISO 8601
+        live, archived = [
+            [
+                (booking_id, {
+                    'billing_id': billing_id,
+                    'booking_id': booking_id,
+                    'customer_id': customer_id,
+                    'final_cost': final_cost,
+                    'billing_time': billing_time,
+                    'start_time': start_time, # Include start time for duration calc
+                    'status': status
+                })
+                for billing_id, booking_id, customer_id, final_cost, billing_time, start_time, status in query
+            ]
+            for query in (billing_records, archived_query)
+        ]
+        rows, has_more = merge_newest_first(live, archived, limit)
+
+        next_cursor = encode_cursor(rows[-1][0]) if has_more else None
+        results = [result for _, result in rows]
+
+        if limit is not None:
+            return with_etag(jsonify({'items': results, 'next_cursor': next_cursor}), etag), 200
+        return with_etag(jsonify(results), etag), 200
+        
+    except Exception as e:
+        app.logger.error(f"Error fetching summary for user {user_id}: {e}")
+        return jsonify({'error': 'An internal server error occurred while fetching summary.'}), 500
+# ---------------------------------------------
+
+# --- NEW API ROUTE FOR "RELEASE SPOT" ---
+@app.route('/api/release-spot/<int:booking_id>', methods=['POST'])
+def release_spot(booking_id):
+    """
+    Handles releasing a spot.
+    Calculates the final bill and updates booking, billing, and spot status.
+    """
+    
+    booking = Booking.query.get_or_404(booking_id)
+    
+    if booking.status != 'Active':
+        return jsonify({'error': 'This booking is already completed.'}), 400
+        
+    try:
+        # Get related objects; the tariff comes from the lot cache
+        billing = booking.billing
+        lot_id = occupancy_index.lot_of(booking.spot_id)
+        if lot_id is None:
+            lot_id = db.session.query(ParkingSpot.lot_id).filter(ParkingSpot.id == booking.spot_id).scalar()
+        lot = get_lot_tariff(lot_id)
+        
+        # Calculate cost
+        end_time = datetime.utcnow()
+        duration_hours, final_cost = calculate_bill(booking.start_time, end_time, lot.tariff)
+        
+        # Update database records. The status change is conditional so a
+        # concurrent release of the same booking cannot bill it twice.
+        completed = Booking.query.filter(
+            Booking.id == booking.id,
+            Booking.status == 'Active'
+        ).update({Booking.status: 'Completed', Booking.end_time: end_time})
+        if completed != 1:
+            db.session.rollback()
+            return jsonify({'error': 'This booking is already completed.'}), 400
+        
+        billing.final_cost = final_cost
+        billing.billing_time = end_time
+        billing.status = 'Completed'
+        
+        vacate_spots([booking.spot_id])
+
+        # Keep the revenue rollup in step with the finalized bill
+        record_revenue(lot.id, end_time.date(), final_cost)
+        
+        db.session.commit()
+        occupancy_index.mark_free(booking.spot_id)
+        change_versions.bump(('lot', lot.id), ('user', booking.customer_id), 'revenue')
+        publish_spot_change(booking.spot_id)
         
-        # On success, return a message and the URL to redirect to
         return jsonify({
-            'message': 'Login successful! Redirecting...',
-            'user_id': user.id, # <-- CRITICAL FIX: Added user_id
-            'redirect_url': url_for('serve_user_dashboard_page') # <-- CRITICAL FIX: Point to correct function
+            'message': 'Spot released successfully! Bill generated.',
+            'booking_id': booking.id,
+            'status': booking.status,
+            'final_cost': final_cost,
+            'duration_hours': duration_hours
         }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error releasing spot {booking_id}: {e}")
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+# -----------------------------------------
+
+
+# --- BATCH BOOKING / RELEASE (FLEET OPERATORS) ---
+
+def batch_failure(index, error):
+    return {'index': index, 'success': False, 'error': error}
+
+
+def read_batch(data, key):
+    """Returns the list under data[key], or an error message if it is missing or too large."""
+    items = data.get(key) if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return None, f"'{key}' must be a non-empty list"
+    if len(items) > app.config['BATCH_MAX_ITEMS']:
+        return None, f"A batch can contain at most {app.config['BATCH_MAX_ITEMS']} items"
+    return items, None
+
+
+def complete_bookings(booking_ids, end_time):
+    """
+    Bulk version of release_spot's conditional status change. Returns the
+    set of ids this transaction completed; bookings completed concurrently
+    are left out, so they are never billed twice.
+    """
+    if not booking_ids:
+        return set()
+    if not db.engine.dialect.update_returning:
+        return {
+            booking_id for booking_id in booking_ids
+            if Booking.query.filter(Booking.id == booking_id, Booking.status == 'Active').update(
+                {Booking.status: 'Completed', Booking.end_time: end_time}, synchronize_session=False) == 1
+        }
+    rows = db.session.execute(
+        db.update(Booking)
+        .where(Booking.id.in_(list(booking_ids)), Booking.status == 'Active')
+        .values(status='Completed', end_time=end_time)
+        .returning(Booking.id)
+        .execution_options(synchronize_session=False)
+    )
+    return {booking_id for (booking_id,) in rows}
+
+
+@app.route('/api/bookings/batch', methods=['POST'])
+def book_spots_batch():
+    """
+    Books many spots for one user in a single transaction.
+
+    Body: {"user_id": 1, "items": [{"spot_id": 5, "vehicle_number": "..."},
+                                   {"lot_id": 2, "vehicle_number": "..."}, ...]}
+    An item names either a spot or a lot (any free spot in it). All spots are
+    claimed with one conditional UPDATE and the bookings/bills are inserted
+    in one flush inside a SAVEPOINT. If a concurrent booking makes that flush
+    fail (uq_booking_active_spot), the items are retried one SAVEPOINT each and
+    only the conflicting ones fail. The response reports each item's outcome in
+    request order; items that fail (occupied, reserved, unknown, lot full) do
+    not affect the others.
+    """
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+
+    items, error = read_batch(data, 'items')
+    if error:
+        return jsonify({'error': error}), 400
+    user = get_user_identity(data.get('user_id'))
+    if not user:
+        return jsonify({'error': 'Invalid user ID'}), 404
+
+    results = [None] * len(items)
+    spot_requests = {}  # item index -> spot_id
+    lot_requests = {}   # lot_id -> [item index]
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get('vehicle_number'):
+            results[index] = batch_failure(index, 'Missing vehicle number')
+            continue
+        try:
+            if item.get('spot_id') is not None:
+                spot_requests[index] = int(item['spot_id'])
+            elif item.get('lot_id') is not None:
+                lot_requests.setdefault(int(item['lot_id']), []).append(index)
+            else:
+                results[index] = batch_failure(index, 'Either spot_id or lot_id is required')
+        except (TypeError, ValueError):
+            results[index] = batch_failure(index, 'Invalid spot or lot ID')
+
+    claimed = {}        # item index -> spot_id
+    from_index = []     # spots claimed off the occupancy index free-lists (restored on rollback)
+    occupied = []       # claimed spots that turned out to have another Active booking
+    window = walk_up_window()
+    try:
+        # 1. Explicit spots, one UPDATE for all of them; reserved ones are handed back
+        won = claim_spots(set(spot_requests.values()))
+        reserved = reserved_spot_ids(won, *window)
+        if reserved:
+            vacate_spots(reserved)
+            won -= reserved
+        lost = []
+        for index, spot_id in spot_requests.items():
+            if spot_id in won:
+                won.discard(spot_id) # A spot listed twice is only booked once
+                claimed[index] = spot_id
+            else:
+                lost.append(index)
+        if lost:
+            existing = {spot_id for (spot_id,) in db.session.query(ParkingSpot.id).filter(
+                ParkingSpot.id.in_([spot_requests[index] for index in lost]))}
+            for index in lost:
+                if spot_requests[index] in reserved:
+                    results[index] = batch_failure(index, 'This spot is reserved for an upcoming booking.')
+                elif spot_requests[index] in existing:
+                    results[index] = batch_failure(index, 'This spot is already occupied.')
+                else:
+                    results[index] = batch_failure(index, 'Invalid parking spot ID')
+
+        # 2. Any free spot in a lot: candidates come from the index and are
+        #    verified with the same conditional UPDATE; stale ones are skipped
+        for lot_id, pending in lot_requests.items():
+            if get_lot_tariff(lot_id) is None:
+                for index in pending:
+                    results[index] = batch_failure(index, 'Invalid parking lot ID')
+                continue
+            excluded = reservation_index.reserved_spots(lot_id, *window)
+            while pending:
+                candidates = []
+                while len(candidates) < len(pending):
+                    spot_id = occupancy_index.claim_free(lot_id, exclude=excluded)
+                    if spot_id is None:
+                        break
+                    candidates.append(spot_id)
+                if not candidates:
+                    break
+                won = claim_spots(candidates)
+                reserved = reserved_spot_ids(won, *window) # Reserved in another process
+                if reserved:
+                    vacate_spots(reserved)
+                    occupancy_index.mark_free_many(reserved)
+                    excluded |= reserved
+                    won -= reserved
+                from_index.extend(spot_id for spot_id in candidates if spot_id in won)
+                for spot_id in candidates:
+                    if spot_id in won:
+                        claimed[pending.pop(0)] = spot_id
+            for index in pending:
+                results[index] = batch_failure(index, 'No free spots available in this lot.')
+
+        # 3. Bookings and bills for every claimed spot, flushed together
+        try:
+            with db.session.begin_nested():
+                records = {
+                    index: create_booking_records(spot_id, user.id, items[index]['vehicle_number'])
+                    for index, spot_id in claimed.items()
+                }
+        except IntegrityError:
+            # A spot got an Active booking concurrently: find it item by item
+            records = {}
+            for index, spot_id in list(claimed.items()):
+                try:
+                    with db.session.begin_nested():
+                        records[index] = create_booking_records(spot_id, user.id, items[index]['vehicle_number'])
+                except IntegrityError:
+                    del claimed[index] # The spot stays occupied: it has that other booking
+                    occupied.append(spot_id)
+                    results[index] = batch_failure(index, 'This spot is already occupied.')
+        db.session.commit()
+
+    except Exception as e:
+        db.session.rollback()
+        occupancy_index.mark_free_many(from_index)
+        app.logger.error(f"Error batch booking for user {user.id}: {e}")
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+
+    spot_info = {}
+    if claimed:
+        spot_info = {row.id: row for row in db.session.query(
+            ParkingSpot.id, ParkingSpot.lot_id, ParkingSpot.spot_number
+        ).filter(ParkingSpot.id.in_(list(claimed.values())))}
+    for spot_id in occupied:
+        occupancy_index.mark_occupied(spot_id)
+    for index, spot_id in claimed.items():
+        occupancy_index.mark_occupied(spot_id)
+        booking, billing = records[index]
+        results[index] = {
+            'index': index,
+            'success': True,
+            'booking_id': booking.id,
+            'billing_id': billing.id,
+            'spot_id': spot_id,
+            'spot_number': spot_info[spot_id].spot_number,
+            'lot_id': spot_info[spot_id].lot_id,
+            'status': billing.status
+        }
+    if claimed:
+        change_versions.bump(*{('lot', row.lot_id) for row in spot_info.values()}, ('user', user.id))
+        for spot_id in claimed.values():
+            publish_spot_change(spot_id)
+
+    return jsonify({'booked': len(claimed), 'failed': len(items) - len(claimed), 'results': results}), 200
+
+
+@app.route('/api/releases/batch', methods=['POST'])
+def release_spots_batch():
+    """
+    Releases many bookings in a single transaction.
+
+    Body: {"booking_ids": [12, 13, ...]}
+    Bookings are completed with one conditional UPDATE, bills are finalized
+    with one executemany (same math as release_spot, via calculate_bill),
+    spots are freed with one UPDATE and the revenue rollup gets one upsert
+    per lot. The response reports each item's outcome in request order.
+    """
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+
+    booking_ids, error = read_batch(data, 'booking_ids')
+    if error:
+        return jsonify({'error': error}), 400
+
+    results = [None] * len(booking_ids)
+    wanted = {}  # booking_id -> item index
+    for index, booking_id in enumerate(booking_ids):
+        try:
+            booking_id = int(booking_id)
+        except (TypeError, ValueError):
+            results[index] = batch_failure(index, 'Invalid booking ID')
+            continue
+        if booking_id in wanted:
+            results[index] = batch_failure(index, 'Booking listed twice in this batch')
+            continue
+        wanted[booking_id] = index
+
+    rows = {}
+    if wanted:
+        rows = {row.id: row for row in db.session.query(
+            Booking.id, Booking.spot_id, Booking.customer_id, Booking.start_time, Booking.status,
+            ParkingSpot.lot_id, Billing.id.label('billing_id')
+        ).join(ParkingSpot, ParkingSpot.id == Booking.spot_id)
+         .outerjoin(Billing, Billing.booking_id == Booking.id)
+         .filter(Booking.id.in_(list(wanted)))}
+
+    active = []
+    for booking_id, index in wanted.items():
+        row = rows.get(booking_id)
+        if row is None:
+            results[index] = batch_failure(index, 'Booking not found')
+        elif row.status != 'Active':
+            results[index] = batch_failure(index, 'This booking is already completed.')
+        else:
+            active.append(booking_id)
+
+    end_time = datetime.utcnow()
+    released = []
+    try:
+        completed = complete_bookings(active, end_time)
+        bills = []
+        revenue = {}  # lot_id -> [amount, bills]
+        for booking_id in active:
+            index = wanted[booking_id]
+            if booking_id not in completed:
+                results[index] = batch_failure(index, 'This booking is already completed.')
+                continue
+            row = rows[booking_id]
+            duration_hours, final_cost = calculate_bill(row.start_time, end_time, get_lot_tariff(row.lot_id).tariff)
+            if row.billing_id is not None:
+                bills.append({'id': row.billing_id, 'final_cost': final_cost,
+                              'billing_time': end_time, 'status': 'Completed'})
+            lot_total = revenue.setdefault(row.lot_id, [0, 0])
+            lot_total[0] += final_cost
+            lot_total[1] += 1
+            released.append(row)
+            results[index] = {
+                'index': index,
+                'success': True,
+                'booking_id': booking_id,
+                'status': 'Completed',
+                'final_cost': final_cost,
+                'duration_hours': duration_hours
+            }
+
+        if bills:
+            db.session.execute(db.update(Billing), bills) # Bulk UPDATE by primary key
+        if released:
+            vacate_spots([row.spot_id for row in released])
+        for lot_id, (amount, bill_count) in revenue.items():
+            record_revenue(lot_id, end_time.date(), amount, bills=bill_count)
+        db.session.commit()
+
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error batch releasing bookings: {e}")
+        return jsonify({'error': 'An internal server error occurred.'}), 500
+
+    if released:
+        for row in released:
+            occupancy_index.mark_free(row.spot_id)
+        change_versions.bump(*{('lot', row.lot_id) for row in released},
+                             *{('user', row.customer_id) for row in released}, 'revenue')
+        for row in released:
+            publish_spot_change(row.spot_id)
+
+    return jsonify({'released': len(released), 'failed': len(booking_ids) - len(released), 'results': results}), 200
+# -----------------------------------------
+
+
+def parse_lot_ids(raw):
+    """Parses a comma-separated `lot_ids` query value. Returns None if absent, raises ValueError if malformed."""
+    if raw is None or raw.strip() == '':
+        return None
+    return [int(part) for part in raw.split(',') if part.strip()]
+
+
+# --- COLUMN PROJECTIONS ---
+# Read endpoints select just the columns a response needs as plain rows
+# and build the dicts from them: no ORM objects, identity map or
+# relationship loading. Each builder returns exactly what the matching
+# to_dict() returns.
+
+LOT_COLUMNS = (ParkingLot.id, ParkingLot.name, ParkingLot.address, ParkingLot.pincode,
+               ParkingLot.price_per_hour, ParkingLot.max_spots)
+
+
+def lot_row_dict(row, occupied):
+    """ParkingLot.to_dict(occupied=occupied, include_spots=False) of a LOT_COLUMNS row."""
+    lot_id, name, address, pincode, price_per_hour, max_spots = row
+    return {
+        'id': lot_id,
+        'name': name,
+        'number': f'#{lot_id}',
+        'address': address,
+        'pincode': pincode,
+        'price': price_per_hour,
+        'maxSpots': max_spots,
+        'occupied': occupied
+    }
+
+
+def spot_dicts_by_lot(lot_ids=None):
+    """
+    Returns {lot_id: [ParkingSpot.to_dict(), ...]} for the given lots (all
+    lots if None), spots in id order, read in one query.
+    """
+    query = db.session.query(
+        ParkingSpot.lot_id,
+        ParkingSpot.id,
+        ParkingSpot.spot_number,
+        ParkingSpot.is_occupied,
+        Booking.customer_id,
+        Booking.vehicle_number
+    ).outerjoin(
+        Booking, db.and_(Booking.spot_id == ParkingSpot.id, Booking.status == 'Active')
+    )
+    if lot_ids is not None:
+        query = query.filter(ParkingSpot.lot_id.in_(lot_ids))
+    spots_by_lot = {}
+    for lot_id, spot_id, spot_number, is_occupied, customer_id, vehicle_number in query.order_by(
+            ParkingSpot.lot_id, ParkingSpot.id):
+        spots = spots_by_lot.get(lot_id)
+        if spots is None:
+            spots = spots_by_lot[lot_id] = []
+        spots.append({
+            'id': spot_id,
+            'lotId': lot_id,
+            'spotNumber': spot_number,
+            'status': 1 if is_occupied else 0,
+            'customerId': customer_id if is_occupied else None,
+            'vehicle': vehicle_number if is_occupied else None
+        })
+    return spots_by_lot
+
+
+def lot_spot_dicts(lot_id):
+    """Returns one lot's spots in ParkingSpot.to_dict() form."""
+    return spot_dicts_by_lot([lot_id]).get(lot_id, [])
+# -----------------------------------------
+
+
+@app.route('/api/lots', methods=['GET'])
+def get_all_lots():
+    """
+    Fetches parking lots and returns them for dashboard rendering.
+
+    Query parameters:
+      view=full|summary  'summary' omits the per-spot arrays (default: full)
+      lot_ids=1,2,3      restrict the response to these lots
+    The number of queries is constant regardless of how many lots are returned.
+    """
+    view = request.args.get('view', 'full')
+    if view not in ('full', 'summary'):
+        return jsonify({'error': "Invalid view. Use 'full' or 'summary'."}), 400
+
+    try:
+        lot_ids = parse_lot_ids(request.args.get('lot_ids'))
+    except ValueError:
+        return jsonify({'error': 'lot_ids must be a comma-separated list of integers.'}), 400
+
+    # Read before querying so a client resuming the stream from this version misses nothing
+    feed_version = occupancy_feed.version
+    feed_headers = {'X-Feed-Version': str(feed_version)}
+
+    if lot_ids is None:
+        etag = change_versions.etag('lots', view, change_versions.get('global'))
+    else:
+        lot_keys = [('lot', lot_id) for lot_id in lot_ids]
+        etag = change_versions.etag('lots', view, tuple(lot_ids), change_versions.get(*lot_keys))
+    cached = not_modified(etag, feed_headers)
+    if cached:
+        return cached
+
+    lots_query = db.session.query(*LOT_COLUMNS).filter(ParkingLot.id.notin_(lots_being_deleted()))
+    if lot_ids is not None:
+        lots_query = lots_query.filter(ParkingLot.id.in_(lot_ids))
+    lots = lots_query.order_by(ParkingLot.id).all()
+
+    # Occupied counts come from the in-memory index, not the database
+    occupied_counts = occupancy_index.occupied_counts(lot_ids)
+    lots_data = [lot_row_dict(lot, occupied_counts.get(lot.id, 0)) for lot in lots]
+
+    if view != 'summary':
+        # 1 query for every spot of the selected lots
+        spots_by_lot = spot_dicts_by_lot(lot_ids)
+        for lot in lots_data:
+            lot['spots'] = spots_by_lot.get(lot['id'], [])
+
+    response = jsonify(lots_data)
+    response.headers.update(feed_headers)
+    return with_etag(response, etag)
+
+
+@app.route('/api/lots/stream', methods=['GET'])
+def stream_lot_changes():
+    """
+    Server-Sent Events stream of occupancy deltas.
+
+    Events:
+      spot   {lotId, spotId, status, occupied}  a spot became occupied (1) or free (0)
+      lot    {action, lotId, lot}               a lot was created, updated or deleted
+      reset  {version}                          the client's version is too old; reload /api/lots
+    Every event id is the feed version. Resume with the standard Last-Event-ID
+    header (sent automatically by EventSource) or ?since=<version>, typically
+    the X-Feed-Version header of the /api/lots response the client rendered.
+    """
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        since = int(since) if since is not None else occupancy_feed.version
+    except ValueError:
+        return jsonify({'error': 'since must be an integer version.'}), 400
+
+    response = Response(EventStream(since), mimetype='text/event-stream')
+    response.direct_passthrough = True # Hand EventStream itself to the server (see server.py)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # Disable proxy buffering (nginx)
+    return response
+
+
+# --- LOT SEARCH ---
+
+class LotSearchIndex:
+    """
+    In-memory catalog of every lot's (lowercased name, pincode, price) with
+    a sorted pincode list for prefix lookups by bisection.
+
+    Rebuilt from the database (one query) whenever the 'catalog' change
+    version moves, i.e. after any lot is added, edited or deleted, and
+    after max_age seconds. Note: the index is per process.
+    """
+
+    def __init__(self, max_age=None):
+        self._lock = threading.Lock()
+        self.max_age = max_age
+        self._version = None
+        self._loaded_at = 0.0
+        self._lots = {}       # lot_id -> (name_lower, pincode, price)
+        self._pincodes = []   # sorted (pincode, lot_id)
+
+    def reset(self):
+        """Drops the catalog so it is rebuilt from the database on next use."""
+        with self._lock:
+            self._version = None
+
+    def snapshot(self):
+        """Returns (lots, pincodes); both are replaced, never mutated, so callers may use them unlocked."""
+        with self._lock:
+            version = change_versions.get('catalog')
+            stale = self.max_age is not None and time.monotonic() - self._loaded_at >= self.max_age
+            if version != self._version or stale:
+                rows = db.session.query(
+                    ParkingLot.id, ParkingLot.name, ParkingLot.pincode, ParkingLot.price_per_hour
+                ).filter(ParkingLot.id.notin_(lots_being_deleted())).all()
+                self._lots = {lot_id: (name.lower(), pincode, price) for lot_id, name, pincode, price in rows}
+                self._pincodes = sorted((pincode, lot_id) for lot_id, name, pincode, price in rows)
+                self._version = version
+                self._loaded_at = time.monotonic()
+            return self._lots, self._pincodes
+
+    @staticmethod
+    def with_pincode_prefix(pincodes, prefix):
+        start = bisect.bisect_left(pincodes, (prefix,))
+        end = bisect.bisect_left(pincodes, (prefix[:-1] + chr(ord(prefix[-1]) + 1),))
+        return [lot_id for _, lot_id in pincodes[start:end]]
+
+
+lot_search_index = LotSearchIndex(max_age=app.config['OCCUPANCY_INDEX_MAX_AGE'])
+
+
+def lot_fts_available():
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    return db.session.execute(db.text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'parking_lot_fts'"
+    )).first() is not None
+
+
+def lot_ids_matching(words):
+    """Ids of lots whose name or address contains every word (as a word prefix with FTS5)."""
+    if lot_fts_available():
+        match = ' '.join(f'"{word}"*' for word in words)
+        # Common words can match every lot; read the ids straight off the sqlite3 cursor
+        cursor = db.session.connection().connection.driver_connection.execute(
+            "SELECT rowid FROM parking_lot_fts WHERE parking_lot_fts MATCH ?", (match,))
+        return {lot_id for (lot_id,) in cursor}
     else:
-        # On failure, return a generic error
-        return jsonify({'error': 'Invalid email or password.'}), 401 # 401 Unauthorized
-# ------------------------------
+        # Substring fallback for databases without FTS5
+        query = db.session.query(ParkingLot.id)
+        for word in words:
+            word = word.lower()
+            query = query.filter(db.or_(
+                db.func.lower(ParkingLot.name).contains(word, autoescape=True),
+                db.func.lower(ParkingLot.address).contains(word, autoescape=True)
+            ))
+        return {lot_id for (lot_id,) in query}
 
-# --- ADD THIS NEW API ROUTE FOR USER DETAILS ---
-@app.route('/api/user-details/<int:user_id>', methods=['GET'])
-def get_user_details(user_id):
-    """Fetches details for a specific user, like their full name."""
-    
-    # Check if user exists
-    user = User.query.get_or_404(user_id)
-    
+
+@app.route('/api/lots/search', methods=['GET'])
+def search_lots():
+    """
+    Searches lots, ranked and paginated.
+
+    Query parameters (all optional):
+      q=<words>               name/address words (prefix match, all words must match)
+      pincode=<prefix>        pincode starting with this
+      min_free_spots=<n>      at least n free spots right now
+      max_price=<price>       price per hour at most this
+      sort=relevance|price|free_spots
+      limit=<1..100>, after=<cursor>
+
+    Text matching uses the FTS5 index (ids only); pincode, price and
+    free-spot filters run against the in-memory lot search and occupancy
+    indexes, so no COUNT or full-table queries are issued. Only the
+    returned page is loaded from the database. Relevance ranks lots by how
+    many query words appear in the name, then exact pincode match, most
+    free spots, lowest price.
+    """
+    words = [word.lower() for word in re.findall(r'\w+', request.args.get('q', ''))]
+    pincode = request.args.get('pincode', '').strip()
+    sort = request.args.get('sort', 'relevance')
+    if sort not in ('relevance', 'price', 'free_spots'):
+        return jsonify({'error': "Invalid sort. Use 'relevance', 'price' or 'free_spots'."}), 400
     try:
-        # Return only the necessary details 
+        min_free = int(request.args['min_free_spots']) if request.args.get('min_free_spots') else None
+        max_price = float(request.args['max_price']) if request.args.get('max_price') else None
+        limit, after = parse_page_args(default_limit=20, max_limit=100)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid search parameter: {e}'}), 400
+    limit = limit or 20
+
+    try:
+        lots, pincodes = lot_search_index.snapshot()
+        lot_ids = LotSearchIndex.with_pincode_prefix(pincodes, pincode) if pincode else lots.keys()
+        if words:
+            text_ids = lot_ids_matching(words)
+            lot_ids = [lot_id for lot_id in lot_ids if lot_id in text_ids] if pincode else [
+                lot_id for lot_id in text_ids if lot_id in lots]
+
+        free_counts = occupancy_index.free_counts()
+        rows = [(lot_id, *lots[lot_id], free_counts.get(lot_id, 0)) for lot_id in lot_ids]
+        if max_price is not None:
+            rows = [row for row in rows if row[3] <= max_price]
+        if min_free is not None:
+            rows = [row for row in rows if row[4] >= min_free]
+
+        # Sort keys end with the lot id, which makes them unique cursor positions
+        if sort == 'price':
+            candidates = [(price, -free, lot_id) for lot_id, _, _, price, free in rows]
+        elif sort == 'free_spots':
+            candidates = [(-free, price, lot_id) for lot_id, _, _, price, free in rows]
+        else:
+            candidates = [
+                (-len([word for word in words if word in name]), lot_pincode != pincode, -free, price, lot_id)
+                for lot_id, name, lot_pincode, price, free in rows
+            ]
+
+        if after is not None:
+            after = tuple(after)
+            try:
+                candidates = [key for key in candidates if key > after]
+            except TypeError:
+                return jsonify({'error': 'Invalid search parameter: Invalid cursor'}), 400
+        page = heapq.nsmallest(limit + 1, candidates)
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        page_ids = [key[-1] for key in page]
+        lots = {lot.id: lot for lot in db.session.query(*LOT_COLUMNS).filter(ParkingLot.id.in_(page_ids))} if page_ids else {}
+        occupied = occupancy_index.occupied_counts(page_ids)
+        items = []
+        for lot_id in page_ids:
+            item = lot_row_dict(lots[lot_id], occupied.get(lot_id, 0))
+            item['freeSpots'] = free_counts.get(lot_id, 0)
+            items.append(item)
+
         return jsonify({
-            'user_id': user.id,
-            'full_name': user.full_name 
-            # Add other details here if needed later
+            'items': items,
+            'next_cursor': encode_cursor(*page[-1]) if has_more else None
         }), 200
+
+    except Exception as e:
+        app.logger.error(f"Error searching lots: {e}")
+        return jsonify({'error': 'An internal server error occurred while searching.'}), 500
+# -----------------------------------------
+
+
+@app.route('/api/lots', methods=['POST'])
+def add_new_lot():
+    """Handles submission of the 'Add Parking Lot' form and initializes spots."""
+    data = request.get_json()
+
+    required_fields = ['name', 'address', 'pincode', 'price', 'maxSpots']
+    if not data or not all(key in data for key in required_fields):
+        return jsonify({'message': 'Missing data fields'}), 400
+    
+    try:
+        new_lot = ParkingLot(
+            name=data['name'],
+            address=data['address'],
+            pincode=data['pincode'],
+            price_per_hour=float(data['price']),
+            max_spots=int(data['maxSpots'])
+        )
+        # Never reuse a deleted lot's id: its archived history and revenue keep it
+        last_archived = db.session.query(db.func.max(ArchivedLot.id)).scalar()
+        if last_archived is not None and last_archived >= (db.session.query(db.func.max(ParkingLot.id)).scalar() or 0):
+            new_lot.id = last_archived + 1
+        db.session.add(new_lot)
+        db.session.flush() # Flush here to get new_lot.id
+
+        # Initialize ParkingSpot records with one bulk insert, same transaction
+        bulk_create_spots(new_lot.id, 1, new_lot.max_spots)
+        db.session.commit()
+
+        spots = lot_spot_dicts(new_lot.id)
+        occupancy_index.add_spots(new_lot.id, [spot['id'] for spot in spots])
         
+        lot_data = new_lot.to_dict(occupied=0, include_spots=False)
+        change_versions.bump(('lot', new_lot.id), 'catalog')
+        publish_lot_change('created', dict(lot_data))
+        lot_data['spots'] = spots
+        return jsonify(lot_data), 201 
+
     except Exception as e:
-        app.logger.error(f"Error fetching details for user {user_id}: {e}")
-        return jsonify({'error': 'An internal server error occurred while fetching user details.'}), 500
-# ---------------------------------------------
+        db.session.rollback()
+        app.logger.error(f"Error adding lot: {e}")
+        return jsonify({'message': f'Database error occurred: {e}'}), 500
+
+
+def bulk_create_spots(lot_id, first_number, last_number):
+    """Inserts free spots numbered first_number..last_number for a lot in a single executemany."""
+    if last_number < first_number:
+        return
+    db.session.execute(
+        ParkingSpot.__table__.insert(), # Core insert: plain executemany, no ORM bookkeeping
+        [
+            {'lot_id': lot_id, 'spot_number': str(i), 'is_occupied': False}
+            for i in range(first_number, last_number + 1)
+        ]
+    )
+
+
+def resize_lot_spots(lot, new_max_spots):
+    """
+    Grows or shrinks a lot's spots to new_max_spots without loading the lot's spots.
+    Growing appends spots; shrinking removes spots from the tail (highest ids),
+    and only if none of them is occupied or reserved; their past bookings and
+    bills are archived. Returns (added_ids, removed_ids), or None if a tail
+    spot is in use. The caller must commit or roll back.
+    """
+    current = lot.max_spots
+    if new_max_spots > current:
+        last_id = db.session.query(db.func.max(ParkingSpot.id)).filter(
+            ParkingSpot.lot_id == lot.id
+        ).scalar() or 0
+        bulk_create_spots(lot.id, current + 1, new_max_spots)
+        added_ids = [spot_id for (spot_id,) in db.session.query(ParkingSpot.id).filter(
+            ParkingSpot.lot_id == lot.id,
+            ParkingSpot.id > last_id
+        )]
+        lot.max_spots = new_max_spots
+        return added_ids, []
+
+    # The tail is an id range, not an id list: a large shrink would exceed the
+    # database's bound-parameter limit (spot_number is text, so no numeric range)
+    first_removed = db.session.query(ParkingSpot.id).filter(
+        ParkingSpot.lot_id == lot.id
+    ).order_by(ParkingSpot.id).offset(new_max_spots).limit(1).scalar()
+    if first_removed is None: # Fewer spots than max_spots already
+        lot.max_spots = new_max_spots
+        return [], []
+    in_tail = (ParkingSpot.lot_id == lot.id, ParkingSpot.id >= first_removed)
+    tail = db.select(ParkingSpot.id).where(*in_tail)
+
+    if ParkingSpot.query.filter(*in_tail, ParkingSpot.is_occupied == True).count():
+        return None
+    if db.session.query(Reservation.id).filter(
+        Reservation.spot_id.in_(tail),
+        Reservation.end_time > datetime.utcnow(),
+        Reservation.status.in_(HOLDING_STATUSES)
+    ).first() is not None:
+        return None
+    tail_ids = db.session.execute(tail).scalars().all()
+
+    # Past bookings and bills move to the archive, like those of a deleted lot:
+    # revenue and occupancy reports keep counting them
+    chunk_size = app.config['LOT_DELETE_CHUNK_SIZE']
+    archived_at = datetime.utcnow()
+    while True:
+        booking_ids = db.session.execute(
+            db.select(Booking.id).where(Booking.spot_id.in_(tail), Booking.status != 'Active').limit(chunk_size)
+        ).scalars().all()
+        if not booking_ids:
+            break
+        archive_bookings(booking_ids, archived_at)
+    Reservation.query.filter(Reservation.spot_id.in_(tail)).delete(synchronize_session=False)
+
+    # Conditional delete: a tail spot booked concurrently makes the rowcount fall short
+    removed = ParkingSpot.query.filter(
+        *in_tail,
+        ParkingSpot.is_occupied == False
+    ).delete(synchronize_session=False)
+    if removed != len(tail_ids):
+        return None
+    lot.max_spots = new_max_spots
+    return [], tail_ids
+
+
+@app.route('/api/lots/<int:lot_id>', methods=['PUT'])
+def update_lot(lot_id):
+    """
+    Handles submission of the 'Edit Parking Lot' form.
+    Changing maxSpots adds spots to, or removes free spots from, the end of the lot.
+    """
+    lot = ParkingLot.query.get_or_404(lot_id)
+    data = request.get_json()
+
+    try:
+        # Update fields
+        lot.name = data.get('name', lot.name)
+        lot.address = data.get('address', lot.address)
+        lot.pincode = data.get('pincode', lot.pincode)
+        lot.price_per_hour = float(data.get('price', lot.price_per_hour))
+        
+        new_max_spots = int(data.get('maxSpots', lot.max_spots))
+        if new_max_spots < 1:
+            return jsonify({'message': 'A lot must have at least one spot.'}), 400
+
+        added_ids, removed_ids = [], []
+        if new_max_spots != lot.max_spots:
+            resized = resize_lot_spots(lot, new_max_spots)
+            if resized is None:
+                db.session.rollback()
+                return jsonify({'message': 'Cannot remove spots that are currently occupied or reserved. '
+                                           'Release them or cancel their reservations first.'}), 409
+            added_ids, removed_ids = resized
+
+        db.session.commit()
+        lot_cache.invalidate(lot.id)
+        if added_ids:
+            occupancy_index.add_spots(lot.id, added_ids)
+        if removed_ids:
+            occupancy_index.remove_spots(lot.id, removed_ids)
+        lot_data = lot.to_dict(occupied=occupancy_index.occupied_counts([lot.id]).get(lot.id, 0), include_spots=False)
+        change_versions.bump(('lot', lot.id), 'catalog')
+        publish_lot_change('updated', dict(lot_data))
+        lot_data['spots'] = lot_spot_dicts(lot.id)
+        return jsonify(lot_data), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error updating lot {lot_id}: {e}")
+        return jsonify({'message': f'Database error: {e}'}), 500
+
+
+# --- LOT TARIFFS (see billing.py) ---
+
+def tariff_dict(lot_id, tariff):
+    return {
+        'lotId': lot_id,
+        'price': tariff.price_per_hour,
+        'peakStartHour': tariff.peak_start_hour,
+        'peakEndHour': tariff.peak_end_hour,
+        'peakMultiplier': tariff.peak_multiplier,
+        'weekendMultiplier': tariff.weekend_multiplier,
+        'dailyCap': tariff.daily_cap
+    }
+
+
+def optional_hour(value):
+    if value is None:
+        return None
+    hour = int(value)
+    if not 0 <= hour <= 23:
+        raise ValueError('hours must be between 0 and 23')
+    return hour
+
+
+def positive_number(value, default):
+    if value is None:
+        return default
+    number = float(value)
+    if number <= 0:
+        raise ValueError('multipliers and caps must be positive')
+    return number
+
+
+@app.route('/api/lots/<int:lot_id>/tariff', methods=['GET'])
+def get_lot_tariff_plan(lot_id):
+    """Returns a lot's tariff: its price plus the time-of-day rules (flat if it has none)."""
+    lot = get_lot_tariff(lot_id)
+    if lot is None:
+        return jsonify({'message': 'Lot not found'}), 404
+    return jsonify(tariff_dict(lot_id, lot.tariff)), 200
+
+
+@app.route('/api/lots/<int:lot_id>/tariff', methods=['PUT'])
+def update_lot_tariff_plan(lot_id):
+    """
+    Sets a lot's time-of-day tariff. Body (all optional):
+      peakStartHour, peakEndHour       weekday peak window [start, end), 0-23 local time
+      peakMultiplier, weekendMultiplier  applied to the lot's price (default 1)
+      dailyCap                         most charged per calendar day (null = no cap)
+    Applies to bookings released from now on; POST /api/admin/rebill
+    re-prices bills already issued.
+    """
+    ParkingLot.query.get_or_404(lot_id)
+    data = request.get_json()
+    if data is None:
+        return jsonify({'message': 'Missing data fields'}), 400
+
+    try:
+        peak_start_hour = optional_hour(data.get('peakStartHour'))
+        peak_end_hour = optional_hour(data.get('peakEndHour'))
+        peak_multiplier = positive_number(data.get('peakMultiplier'), 1.0)
+        weekend_multiplier = positive_number(data.get('weekendMultiplier'), 1.0)
+        daily_cap = positive_number(data.get('dailyCap'), None)
+    except (TypeError, ValueError) as e:
+        return jsonify({'message': f'Invalid tariff: {e}'}), 400
+    if (peak_start_hour is None) != (peak_end_hour is None):
+        return jsonify({'message': 'Invalid tariff: give both peakStartHour and peakEndHour, or neither'}), 400
+
+    try:
+        plan = db.session.get(TariffPlan, lot_id)
+        if plan is None:
+            plan = TariffPlan(lot_id=lot_id)
+            db.session.add(plan)
+        plan.peak_start_hour = peak_start_hour
+        plan.peak_end_hour = peak_end_hour
+        plan.peak_multiplier = peak_multiplier
+        plan.weekend_multiplier = weekend_multiplier
+        plan.daily_cap = daily_cap
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error updating tariff of lot {lot_id}: {e}")
+        return jsonify({'message': f'Database error: {e}'}), 500
+
+    lot_cache.invalidate(lot_id)
+    change_versions.bump(('lot', lot_id), 'catalog')
+    return jsonify(tariff_dict(lot_id, get_lot_tariff(lot_id).tariff)), 200
+# -----------------------------------------
+
+
+# --- BACKGROUND LOT DELETION ---
+
+class LotDeletionJob(db.Model):
+    """
+    Progress of one DELETE /api/lots/<id>: queued -> running -> completed
+    (or failed, resumable by deleting the lot again). While a job is open the
+    lot is hidden from the listings and all of its spots read as occupied.
+    """
+    __tablename__ = 'lot_deletion_job'
+    id = db.Column(db.Integer, primary_key=True)
+    lot_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='queued')
+    total_bookings = db.Column(db.Integer, nullable=True) # Counted when the job starts
+    total_spots = db.Column(db.Integer, nullable=True)
+    archived_bookings = db.Column(db.Integer, nullable=False, default=0)
+    deleted_bookings = db.Column(db.Integer, nullable=False, default=0)
+    deleted_spots = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # One open job per lot
+        db.Index('uq_lot_deletion_job_open', 'lot_id', unique=True,
+                 sqlite_where=db.text("status != 'completed'"),
+                 postgresql_where=db.text("status != 'completed'")),
+    )
+
+    def to_dict(self):
+        total = (self.total_bookings or 0) + (self.total_spots or 0)
+        done = self.deleted_bookings + self.deleted_spots
+        if self.status == 'completed':
+            progress = 100
+        elif self.total_bookings is None:
+            progress = 0
+        else:
+            progress = min(99, int(100 * done / total)) if total else 99
+        return {
+            'id': self.id,
+            'lot_id': self.lot_id,
+            'status': self.status,
+            'progress': progress,
+            'total_bookings': self.total_bookings,
+            'archived_bookings': self.archived_bookings,
+            'deleted_bookings': self.deleted_bookings,
+            'total_spots': self.total_spots,
+            'deleted_spots': self.deleted_spots,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+def lots_being_deleted():
+    """Subquery of lot ids with an open deletion job, for filtering lot listings."""
+    return db.select(LotDeletionJob.lot_id).where(LotDeletionJob.status != 'completed').scalar_subquery()
+
+
+def bill_open_stays(lot_id, rows, end_time):
+    """
+    Ends the Active bookings in rows (id, customer_id, start_time, billing_id)
+    at end_time and finalizes their bills, as release_spot would. Runs in the
+    caller's transaction; returns the customer ids of the stays billed.
+    """
+    completed = complete_bookings([row.id for row in rows], end_time)
+    if not completed:
+        return set()
+    tariff = get_lot_tariff(lot_id).tariff
+    bills, amount = [], 0
+    for row in rows:
+        if row.id not in completed:
+            continue # Released concurrently
+        final_cost = calculate_bill(row.start_time, end_time, tariff)[1]
+        amount += final_cost
+        if row.billing_id is not None:
+            bills.append({'id': row.billing_id, 'final_cost': final_cost,
+                          'billing_time': end_time, 'status': 'Completed'})
+    if bills:
+        db.session.execute(db.update(Billing), bills) # Bulk UPDATE by primary key
+    record_revenue(lot_id, end_time.date(), amount, bills=len(completed))
+    return {row.customer_id for row in rows if row.id in completed}
+
+
+def run_lot_deletion(job_id):
+    """
+    Deletes a lot LOT_DELETE_CHUNK_SIZE rows per transaction, so no single
+    write holds the database lock for long and bookings elsewhere keep
+    flowing in between:
+      1. bookings of the lot: stays still open are ended and billed now
+         (like release_spot), then every booking and its bill is copied to
+         the archive tables and deleted;
+      2. the lot's spots, with their reservations;
+      3. the lot row itself, copied to parking_lot_archive first.
+    Progress is committed with each chunk, so an interrupted job resumes
+    where it stopped. The lot_revenue_daily rows are kept.
+    """
+    chunk_size = app.config['LOT_DELETE_CHUNK_SIZE']
+    pause = app.config['LOT_DELETE_PAUSE_MS'] / 1000
+    job = db.session.get(LotDeletionJob, job_id)
+    lot_id = job.lot_id
+    lot_spot_ids = db.select(ParkingSpot.id).where(ParkingSpot.lot_id == lot_id)
+
+    if job.total_bookings is None:
+        job.total_bookings = Booking.query.filter(Booking.spot_id.in_(lot_spot_ids)).count()
+        job.total_spots = ParkingSpot.query.filter(ParkingSpot.lot_id == lot_id).count()
+        db.session.commit()
+
+    while True:
+        # No ORDER BY: every chunk is deleted, so the next one is simply what is left
+        rows = db.session.query(
+            Booking.id, Booking.customer_id, Booking.start_time, Booking.status, Billing.id.label('billing_id')
+        ).outerjoin(Billing, Billing.booking_id == Booking.id).filter(
+            Booking.spot_id.in_(lot_spot_ids)
+        ).limit(chunk_size).all()
+        if not rows:
+            break
+        now = datetime.utcnow()
+        billed = bill_open_stays(lot_id, [row for row in rows if row.status == 'Active'], now)
+        archived = archive_bookings([row.id for row in rows], now)
+        job.archived_bookings += archived
+        job.deleted_bookings += len(rows)
+        db.session.commit()
+        if billed:
+            change_versions.bump(*{('user', customer_id) for customer_id in billed}, 'revenue')
+        time.sleep(pause)
+
+    while True:
+        spot_ids = db.session.execute(lot_spot_ids.limit(chunk_size)).scalars().all()
+        if not spot_ids:
+            break
+        db.session.execute(db.delete(Reservation).where(Reservation.spot_id.in_(spot_ids)))
+        db.session.execute(db.delete(ParkingSpot).where(ParkingSpot.id.in_(spot_ids)))
+        job.deleted_spots += len(spot_ids)
+        db.session.commit()
+        time.sleep(pause)
+
+    lot = db.session.get(ParkingLot, lot_id)
+    if lot is not None:
+        if db.session.get(ArchivedLot, lot_id) is None:
+            db.session.add(ArchivedLot(
+                id=lot.id, name=lot.name, address=lot.address, pincode=lot.pincode,
+                price_per_hour=lot.price_per_hour, max_spots=lot.max_spots
+            ))
+        db.session.execute(db.delete(TariffPlan).where(TariffPlan.lot_id == lot_id))
+        db.session.execute(db.delete(ParkingLot).where(ParkingLot.id == lot_id))
+    invalidate_occupancy(lot_id) # Occupancy is only reported for existing lots
+    job.status = 'completed'
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    db.session.expunge_all() # The deleted lot must not linger in the identity map
+
+    lot_cache.invalidate(lot_id)
+    occupancy_index.remove_lot(lot_id)
+    reservation_index.remove_lot(lot_id)
+    change_versions.bump(('lot', lot_id), 'catalog', 'revenue')
+
+
+class LotDeletionWorker:
+    """
+    Background thread that runs queued lot deletion jobs one at a time. It
+    is started on demand by wake() and exits once the queue is empty.
+    Jobs are claimed with a conditional UPDATE, so several processes can
+    share the queue without running a job twice.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pending = False
+
+    def wake(self):
+        with self._lock:
+            self._pending = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='lot-deletion', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        with app.app_context():
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        self._thread = None
+                        return
+                    self._pending = False
+                self.run_pending()
+
+    def run_pending(self):
+        """Runs queued jobs until none is left (in the calling thread). Returns the number run."""
+        ran = 0
+        while True:
+            job_id = db.session.query(LotDeletionJob.id).filter(
+                LotDeletionJob.status == 'queued'
+            ).order_by(LotDeletionJob.id).limit(1).scalar()
+            if job_id is None:
+                return ran
+            claimed = LotDeletionJob.query.filter(
+                LotDeletionJob.id == job_id, LotDeletionJob.status == 'queued'
+            ).update({'status': 'running', 'started_at': datetime.utcnow()}, synchronize_session=False)
+            db.session.commit()
+            if not claimed:
+                continue # Taken by another process
+            ran += 1
+            try:
+                run_lot_deletion(job_id)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Error in lot deletion job {job_id}: {e}")
+                LotDeletionJob.query.filter(LotDeletionJob.id == job_id).update(
+                    {'status': 'failed', 'error': str(e)[:500], 'finished_at': datetime.utcnow()},
+                    synchronize_session=False
+                )
+                db.session.commit()
+            finally:
+                db.session.remove()
+
+    def requeue_interrupted(self):
+        """Puts jobs left 'running' by a stopped process back in the queue. Only call with no other worker alive."""
+        count = LotDeletionJob.query.filter(LotDeletionJob.status == 'running').update(
+            {'status': 'queued'}, synchronize_session=False
+        )
+        db.session.commit()
+        return count
+
+
+lot_deletion_worker = LotDeletionWorker()
+
+
+@app.route('/api/lots/<int:lot_id>', methods=['DELETE'])
+def delete_lot(lot_id):
+    """
+    Deletes a parking lot with its spots, bookings and reservations in the background.
+
+    The lot disappears from the listings and stops taking bookings at once;
+    the rows are removed in chunks by lot_deletion_worker, after bookings and
+    bills are archived (profit reports keep the lot's revenue). Stays still
+    open when the job reaches them are ended and billed at that time.
+    Returns 202 with the job; poll GET /api/lots/deletions/<job_id>.
+    """
+    lot = ParkingLot.query.get_or_404(lot_id)
+
+    try:
+        job = LotDeletionJob.query.filter(
+            LotDeletionJob.lot_id == lot_id, LotDeletionJob.status != 'completed'
+        ).first()
+        if job is None:
+            job = LotDeletionJob(lot_id=lot_id, status='queued')
+            db.session.add(job)
+        elif job.status == 'failed':
+            job.status, job.error, job.finished_at = 'queued', None, None # Retry, resuming from its progress
+        # Every spot reads as occupied from now on, so no claim (in any process) can succeed
+        ParkingSpot.query.filter(ParkingSpot.lot_id == lot_id).update(
+            {'is_occupied': True}, synchronize_session=False
+        )
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback() # A concurrent DELETE opened the job first
+        job = LotDeletionJob.query.filter(
+            LotDeletionJob.lot_id == lot_id, LotDeletionJob.status != 'completed'
+        ).first()
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error deleting lot {lot_id}: {e}")
+        return jsonify({'message': f'Database error: {e}'}), 500
+
+    lot_cache.invalidate(lot_id)
+    occupancy_index.remove_lot(lot_id)
+    reservation_index.remove_lot(lot_id)
+    change_versions.bump(('lot', lot_id), 'catalog')
+    occupancy_feed.publish('lot', {'action': 'deleted', 'lotId': lot_id, 'lot': None})
+    lot_deletion_worker.wake()
+    return jsonify({
+        'message': f'Lot {lot_id} is being deleted',
+        'job': job.to_dict(),
+        'status_url': url_for('get_lot_deletion', job_id=job.id)
+    }), 202
+
+
+@app.route('/api/lots/deletions/<int:job_id>', methods=['GET'])
+def get_lot_deletion(job_id):
+    """Status and progress of a lot deletion job."""
+    job = db.session.get(LotDeletionJob, job_id)
+    if job is None:
+        return jsonify({'error': 'Deletion job not found'}), 404
+    return jsonify(job.to_dict()), 200
+
+
+@app.cli.command('run-lot-deletions')
+def run_lot_deletions_command():
+    """Resumes interrupted lot deletions and runs all queued ones in the foreground."""
+    db.create_all()
+    requeued = lot_deletion_worker.requeue_interrupted()
+    ran = lot_deletion_worker.run_pending()
+    print(f"Lot deletions run: {ran} ({requeued} resumed after an interruption).")
+# -----------------------------------------
+
+
+# --- GATE SENSOR EVENTS (JOURNAL + BACKGROUND APPLIER) ---
+
+class GateEvent(db.Model):
+    """
+    Journal of gate sensor events (POST /api/gate-events). An entry opens a
+    stay (an Active Booking on a free spot of the lot, like auto-book), an
+    exit completes and bills the vehicle's open stay in the lot, as at the
+    event's timestamp. Events are appended as they arrive and applied in
+    batches by gate_event_applier: pending -> applied (booking_id is the
+    stay opened or closed) or ignored (note says why). An exit that finds
+    the vehicle outside is parked instead: its entry may still be on its
+    way, and it is applied with it if that arrives within
+    GATE_EXIT_REORDER_MINUTES, else it is ignored.
+    """
+    __tablename__ = 'gate_event'
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.String(64), nullable=False) # The sensor's id; an event sent twice is stored once
+    lot_id = db.Column(db.Integer, nullable=False)
+    vehicle_number = db.Column(db.String(20), nullable=False)
+    direction = db.Column(db.String(5), nullable=False) # 'entry' or 'exit'
+    event_time = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    booking_id = db.Column(db.Integer, nullable=True)
+    note = db.Column(db.String(100), nullable=True)
+    received_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    applied_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('uq_gate_event_event_id', 'event_id', unique=True),
+        # The applier's queue
+        db.Index('ix_gate_event_pending', 'id',
+                 sqlite_where=db.text("status = 'pending'"),
+                 postgresql_where=db.text("status = 'pending'")),
+        # Exits waiting for their entry
+        db.Index('ix_gate_event_parked', 'vehicle_number',
+                 sqlite_where=db.text("status = 'parked'"),
+                 postgresql_where=db.text("status = 'parked'")),
+        {'sqlite_autoincrement': True}, # The journal order
+    )
+
+
+GATE_DIRECTIONS = ('entry', 'exit')
+
+
+def read_gate_event(item, received_at):
+    """Journal row for one event of a POST /api/gate-events batch, or None if it is malformed."""
+    try:
+        event_id = str(item['event_id']).strip()
+        vehicle_number = str(item['vehicle_number']).strip().upper()
+        row = {
+            'event_id': event_id,
+            'lot_id': int(item['lot_id']),
+            'vehicle_number': vehicle_number,
+            'direction': str(item['direction']).lower(),
+            'event_time': parse_utc_datetime(item['timestamp']),
+            'status': 'pending',
+            'received_at': received_at
+        }
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not 0 < len(event_id) <= 64 or not 0 < len(vehicle_number) <= 20 or row['direction'] not in GATE_DIRECTIONS:
+        return None
+    return row
+
+
+@app.route('/api/gate-events', methods=['POST'])
+def ingest_gate_events():
+    """
+    Appends a batch of gate sensor events to the journal and returns 202;
+    bookings and bills follow shortly, from gate_event_applier.
+
+    Body: {"events": [{"event_id": "gate3-000123", "lot_id": 2, "vehicle_number": "KA01AB1234",
+                       "timestamp": "2025-01-31T08:15:02Z", "direction": "entry"}, ...]}
+    The whole batch is one INSERT and one commit, so once the response is
+    sent the events are on disk. Events are keyed by event_id: a batch
+    resent after a timeout is only journaled (and applied) once.
+    """
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+
+    events, error = read_batch(data, 'events')
+    if error:
+        return jsonify({'error': error}), 400
+
+    received_at = datetime.utcnow()
+    rows, errors = [], []
+    for index, item in enumerate(events):
+        row = read_gate_event(item, received_at) if isinstance(item, dict) else None
+        if row is None:
+            errors.append(batch_failure(index, 'event_id, lot_id, vehicle_number, timestamp and '
+                                               'direction (entry or exit) are required'))
+        else:
+            rows.append(row)
+
+    accepted = 0
+    if rows:
+        if db.engine.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        try:
+            # Existing event_ids (resent events) are skipped
+            accepted = db.session.execute(
+                insert(GateEvent.__table__).on_conflict_do_nothing(index_elements=['event_id']), rows
+            ).rowcount
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Error journaling gate events: {e}")
+            return jsonify({'error': 'An internal server error occurred.'}), 500
+        gate_event_applier.wake()
+
+    return jsonify({
+        'accepted': accepted,
+        'duplicates': len(rows) - accepted,
+        'rejected': len(errors),
+        'errors': errors
+    }), 202
+
+
+@app.route('/api/gate-events/status', methods=['GET'])
+def get_gate_event_status():
+    """How far the applier is behind the journal, and how many exits wait for their entry."""
+    pending, oldest = db.session.query(
+        db.func.count(GateEvent.id), db.func.min(GateEvent.received_at)
+    ).filter(GateEvent.status == 'pending').one()
+    parked = db.session.query(db.func.count(GateEvent.id)).filter(GateEvent.status == 'parked').scalar()
+    return jsonify({'pending': pending, 'oldest_pending_received_at': oldest, 'parked': parked}), 200
+
+
+def apply_gate_events(limit):
+    """
+    Applies up to `limit` pending journal events, oldest first, in one
+    transaction: the events are marked done in the same commit that writes
+    their bookings, bills, spots and revenue, so after a crash the journal
+    is replayed from exactly the first event not applied. Within the batch
+    events are taken in timestamp order, together with the parked exits of
+    the vehicles entering in it (exits that arrived before their entry).
+
+    Returns the number of events applied, 0 if none is pending, or None if
+    another applier or a concurrent release got in the way (nothing was
+    written; call again).
+    """
+    events = db.session.query(
+        GateEvent.id, GateEvent.lot_id, GateEvent.vehicle_number, GateEvent.direction, GateEvent.event_time
+    ).filter(GateEvent.status == 'pending').order_by(GateEvent.id).limit(limit).all()
+    if not events:
+        return 0
+    now = datetime.utcnow()
+
+    # 1. Take the events; fewer rows updated means another applier has them
+    taken = GateEvent.query.filter(
+        GateEvent.id.in_([event.id for event in events]), GateEvent.status == 'pending'
+    ).update({GateEvent.status: 'applied', GateEvent.applied_at: now}, synchronize_session=False)
+    if taken != len(events):
+        db.session.rollback()
+        return None
+    reorder_cutoff = now - timedelta(minutes=app.config['GATE_EXIT_REORDER_MINUTES'])
+    GateEvent.query.filter(GateEvent.status == 'parked', GateEvent.received_at < reorder_cutoff).update(
+        {GateEvent.status: 'ignored'}, synchronize_session=False) # Their entry never came
+
+    # 2. Open stays of the vehicles involved: (lot_id, vehicle_number) -> stay
+    open_stays = {}
+    rows = db.session.query(
+        Booking.id, Booking.spot_id, Booking.customer_id, Booking.start_time, Booking.vehicle_number,
+        ParkingSpot.lot_id, Billing.id.label('billing_id')
+    ).join(ParkingSpot, ParkingSpot.id == Booking.spot_id).outerjoin(
+        Billing, Billing.booking_id == Booking.id
+    ).filter(
+        Booking.status == 'Active',
+        Booking.vehicle_number.in_(list({event.vehicle_number for event in events}))
+    ).order_by(Booking.start_time.desc())
+    for row in rows: # Oldest last, so it wins
+        open_stays[(row.lot_id, row.vehicle_number)] = {
+            'booking_id': row.id, 'billing_id': row.billing_id, 'spot_id': row.spot_id,
+            'customer_id': row.customer_id, 'start': row.start_time, 'end': None, 'lot_id': row.lot_id
+        }
+
+    # 3. Spots for the entries: claimed up front, one UPDATE per lot, off the
+    #    occupancy index free-lists (see book_spots_batch)
+    window = walk_up_window()
+    entries = Counter(event.lot_id for event in events if event.direction == 'entry')
+    spare, from_index = {}, []
+    for lot_id, count in entries.items():
+        spare[lot_id] = []
+        if get_lot_tariff(lot_id) is None:
+            continue
+        excluded = reservation_index.reserved_spots(lot_id, *window)
+        while len(spare[lot_id]) < count:
+            candidates = []
+            while len(candidates) < count - len(spare[lot_id]):
+                spot_id = occupancy_index.claim_free(lot_id, exclude=excluded)
+                if spot_id is None:
+                    break
+                candidates.append(spot_id)
+            if not candidates:
+                break
+            won = claim_spots(candidates)
+            reserved = reserved_spot_ids(won, *window)
+            if reserved:
+                vacate_spots(reserved)
+                occupancy_index.mark_free_many(reserved)
+                excluded |= reserved
+                won -= reserved
+            from_index.extend(won)
+            spare[lot_id].extend(spot_id for spot_id in candidates if spot_id in won)
+
+    # 4. Replay the batch against the stays; exits free spots for later entries.
+    #    Parked exits of vehicles entering now join in, by timestamp.
+    entering = {(event.lot_id, event.vehicle_number) for event in events if event.direction == 'entry'}
+    parked = [event for event in db.session.query(
+        GateEvent.id, GateEvent.lot_id, GateEvent.vehicle_number, GateEvent.direction, GateEvent.event_time
+    ).filter(
+        GateEvent.status == 'parked',
+        GateEvent.vehicle_number.in_(list({vehicle_number for _, vehicle_number in entering})),
+        GateEvent.received_at >= reorder_cutoff
+    ) if (event.lot_id, event.vehicle_number) in entering] if entering else []
+    parked_ids = {event.id for event in parked}
+    freed = {}            # lot_id -> spots freed by this batch
+    opened, closed = [], []
+    outcomes = []         # (event id, status, stay or None, note)
+    unparked = []         # ids of parked exits matched now
+    for event in sorted(events + parked, key=lambda event: (event.event_time, event.id)):
+        key = (event.lot_id, event.vehicle_number)
+        event_time = min(event.event_time, now) # Sensor clocks running ahead
+        if event.direction == 'entry':
+            if key in open_stays:
+                outcomes.append((event.id, 'ignored', None, 'Vehicle is already inside'))
+                continue
+            lot_freed = freed.get(event.lot_id)
+            spot_id = lot_freed.pop() if lot_freed else (spare[event.lot_id].pop() if spare[event.lot_id] else None)
+            if spot_id is None:
+                outcomes.append((event.id, 'ignored', None, 'No free spot in this lot' if get_lot_tariff(event.lot_id)
+                                 else 'Invalid parking lot ID'))
+                continue
+            stay = {'booking_id': None, 'spot_id': spot_id, 'customer_id': None, 'start': event_time,
+                    'end': None, 'lot_id': event.lot_id, 'vehicle_number': event.vehicle_number}
+            open_stays[key] = stay
+            opened.append(stay)
+        else:
+            stay = open_stays.get(key)
+            if stay is not None and event.id in parked_ids and event_time < stay['start']:
+                stay = None # Left before this stay began
+            if stay is None:
+                if event.id not in parked_ids:
+                    outcomes.append((event.id, 'parked', None, 'Vehicle is not inside'))
+                continue
+            del open_stays[key]
+            stay['end'] = max(event_time, stay['start'])
+            freed.setdefault(event.lot_id, []).append(stay['spot_id'])
+            if stay['booking_id'] is not None:
+                closed.append(stay)
+            if event.id in parked_ids:
+                unparked.append(event.id)
+        outcomes.append((event.id, 'applied', stay, None))
+
+    try:
+        # 5. Parked exits matched now, conditionally (another applier may have
+        #    matched them); then existing stays: conditional completion first (a
+        #    concurrent release makes the count fall short), then their exact end times
+        if unparked:
+            matched = GateEvent.query.filter(
+                GateEvent.id.in_(unparked), GateEvent.status == 'parked'
+            ).update({GateEvent.status: 'applied', GateEvent.applied_at: now}, synchronize_session=False)
+            if matched != len(unparked):
+                db.session.rollback()
+                occupancy_index.mark_free_many(from_index)
+                return None
+        if closed:
+            completed = complete_bookings([stay['booking_id'] for stay in closed], now)
+            if len(completed) != len(closed):
+                db.session.rollback()
+                occupancy_index.mark_free_many(from_index)
+                return None
+            db.session.execute(db.update(Booking), [
+                {'id': stay['booking_id'], 'end_time': stay['end']} for stay in closed
+            ])
+
+        # 6. Bills, new stays and the revenue rollup
+        bills, revenue = [], {} # revenue: (lot_id, day) -> [amount, bills]
+        for stay in opened + closed:
+            if stay['end'] is None:
+                continue
+            stay['duration_hours'], stay['final_cost'] = calculate_bill(
+                stay['start'], stay['end'], get_lot_tariff(stay['lot_id']).tariff)
+            day_total = revenue.setdefault((stay['lot_id'], stay['end'].date()), [0, 0])
+            day_total[0] += stay['final_cost']
+            day_total[1] += 1
+            if stay['booking_id'] is not None and stay['billing_id'] is not None:
+                bills.append({'id': stay['billing_id'], 'final_cost': stay['final_cost'],
+                              'billing_time': stay['end'], 'status': 'Completed'})
+        if bills:
+            db.session.execute(db.update(Billing), bills)
+
+        bookings = []
+        for stay in opened:
+            booking = Booking(spot_id=stay['spot_id'], customer_id=None, vehicle_number=stay['vehicle_number'],
+                              start_time=stay['start'], end_time=stay['end'],
+                              status='Active' if stay['end'] is None else 'Completed')
+            booking.billing = Billing(status='Reserved') if stay['end'] is None else Billing(
+                status='Completed', final_cost=stay['final_cost'], billing_time=stay['end'])
+            bookings.append(booking)
+        db.session.add_all(bookings)
+        db.session.flush() # Assigns the booking ids
+        for stay, booking in zip(opened, bookings):
+            stay['booking_id'] = booking.id
+        for (lot_id, day), (amount, bill_count) in revenue.items():
+            record_revenue(lot_id, day, amount, bills=bill_count)
+
+        # 7. Spots: freed ones not taken again and unused claims are free
+        released = [spot_id for spots in freed.values() for spot_id in spots]
+        unused = [spot_id for spots in spare.values() for spot_id in spots]
+        if released or unused:
+            vacate_spots(released + unused)
+
+        # 8. Stored occupancy buckets of hours these stays changed (backdated events)
+        changed_from = {}
+        for lot_id, moment in [(stay['lot_id'], stay['start']) for stay in opened] + \
+                              [(stay['lot_id'], stay['end']) for stay in closed]:
+            changed_from[lot_id] = min(moment, changed_from.get(lot_id, moment))
+        for lot_id, since in changed_from.items():
+            if since < hour_start(current_hour()):
+                invalidate_occupancy(lot_id, since)
 
+        db.session.execute(db.update(GateEvent), [
+            {'id': event_id, 'status': status, 'booking_id': stay['booking_id'] if stay else None, 'note': note}
+            for event_id, status, stay, note in outcomes
+        ])
+        db.session.commit()
 
-# --- /api/book-spot ROUTE (DEFINED ONLY ONCE) ---
-@app.route('/api/book-spot', methods=['POST'])
-def book_spot():
+    except Exception:
+        db.session.rollback()
+        occupancy_index.mark_free_many(from_index)
+        raise
+
+    # 9. In-memory state, after the commit
+    occupied = {stay['spot_id'] for stay in opened if stay['end'] is None}
+    for spot_id in occupied:
+        occupancy_index.mark_occupied(spot_id)
+    occupancy_index.mark_free_many(set(released + unused) - occupied)
+    touched = opened + closed
+    if touched:
+        change_versions.bump(*{('lot', stay['lot_id']) for stay in touched},
+                             *{('user', stay['customer_id']) for stay in closed if stay['customer_id']},
+                             *(('revenue',) if revenue else ()))
+        for spot_id in {stay['spot_id'] for stay in touched} | set(unused):
+            publish_spot_change(spot_id)
+    return len(events)
+
+
+class GateEventApplier:
     """
-    Handles a new booking request from a user.
-    Creates BOTH a Booking record and a Billing record.
+    Background thread that drains the gate event journal, GATE_APPLY_BATCH_SIZE
+    events per transaction. It is started on demand by wake() and exits once
+    the journal is drained; each wake-up first waits GATE_APPLY_LINGER_MS so
+    that events arriving together share one commit. A batch that fails (e.g.
+    the database is locked) stays pending and is retried with exponential
+    backoff, up to GATE_APPLY_MAX_BACKOFF_MS apart, without waiting for new
+    events. Batches are taken with a conditional UPDATE, so several
+    processes can share the journal.
     """
-    
-    data = request.get_json()
-    if not data:
-        return jsonify({'error': 'No data provided'}), 400
 
-    spot_id = data.get('spot_id')
-    user_id = data.get('user_id')
-    vehicle_number = data.get('vehicle_number')
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pending = False
 
-    if not all([spot_id, user_id, vehicle_number]):
-        return jsonify({'error': 'Missing required booking information'}), 400
+    def wake(self):
+        with self._lock:
+            self._pending = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='gate-events', daemon=True)
+                self._thread.start()
 
-    # Find the spot and user
-    spot = ParkingSpot.query.get(spot_id)
-    user = User.query.get(user_id) 
+    def _run(self):
+        with app.app_context():
+            backoff = 0
+            while True:
+                time.sleep(app.config['GATE_APPLY_LINGER_MS'] / 1000 + backoff)
+                with self._lock:
+                    if not self._pending:
+                        self._thread = None
+                        return
+                    self._pending = False
+                if self._drain()[1]:
+                    backoff = min(max(2 * backoff, 0.1), app.config['GATE_APPLY_MAX_BACKOFF_MS'] / 1000)
+                    with self._lock:
+                        self._pending = True # Retry the failed batch
+                else:
+                    backoff = 0
 
-    if not spot:
-        return jsonify({'error': 'Invalid parking spot ID'}), 404
-    if not user:
-        return jsonify({'error': 'Invalid user ID'}), 404
-        
-    if spot.is_occupied:
-        return jsonify({'error': 'This spot is already occupied. Please select another.'}), 409
+    def _drain(self):
+        """Applies pending events until none is left or a batch fails. Returns (applied, failed)."""
+        applied = 0
+        try:
+            while True:
+                count = apply_gate_events(app.config['GATE_APPLY_BATCH_SIZE'])
+                if count == 0:
+                    return applied, False
+                applied += count or 0
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Error applying gate events: {e}") # The batch stays pending
+            return applied, True
+        finally:
+            db.session.remove()
 
-    try:
-        # 1. Create the new booking
-        new_booking = Booking(
-            spot_id=spot.id,
-            customer_id=user.id,
-            vehicle_number=vehicle_number,
-            status='Active' 
-        )
-        
-        # 2. Create the corresponding billing record
-        new_billing = Billing(
-            status='Reserved',
-            final_cost=None,
-            billing_time=None
-        )
-        
-        # 3. Link them together
-        new_booking.billing = new_billing
-        
-        # 4. Mark the spot as occupied
-        spot.is_occupied = True
-        
-        # 5. Add to session (Flask-SQLAlchemy handles adding both new_booking and new_billing)
-        db.session.add(new_booking)
-        db.session.commit()
+    def run_pending(self):
+        """Applies pending events until none is left or a batch fails (in the calling thread). Returns the number applied."""
+        return self._drain()[0]
 
-        return jsonify({
-            'message': 'Booking successful!',
-            'booking_id': new_booking.id,
-            'billing_id': new_billing.id,
-            'status': new_billing.status
-        }), 201
 
-    except Exception as e:
-        db.session.rollback()
-        app.logger.error(f"Error booking spot: {e}")
-        return jsonify({'error': 'An internal server error occurred.'}), 500
+gate_event_applier = GateEventApplier()
+
+
+@app.cli.command('apply-gate-events')
+def apply_gate_events_command():
+    """Applies every pending gate event in the journal."""
+    db.create_all() # Creates the journal table on databases that predate it
+    print(f"Applied {gate_event_applier.run_pending()} gate events.")
 # -----------------------------------------
 
 
-# --- NEW API ROUTE FOR "MY BOOKING" PAGE ---
-@app.route('/api/my-bookings/<int:user_id>', methods=['GET'])
-def get_my_bookings(user_id):
-    """Fetches all bookings for a specific user."""
-    
-    # Check if user exists
-    user = User.query.get_or_404(user_id)
-    
+# --- ADMIN EXPORTS (ACCOUNTING) ---
+
+EXPORT_COLUMNS = (
+    'booking_id', 'customer_id', 'vehicle_number', 'booking_status', 'start_time', 'end_time',
+    'billing_id', 'billing_status', 'final_cost', 'billing_time',
+    'spot_id', 'spot_number', 'lot_id', 'lot_name', 'price_per_hour'
+)
+
+
+def export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+@app.route('/api/admin/export/bookings', methods=['GET'])
+def export_bookings():
+    """
+    Streams Booking joined with Billing, ParkingSpot and ParkingLot as CSV
+    or NDJSON, ordered by booking id. Archived bookings are included.
+
+    Rows are read through a streaming (server-side, where the driver has
+    one) cursor EXPORT_CHUNK_SIZE at a time and written out chunk by chunk,
+    so memory stays flat regardless of the export size. An error midway
+    aborts the response (no final chunk), so a truncated file is never
+    delivered as a complete one.
+
+    Query parameters (all optional):
+      format=csv|ndjson                 default csv
+      lot_ids=1,2                       only these lots
+      from=YYYY-MM-DD, to=YYYY-MM-DD    inclusive booking start date range (UTC)
+      status=Active|Completed           booking status
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({'error': "Invalid format. Use 'csv' or 'ndjson'."}), 400
     try:
-        # Query to get booking, spot, and lot information
-        bookings_query = db.session.query(
-            Booking, ParkingSpot, ParkingLot
-        ).join(
-            ParkingSpot, Booking.spot_id == ParkingSpot.id
-        ).join(
-            ParkingLot, ParkingSpot.lot_id == ParkingLot.id
-        ).filter(
-            Booking.customer_id == user.id
-        ).order_by(
-            Booking.start_time.desc() # Show newest first
-        ).all()
-        
-        results = []
-        for booking, spot, lot in bookings_query:
-            results.append({
-                'booking_id': booking.id,
-                'parking_location': f"Lot #{lot.id}: {lot.name}",
-                'vehicle_number': booking.vehicle_number,
-                'time_stamp': booking.start_time.isoformat(), # Show when it started
-                'status': booking.status # 'Active' or 'Completed'
-            })
-            
-        return jsonify(results), 200
-        
-    except Exception as e:
-        app.logger.error(f"Error fetching bookings for user {user_id}: {e}")
-        return jsonify({'error': 'An internal server error occurred.'}), 500
+        lot_ids = parse_lot_ids(request.args.get('lot_ids'))
+    except ValueError:
+        return jsonify({'error': 'lot_ids must be a comma-separated list of integers.'}), 400
+    try:
+        date_from = datetime.strptime(request.args['from'], '%Y-%m-%d') if request.args.get('from') else None
+        date_to = datetime.strptime(request.args['to'], '%Y-%m-%d') if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'error': 'from/to must be dates in YYYY-MM-DD format.'}), 400
+    status = request.args.get('status')
+    if status not in (None, 'Active', 'Completed'):
+        return jsonify({'error': "Invalid status. Use 'Active' or 'Completed'."}), 400
+
+    query = db.select(
+        Booking.id, Booking.customer_id, Booking.vehicle_number, Booking.status, Booking.start_time, Booking.end_time,
+        Billing.id, Billing.status, Billing.final_cost, Billing.billing_time,
+        ParkingSpot.id, ParkingSpot.spot_number, ParkingLot.id, ParkingLot.name, ParkingLot.price_per_hour
+    ).select_from(Booking).join(
+        ParkingSpot, ParkingSpot.id == Booking.spot_id
+    ).join(
+        ParkingLot, ParkingLot.id == ParkingSpot.lot_id
+    ).outerjoin(
+        Billing, Billing.booking_id == Booking.id
+    ).order_by(Booking.id)
+    if lot_ids is not None:
+        query = query.where(ParkingSpot.lot_id.in_(lot_ids))
+    if date_from:
+        query = query.where(Booking.start_time >= date_from)
+    if date_to:
+        query = query.where(Booking.start_time < date_to + timedelta(days=1))
+    if status:
+        query = query.where(Booking.status == status)
+
+    # Archived (compacted or deleted-lot) bookings, merged into the stream by booking id
+    archived_query = db.select(
+        ArchivedBooking.id, ArchivedBooking.customer_id, ArchivedBooking.vehicle_number, ArchivedBooking.status,
+        ArchivedBooking.start_time, ArchivedBooking.end_time,
+        ArchivedBilling.id, ArchivedBilling.status, ArchivedBilling.final_cost, ArchivedBilling.billing_time,
+        ArchivedBooking.spot_id, ArchivedBooking.spot_number, ArchivedBooking.lot_id,
+        db.func.coalesce(ParkingLot.name, ArchivedLot.name),
+        db.func.coalesce(ParkingLot.price_per_hour, ArchivedLot.price_per_hour)
+    ).select_from(ArchivedBooking).outerjoin(
+        ArchivedBilling, ArchivedBilling.booking_id == ArchivedBooking.id
+    ).outerjoin(
+        ParkingLot, ParkingLot.id == ArchivedBooking.lot_id
+    ).outerjoin(
+        ArchivedLot, ArchivedLot.id == ArchivedBooking.lot_id
+    ).order_by(ArchivedBooking.id)
+    if lot_ids is not None:
+        archived_query = archived_query.where(ArchivedBooking.lot_id.in_(lot_ids))
+    if date_from:
+        archived_query = archived_query.where(ArchivedBooking.start_time >= date_from)
+    if date_to:
+        archived_query = archived_query.where(ArchivedBooking.start_time < date_to + timedelta(days=1))
+    if status:
+        archived_query = archived_query.where(ArchivedBooking.status == status)
+
+    chunk_size = app.config['EXPORT_CHUNK_SIZE']
+
+    def merged_partitions():
+        """Yields lists of up to chunk_size rows from both queries, in booking id order."""
+        live_rows = db.session.execute(query.execution_options(yield_per=chunk_size))
+        archived_rows = db.session.execute(archived_query.execution_options(yield_per=chunk_size))
+        rows = []
+        for row in heapq.merge(live_rows, archived_rows, key=lambda row: row[0]):
+            rows.append(row)
+            if len(rows) == chunk_size:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+
+    def generate():
+        if export_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            yield buffer.getvalue() # Header goes out before the query runs
+        try:
+            for rows in merged_partitions():
+                if export_format == 'csv':
+                    buffer.seek(0)
+                    buffer.truncate()
+                    writer.writerows([export_value(value) for value in row] for row in rows)
+                    yield buffer.getvalue()
+                else:
+                    yield ''.join(
+                        json.dumps(dict(zip(EXPORT_COLUMNS, map(export_value, row)))) + '\n' for row in rows
+                    )
+        except Exception as e:
+            # Headers are already sent: re-raise so the server drops the connection
+            # without the final chunk, and the client sees a failed (not a short) download
+            app.logger.error(f"Error streaming bookings export: {e}")
+            raise
+
+    filename = f"bookings_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv' if export_format == 'csv' else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"', 'Cache-Control': 'no-store'}
+    )
 # -----------------------------------------
 
-# --- ADD THIS NEW API ROUTE FOR USER SUMMARY ---
-@app.route('/api/user-summary/<int:user_id>', methods=['GET'])
-def get_user_summary(user_id):
-    """Fetches all billing records for a specific user."""
-    
-    # Check if user exists
-    user = User.query.get_or_404(user_id)
-    
-    try:
-        # Query Billing and eagerly load related Booking data
-        billing_records = Billing.query.options(
-            joinedload(Billing.booking) # Efficiently load booking details
-        ).join(Booking).filter(
-            Booking.customer_id == user.id
-        ).order_by(
-            # --- MODIFIED SORT ORDER ---
-            desc(Booking.id) # Sort by Booking ID descending (most recent booking first)
-            # --- END MODIFICATION ---
-        ).all()
-        
-        results = []
-        for bill in billing_records:
-            results.append({
-                'billing_id': bill.id,
-                'booking_id': bill.booking_id,
-                'customer_id': bill.booking.customer_id, # Get customer_id via booking relationship
-                'final_cost': bill.final_cost,
-                'billing_time': bill.billing_time.isoformat() if bill.billing_time else None,
-                'start_time': bill.booking.start_time.isoformat() if bill.booking else None, # Include start time for duration calc
-                'status': bill.status 
-            })
-            
-        return jsonify(results), 200
-        
-    except Exception as e:
-        app.logger.error(f"Error fetching summary for user {user_id}: {e}")
-        return jsonify({'error': 'An internal server error occurred while fetching summary.'}), 500
-# ---------------------------------------------
 
-# --- NEW API ROUTE FOR "RELEASE SPOT" ---
-@app.route('/api/release-spot/<int:booking_id>', methods=['POST'])
-def release_spot(booking_id):
+
+# --- RE-BILLING (TARIFF DISPUTES) ---
+
+def load_tariffs(lot_ids=None):
+    """billing.Tariff of every lot (or only lot_ids), keyed by lot id, from one query."""
+    query = db.session.query(
+        ParkingLot.id, ParkingLot.price_per_hour, *TARIFF_COLUMNS
+    ).outerjoin(TariffPlan, TariffPlan.lot_id == ParkingLot.id)
+    if lot_ids is not None:
+        query = query.filter(ParkingLot.id.in_(lot_ids))
+    return {row[0]: make_tariff(row[1], TariffRow(*row[2:])) for row in query}
+
+
+def rebill_period(date_from, date_to, lot_ids=None):
     """
-    Handles releasing a spot.
-    Calculates the final bill and updates booking, billing, and spot status.
+    Re-prices every Completed bill, live and archived, billed between
+    date_from and date_to (inclusive) under the lots' current tariffs.
+
+    Bills are read REBILL_CHUNK_SIZE at a time by keyset on (billing_time,
+    id), priced together with billing.bill_many (the same arithmetic as
+    release_spot) and only changed costs are written back, one transaction
+    per chunk. The revenue rollup is then rebuilt for the period. Bills of
+    deleted lots have no tariff and are skipped.
     """
-    
-    booking = Booking.query.get_or_404(booking_id)
-    
-    if booking.status != 'Active':
-        return jsonify({'error': 'This booking is already completed.'}), 400
-        
+    tariffs = load_tariffs(lot_ids)
+    utc_offset = app.config['TARIFF_UTC_OFFSET_MINUTES']
+    chunk_size = app.config['REBILL_CHUNK_SIZE']
+    since = datetime.combine(date_from, datetime.min.time())
+    until = datetime.combine(date_to + timedelta(days=1), datetime.min.time())
+    stats = {'bills': 0, 'changed': 0, 'skipped': 0, 'revenue_before': 0.0, 'revenue_after': 0.0}
+    customers = set()
+
+    def rebill(bill_model, query):
+        last = None
+        while True:
+            page = query
+            if last is not None:
+                page = page.where(db.tuple_(bill_model.billing_time, bill_model.id) > last)
+            rows = db.session.execute(page.order_by(bill_model.billing_time, bill_model.id).limit(chunk_size)).all()
+            if not rows:
+                return
+            last = (rows[-1].billing_time, rows[-1].id)
+            priced = bill_many(((row.start_time, row.end_time, row.lot_id) for row in rows), tariffs, utc_offset)
+            updates = []
+            for row, result in zip(rows, priced):
+                if result is None:
+                    stats['skipped'] += 1
+                    continue
+                final_cost = result[1]
+                stats['bills'] += 1
+                stats['revenue_before'] += row.final_cost or 0
+                stats['revenue_after'] += final_cost
+                if final_cost != row.final_cost:
+                    updates.append({'id': row.id, 'final_cost': final_cost})
+                    customers.add(row.customer_id)
+            if updates:
+                db.session.execute(db.update(bill_model), updates) # Bulk UPDATE by primary key
+                stats['changed'] += len(updates)
+            db.session.commit()
+
+    live = db.select(
+        Billing.id, Billing.billing_time, Billing.final_cost,
+        Booking.start_time, Booking.end_time, Booking.customer_id, ParkingSpot.lot_id
+    ).join(
+        Booking, Billing.booking_id == Booking.id
+    ).join(
+        ParkingSpot, Booking.spot_id == ParkingSpot.id
+    ).where(
+        Billing.status == 'Completed', Billing.billing_time >= since, Billing.billing_time < until,
+        Booking.end_time.isnot(None)
+    )
+    archived = db.select(
+        ArchivedBilling.id, ArchivedBilling.billing_time, ArchivedBilling.final_cost,
+        ArchivedBooking.start_time, ArchivedBooking.end_time, ArchivedBooking.customer_id, ArchivedBooking.lot_id
+    ).join(
+        ArchivedBooking, ArchivedBilling.booking_id == ArchivedBooking.id
+    ).where(
+        ArchivedBilling.status == 'Completed', ArchivedBilling.billing_time >= since, ArchivedBilling.billing_time < until,
+        ArchivedBooking.end_time.isnot(None)
+    )
+    if lot_ids is not None:
+        live = live.where(ParkingSpot.lot_id.in_(lot_ids))
+        archived = archived.where(ArchivedBooking.lot_id.in_(lot_ids))
+    rebill(Billing, live)
+    rebill(ArchivedBilling, archived)
+
+    if stats['changed']:
+        rebuild_revenue_rollup(date_from, date_to)
+        change_versions.bump('revenue', *{('user', customer_id) for customer_id in customers})
+    stats['revenue_before'] = round(stats['revenue_before'], 2)
+    stats['revenue_after'] = round(stats['revenue_after'], 2)
+    return stats
+
+
+@app.route('/api/admin/rebill', methods=['POST'])
+def rebill_bills():
+    """
+    Re-prices the bills of a period under the current tariffs.
+
+    Body: {"from": "YYYY-MM-DD", "to": "YYYY-MM-DD", "lot_ids": [1, 2]}
+    (lot_ids optional). Returns the number of bills priced and changed
+    and the period's revenue before and after. For very long periods
+    prefer `flask rebill`, which does the same without an HTTP timeout.
+    """
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
     try:
-        # Get related objects
-        billing = booking.billing
-        spot = booking.spot
-        lot = spot.lot
-        
-        # Calculate cost
-        end_time = datetime.utcnow()
-        duration = end_time - booking.start_time
-        
-        # Bill for at least one hour
-        duration_hours = math.ceil(duration.total_seconds() / 3600) 
-        if duration_hours < 1:
-            duration_hours = 1
-            
-        final_cost = duration_hours * lot.price_per_hour
-        
-        # Update database records
-        booking.end_time = end_time
-        booking.status = 'Completed'
-        
-        billing.final_cost = final_cost
-        billing.billing_time = end_time
-        billing.status = 'Completed'
-        
-        spot.is_occupied = False
-        
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Spot released successfully! Bill generated.',
-            'booking_id': booking.id,
-            'status': booking.status,
-            'final_cost': final_cost,
-            'duration_hours': duration_hours
-        }), 200
+        date_from = datetime.strptime(data['from'], '%Y-%m-%d').date()
+        date_to = datetime.strptime(data['to'], '%Y-%m-%d').date()
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'from and to must be dates in YYYY-MM-DD format.'}), 400
+    if date_to < date_from:
+        return jsonify({'error': 'to must not be before from.'}), 400
+    lot_ids = data.get('lot_ids')
+    if lot_ids is not None:
+        try:
+            lot_ids = [int(lot_id) for lot_id in lot_ids]
+        except (TypeError, ValueError):
+            return jsonify({'error': 'lot_ids must be a list of integers.'}), 400
 
+    started = time.perf_counter()
+    try:
+        stats = rebill_period(date_from, date_to, lot_ids)
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f"Error releasing spot {booking_id}: {e}")
-        return jsonify({'error': 'An internal server error occurred.'}), 500
+        app.logger.error(f"Error re-billing {date_from} to {date_to}: {e}")
+        return jsonify({'error': 'An internal server error occurred while re-billing.'}), 500
+    stats['seconds'] = round(time.perf_counter() - started, 3)
+    return jsonify(stats), 200
+
+
+@app.cli.command('rebill')
+@click.option('--from', 'date_from', required=True, type=click.DateTime(['%Y-%m-%d']))
+@click.option('--to', 'date_to', required=True, type=click.DateTime(['%Y-%m-%d']))
+@click.option('--lot-ids', default=None, help='Comma-separated lot ids (default: all lots).')
+def rebill_command(date_from, date_to, lot_ids):
+    """Re-prices the bills of a period under the current tariffs."""
+    started = time.perf_counter()
+    stats = rebill_period(date_from.date(), date_to.date(), parse_lot_ids(lot_ids))
+    print(f"Re-billed {stats['bills']} bills ({stats['changed']} changed, {stats['skipped']} skipped) "
+          f"in {time.perf_counter() - started:.1f}s; revenue {stats['revenue_before']} -> {stats['revenue_after']}.")
 # -----------------------------------------
 
 
-@app.route('/api/lots', methods=['GET'])
-def get_all_lots():
-    """Fetches all parking lots and returns them for dashboard rendering."""
-    lots = ParkingLot.query.all()
-    lots_data = [lot.to_dict() for lot in lots]
-    return jsonify(lots_data)
+# --- OCCUPANCY ANALYTICS (see occupancy.py) ---
+# Hours that have passed are swept from the booking intervals once and
+# stored in lot_occupancy_hourly; a report over closed months only reads
+# those buckets, and sweeps just the current hour from the bookings.
 
+def current_hour():
+    return int(epoch_seconds(datetime.utcnow()) // SECONDS_PER_HOUR)
 
-@app.route('/api/lots', methods=['POST'])
-def add_new_lot():
-    """Handles submission of the 'Add Parking Lot' form and initializes spots."""
-    data = request.get_json()
 
-    required_fields = ['name', 'address', 'pincode', 'price', 'maxSpots']
-    if not data or not all(key in data for key in required_fields):
-        return jsonify({'message': 'Missing data fields'}), 400
-    
-    try:
-        new_lot = ParkingLot(
-            name=data['name'],
-            address=data['address'],
-            pincode=data['pincode'],
-            price_per_hour=float(data['price']),
-            max_spots=int(data['maxSpots'])
+def hour_start(hour):
+    return EPOCH + timedelta(hours=hour)
+
+
+def booking_intervals(since, until, lot_ids=None):
+    """
+    Yields (lot_id, start, end) in epoch seconds for the live and archived
+    stays overlapping [since, until) (since=None: from the first one),
+    sorted by start; end is None while a stay is ongoing.
+    """
+    live = db.select(
+        ParkingSpot.lot_id, Booking.start_time, Booking.end_time
+    ).join(
+        ParkingSpot, Booking.spot_id == ParkingSpot.id
+    ).where(
+        Booking.start_time < until
+    ).order_by(Booking.start_time)
+    archived = db.select(
+        ArchivedBooking.lot_id, ArchivedBooking.start_time, ArchivedBooking.end_time
+    ).where(
+        ArchivedBooking.start_time < until
+    ).order_by(ArchivedBooking.start_time)
+    if since is not None:
+        # Found through the end_time indexes, whatever the lots; they are filtered below
+        live = live.where(db.or_(Booking.end_time > since, Booking.end_time.is_(None)))
+        archived = archived.where(ArchivedBooking.end_time > since)
+    elif lot_ids is not None:
+        live = live.where(ParkingSpot.lot_id.in_(lot_ids))
+        archived = archived.where(ArchivedBooking.lot_id.in_(lot_ids))
+    wanted = None if lot_ids is None else set(lot_ids)
+    streams = [db.session.execute(query.execution_options(yield_per=5000)) for query in (live, archived)]
+    for lot_id, start_time, end_time in heapq.merge(*streams, key=lambda row: row[1]):
+        if wanted is None or lot_id in wanted:
+            yield lot_id, epoch_seconds(start_time), epoch_seconds(end_time) if end_time is not None else None
+
+
+def extend_occupancy_buckets(lot_ids=None):
+    """
+    Stores the buckets of every hour that has passed, from each lot's
+    watermark up to the current hour, for the given lots (default: all).
+    Lots sharing a watermark are swept together, one transaction each.
+    Returns the number of buckets written.
+    """
+    until = current_hour()
+    lots_query = db.session.query(ParkingLot.id).filter(ParkingLot.id.notin_(lots_being_deleted()))
+    if lot_ids is not None:
+        lots_query = lots_query.filter(ParkingLot.id.in_(lot_ids))
+    watermarks = dict(db.session.query(LotOccupancyWatermark.lot_id, LotOccupancyWatermark.computed_until))
+    pending = {} # computed_until (None: nothing stored yet) -> lot ids
+    for (lot_id,) in lots_query:
+        computed_until = watermarks.get(lot_id)
+        if computed_until is None or computed_until < until:
+            pending.setdefault(computed_until, []).append(lot_id)
+
+    written = 0
+    for computed_until, group in pending.items():
+        since = None if computed_until is None else computed_until * SECONDS_PER_HOUR
+        buckets = sweep(
+            booking_intervals(None if since is None else hour_start(computed_until), hour_start(until), group),
+            since, until * SECONDS_PER_HOUR
         )
-        db.session.add(new_lot)
-        db.session.commit() # Commit here to get new_lot.id
+        rows = [
+            {'lot_id': lot_id, 'hour': hour, 'occupied_seconds': seconds, 'peak': peak}
+            for lot_id in group for hour, (seconds, peak) in buckets.get(lot_id, {}).items()
+        ]
+        try:
+            # Conditional on the watermark read above: a concurrent extension or
+            # invalidation of these lots makes this one back off
+            if computed_until is None:
+                db.session.execute(LotOccupancyWatermark.__table__.insert(),
+                                   [{'lot_id': lot_id, 'computed_until': until} for lot_id in group])
+            elif LotOccupancyWatermark.query.filter(
+                LotOccupancyWatermark.lot_id.in_(group),
+                LotOccupancyWatermark.computed_until == computed_until
+            ).update({'computed_until': until}, synchronize_session=False) != len(group):
+                db.session.rollback()
+                continue
+            if rows:
+                db.session.execute(LotOccupancyHourly.__table__.insert(), rows)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            continue
+        written += len(rows)
+    return written
 
-        # Initialize ParkingSpot records
-        max_spots = int(data['maxSpots'])
-        for i in range(1, max_spots + 1):
-            spot = ParkingSpot(lot_id=new_lot.id, spot_number=str(i), is_occupied=False)
-            db.session.add(spot)
-        
-        db.session.commit() # Commit all the new spots
-        
-        return jsonify(new_lot.to_dict()), 201 
 
-    except Exception as e:
-        db.session.rollback()
-        app.logger.error(f"Error adding lot: {e}")
-        return jsonify({'message': f'Database error occurred: {e}'}), 500
+def invalidate_occupancy(lot_id, since=None):
+    """
+    Drops a lot's stored buckets from `since` on (all of them if None) after
+    bookings before now were removed or changed; they are recomputed on the
+    next report. Runs in the caller's transaction.
+    """
+    if since is None:
+        LotOccupancyHourly.query.filter_by(lot_id=lot_id).delete(synchronize_session=False)
+        LotOccupancyWatermark.query.filter_by(lot_id=lot_id).delete(synchronize_session=False)
+        return
+    hour = int(epoch_seconds(since) // SECONDS_PER_HOUR)
+    LotOccupancyHourly.query.filter(
+        LotOccupancyHourly.lot_id == lot_id, LotOccupancyHourly.hour >= hour
+    ).delete(synchronize_session=False)
+    LotOccupancyWatermark.query.filter(
+        LotOccupancyWatermark.lot_id == lot_id, LotOccupancyWatermark.computed_until > hour
+    ).update({'computed_until': hour}, synchronize_session=False)
 
 
-@app.route('/api/lots/<int:lot_id>', methods=['PUT'])
-def update_lot(lot_id):
-    """Handles submission of the 'Edit Parking Lot' form."""
-    lot = ParkingLot.query.get_or_404(lot_id)
-    data = request.get_json()
+@app.route('/api/analytics/occupancy', methods=['GET'])
+def get_occupancy_analytics():
+    """
+    Occupancy per lot over a range of (UTC) days: average and peak number
+    of occupied spots, and a utilization heatmap by weekday (Monday first)
+    and hour of day, each cell the average share of the lot's spots occupied.
 
+    Query parameters (all optional):
+      from=YYYY-MM-DD, to=YYYY-MM-DD   inclusive; default the last OCCUPANCY_DEFAULT_DAYS days
+      lot_ids=1,2,3                    restrict to these lots
+      granularity=hour|day             also return the occupancy time series
+    The range ends now at the latest. Utilization and the heatmap are None
+    for a lot without spots.
+    """
+    today = datetime.utcnow().date()
     try:
-        # Update fields
-        lot.name = data.get('name', lot.name)
-        lot.address = data.get('address', lot.address)
-        lot.pincode = data.get('pincode', lot.pincode)
-        lot.price_per_hour = float(data.get('price', lot.price_per_hour))
-        
-        if int(data.get('maxSpots', lot.max_spots)) != lot.max_spots:
-             return jsonify({'message': 'Cannot change max spots after creation in this simplified API.'}), 400
+        date_to = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else today
+        date_from = (datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from')
+                     else date_to - timedelta(days=app.config['OCCUPANCY_DEFAULT_DAYS'] - 1))
+    except ValueError:
+        return jsonify({'error': 'from/to must be dates in YYYY-MM-DD format.'}), 400
+    if date_to < date_from:
+        return jsonify({'error': 'to must not be before from.'}), 400
+    granularity = request.args.get('granularity')
+    if granularity not in (None, 'hour', 'day'):
+        return jsonify({'error': "Invalid granularity. Use 'hour' or 'day'."}), 400
+    try:
+        lot_ids = parse_lot_ids(request.args.get('lot_ids'))
+    except ValueError:
+        return jsonify({'error': 'lot_ids must be a comma-separated list of integers.'}), 400
+
+    try:
+        extend_occupancy_buckets(lot_ids) # Catch up on the hours that passed since the last report
+
+        lots_query = db.session.query(ParkingLot.id, ParkingLot.name, ParkingLot.max_spots).filter(
+            ParkingLot.id.notin_(lots_being_deleted()))
+        if lot_ids is not None:
+            lots_query = lots_query.filter(ParkingLot.id.in_(lot_ids))
+        lots = lots_query.order_by(ParkingLot.id).all()
+        ids = [lot.id for lot in lots]
+
+        first_hour = int(epoch_seconds(datetime.combine(date_from, datetime.min.time())) // SECONDS_PER_HOUR)
+        range_end = min(epoch_seconds(datetime.combine(date_to + timedelta(days=1), datetime.min.time())),
+                        epoch_seconds(datetime.utcnow()))
+        end_hour = math.ceil(range_end / SECONDS_PER_HOUR) # Exclusive; the last hour may be partial
+
+        # Seconds of each (weekday, hour of day) cell, and of each period, inside the range
+        covered = [0.0] * (7 * 24)
+        period_seconds = {}
+        for hour in range(first_hour, end_hour):
+            seconds = min(SECONDS_PER_HOUR, range_end - hour * SECONDS_PER_HOUR)
+            covered[weekday(hour) * 24 + hour % 24] += seconds
+            if granularity is not None:
+                period = hour if granularity == 'hour' else hour // 24
+                period_seconds[period] = period_seconds.get(period, 0) + seconds
+
+        stats = {lot_id: {'cells': [0.0] * (7 * 24), 'total': 0.0, 'peak': 0, 'peak_hour': None, 'series': {}}
+                 for lot_id in ids}
+
+        def add_peak(lot_stats, hour, peak):
+            if peak > lot_stats['peak'] or (peak and peak == lot_stats['peak'] and hour < lot_stats['peak_hour']):
+                lot_stats['peak'], lot_stats['peak_hour'] = peak, hour
+
+        def add_period(lot_stats, period, seconds, peak):
+            totals = lot_stats['series'].setdefault(period, [0.0, 0])
+            totals[0] += seconds
+            totals[1] = max(totals[1], peak)
+
+        # Stored hours (everything before each lot's watermark), aggregated by the database
+        if ids and end_hour > first_hour:
+            bucket_hour = LotOccupancyHourly.hour
+            stored = (LotOccupancyHourly.lot_id.in_(ids), bucket_hour >= first_hour, bucket_hour < end_hour)
+            cell = (bucket_hour + 72) % 168 # weekday(hour) * 24 + hour % 24: the epoch began on a Thursday
+            for lot_id, cell_index, seconds in db.session.query(
+                LotOccupancyHourly.lot_id, cell, db.func.sum(LotOccupancyHourly.occupied_seconds)
+            ).filter(*stored).group_by(LotOccupancyHourly.lot_id, cell):
+                stats[lot_id]['cells'][cell_index] += seconds
+                stats[lot_id]['total'] += seconds
+
+            peaks = db.session.query(
+                LotOccupancyHourly.lot_id.label('lot_id'), db.func.max(LotOccupancyHourly.peak).label('peak')
+            ).filter(*stored).group_by(LotOccupancyHourly.lot_id).subquery()
+            for lot_id, peak, peak_hour in db.session.query(
+                LotOccupancyHourly.lot_id, peaks.c.peak, db.func.min(bucket_hour) # First hour at the peak
+            ).join(
+                peaks, db.and_(LotOccupancyHourly.lot_id == peaks.c.lot_id, LotOccupancyHourly.peak == peaks.c.peak)
+            ).filter(*stored).group_by(LotOccupancyHourly.lot_id, peaks.c.peak):
+                add_peak(stats[lot_id], peak_hour, peak)
+
+            if granularity is not None:
+                period = bucket_hour if granularity == 'hour' else bucket_hour // 24
+                for lot_id, period_index, seconds, peak in db.session.query(
+                    LotOccupancyHourly.lot_id, period,
+                    db.func.sum(LotOccupancyHourly.occupied_seconds), db.func.max(LotOccupancyHourly.peak)
+                ).filter(*stored).group_by(LotOccupancyHourly.lot_id, period):
+                    add_period(stats[lot_id], period_index, seconds, peak)
+
+        # Hours after the watermark (the current one) are swept from the bookings
+        watermarks = dict(db.session.query(LotOccupancyWatermark.lot_id, LotOccupancyWatermark.computed_until).filter(
+            LotOccupancyWatermark.lot_id.in_(ids)))
+        live_from = max(first_hour, min((watermarks.get(lot_id, first_hour) for lot_id in ids), default=end_hour))
+        if live_from < end_hour:
+            live = sweep(booking_intervals(hour_start(live_from), EPOCH + timedelta(seconds=range_end), ids),
+                         live_from * SECONDS_PER_HOUR, range_end)
+            for lot_id, buckets in live.items():
+                stored_until = watermarks.get(lot_id, first_hour)
+                lot_stats = stats[lot_id]
+                for hour, (seconds, peak) in buckets.items():
+                    if hour < stored_until:
+                        continue
+                    lot_stats['cells'][weekday(hour) * 24 + hour % 24] += seconds
+                    lot_stats['total'] += seconds
+                    add_peak(lot_stats, hour, peak)
+                    if granularity is not None:
+                        add_period(lot_stats, hour if granularity == 'hour' else hour // 24, seconds, peak)
+
+        range_seconds = sum(covered)
+        results = []
+        for lot in lots:
+            lot_stats = stats[lot.id]
+            average = lot_stats['total'] / range_seconds if range_seconds else 0
+            result = {
+                'lot_id': lot.id,
+                'lot_name': lot.name,
+                'max_spots': lot.max_spots,
+                'average_occupied': round(average, 2),
+                'utilization': round(average / lot.max_spots, 4) if lot.max_spots else None,
+                'peak_occupied': lot_stats['peak'],
+                'peak_at': hour_start(lot_stats['peak_hour']) if lot_stats['peak_hour'] is not None else None,
+                'heatmap': [
+                    [round(lot_stats['cells'][day * 24 + hour] / covered[day * 24 + hour] / lot.max_spots, 4)
+                     if covered[day * 24 + hour] else None for hour in range(24)]
+                    for day in range(7)
+                ] if lot.max_spots else None
+            }
+            if granularity is not None:
+                result['series'] = [
+                    {
+                        'period': hour_start(period) if granularity == 'hour' else hour_start(period * 24).date(),
+                        'average_occupied': round(lot_stats['series'].get(period, (0.0, 0))[0] / seconds, 2),
+                        'peak_occupied': lot_stats['series'].get(period, (0.0, 0))[1]
+                    }
+                    for period, seconds in sorted(period_seconds.items())
+                ]
+            results.append(result)
+        return jsonify(results), 200
 
-        db.session.commit()
-        return jsonify(lot.to_dict()), 200
-    
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f"Error updating lot {lot_id}: {e}")
-        return jsonify({'message': f'Database error: {e}'}), 500
+        app.logger.error(f"Error computing occupancy analytics: {e}")
+        return jsonify({'error': 'An internal server error occurred while computing occupancy.'}), 500
 
 
-@app.route('/api/lots/<int:lot_id>', methods=['DELETE'])
-def delete_lot(lot_id):
-    """Deletes a parking lot and all associated spots/bookings (due to cascading)."""
-    lot = ParkingLot.query.get_or_404(lot_id)
-    
+@app.cli.command('build-occupancy-buckets')
+def build_occupancy_buckets_command():
+    """Stores the occupancy buckets of every hour that has passed (otherwise done by the first report)."""
+    db.create_all() # Creates the bucket tables on databases that predate them
+    started = time.perf_counter()
+    written = extend_occupancy_buckets()
+    print(f"Stored {written} hourly occupancy buckets in {time.perf_counter() - started:.1f}s.")
+# -----------------------------------------
+
+
+class SchemaUpgradeError(Exception):
+    """An index the app relies on could not be created; the app must not start without it."""
+
+
+def duplicate_active_spots():
+    """Ids of the spots with more than one Active booking (possible before uq_booking_active_spot)."""
+    return [spot_id for (spot_id,) in db.session.query(Booking.spot_id).filter(
+        Booking.status == 'Active'
+    ).group_by(Booking.spot_id).having(db.func.count(Booking.id) > 1).order_by(Booking.spot_id)]
+
+
+def apply_schema_upgrades():
+    """
+    Creates indexes declared on the models that are missing from an existing
+    database (db.create_all() only creates missing tables, not indexes).
+
+    Raises SchemaUpgradeError if one cannot be created, e.g. when older
+    data has two Active bookings on a spot: those spots are listed so the
+    extra bookings can be released before upgrading again.
+    """
+    if not db.inspect(db.engine).has_index('booking', 'uq_booking_active_spot'):
+        spots = duplicate_active_spots()
+        if spots:
+            raise SchemaUpgradeError(
+                f"Cannot create uq_booking_active_spot: spots with more than one Active booking: {spots}. "
+                f"Release the extra bookings, then run `flask upgrade-schema` again.")
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=db.engine, checkfirst=True)
+            except Exception as e:
+                raise SchemaUpgradeError(f"Could not create index {index.name}: {e}") from e
+    with db.engine.begin() as connection:
+        create_lot_search_index(connection)
+
+
+@app.cli.command('upgrade-schema')
+def upgrade_schema_command():
+    """Creates missing tables and indexes in an existing database."""
+    db.create_all()
     try:
-        db.session.delete(lot)
-        db.session.commit()
-        return jsonify({'message': f'Lot {lot_id} deleted successfully'}), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        app.logger.error(f"Error deleting lot {lot_id}: {e}")
-        return jsonify({'message': f'Database error: {e}'}), 500
-        
+        apply_schema_upgrades()
+    except SchemaUpgradeError as e:
+        raise click.ClickException(str(e)) # Exit status 1
+    print("Schema is up to date.")
+
+
 # --- INITIAL SETUP ---
+def initialize_database():
+    """Creates/upgrades the schema and resumes background work. Call once at startup, in an app context."""
+    db.create_all()
+    apply_schema_upgrades()
+    if LotRevenueDaily.query.first() is None:
+        rebuild_revenue_rollup() # Backfill a freshly created rollup table
+    if lot_deletion_worker.requeue_interrupted():
+        lot_deletion_worker.wake() # Finish deletions cut short by the last shutdown
+    if GateEvent.query.filter(GateEvent.status == 'pending').first() is not None:
+        gate_event_applier.wake() # Events journaled before the last shutdown
+
+
+# Development server. In production run `python server.py` instead.
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        initialize_database()
     app.run(debug=True, port=5000)
 
 
@@ -0,0 +1,116 @@
+"""
+Occupancy sweep.
+
+Turns booking intervals into hourly occupancy buckets with a sweep line.
+Intervals arrive sorted by start time; each lot keeps a heap of the end
+times of its ongoing stays, so the number of occupied spots only changes
+at a start or at an end, and between two changes it is accounted in bulk.
+Every UTC hour with any occupancy gets a bucket [occupied_seconds, peak]:
+  occupied_seconds  spot-seconds occupied during the hour (the integral
+                    of the occupied count), so / 3600 is the average
+                    number of occupied spots;
+  peak              the highest number of spots occupied at once.
+Stays are half-open [start, end): a stay ending when another starts does
+not count twice. Ongoing stays (no end yet) last until the sweep's end.
+
+Cost is O(n log k) for n intervals with at most k concurrent stays per
+lot, plus one step per occupied hour; memory is the heaps and the output.
+
+Times are seconds since the epoch (1970-01-01 00:00 UTC) and hours are
+hours since the epoch: hour // 24 is the day number, hour % 24 the hour
+of day, and weekday(hour) the day of the week.
+
+No Flask or database imports: main.py reads intervals and stores buckets.
+"""
+import heapq
+from datetime import datetime
+
+SECONDS_PER_HOUR = 3600
+EPOCH = datetime(1970, 1, 1)
+NEVER = float('inf') # End of an ongoing stay
+
+
+def epoch_seconds(value):
+    """Seconds since the epoch of a naive UTC datetime."""
+    return (value - EPOCH).total_seconds()
+
+
+def weekday(hour):
+    """Day of the week of an hour number, Monday = 0 (day 0 was a Thursday)."""
+    return (hour // 24 + 3) % 7
+
+
+class LotSweep:
+    """Sweep state of one lot: ongoing stays, and occupancy accounted up to `time`."""
+
+    __slots__ = ('ends', 'count', 'time', 'buckets')
+
+    def __init__(self, time):
+        self.ends = [] # Heap of end times of ongoing stays
+        self.count = 0
+        self.time = time
+        self.buckets = {} # hour -> [occupied_seconds, peak]
+
+    def advance(self, until):
+        """Accounts `count` occupied spots from `time` up to `until`, hour by hour."""
+        time, count, buckets = self.time, self.count, self.buckets
+        if count:
+            while time < until:
+                hour = int(time // SECONDS_PER_HOUR)
+                boundary = min((hour + 1) * SECONDS_PER_HOUR, until)
+                bucket = buckets.get(hour)
+                if bucket is None:
+                    buckets[hour] = [count * (boundary - time), count]
+                else:
+                    bucket[0] += count * (boundary - time)
+                    if count > bucket[1]:
+                        bucket[1] = count
+                time = boundary
+        if until > self.time:
+            self.time = until
+
+    def end_stays(self, until):
+        """Ends every ongoing stay that ends at or before `until`, in end order."""
+        ends = self.ends
+        while ends and ends[0] <= until:
+            self.advance(heapq.heappop(ends))
+            self.count -= 1
+
+    def start_stay(self, start, end):
+        self.end_stays(start)
+        self.advance(start)
+        self.count += 1
+        heapq.heappush(self.ends, end)
+        hour = int(start // SECONDS_PER_HOUR) # The count peaks at the start, even for an instant
+        bucket = self.buckets.get(hour)
+        if bucket is None:
+            self.buckets[hour] = [0.0, self.count]
+        elif self.count > bucket[1]:
+            bucket[1] = self.count
+
+
+def sweep(intervals, since, until):
+    """
+    Hourly occupancy over [since, until) (since=None: from the first start).
+
+    `intervals` yields (lot_id, start, end) in seconds, sorted by start, with
+    end None for ongoing stays; intervals starting before `since` are taken
+    as ongoing at `since`. Returns {lot_id: {hour: [occupied_seconds, peak]}}
+    (hours without occupancy are left out).
+    """
+    lots = {}
+    for lot_id, start, end in intervals:
+        if end is None:
+            end = NEVER
+        if since is not None and start < since:
+            start = since
+        if end <= start or start >= until:
+            continue
+        lot = lots.get(lot_id)
+        if lot is None:
+            lot = lots[lot_id] = LotSweep(start)
+        lot.start_stay(start, end)
+    for lot in lots.values():
+        lot.end_stays(until)
+        lot.advance(until)
+    return {lot_id: lot.buckets for lot_id, lot in lots.items()}
@@ -0,0 +1,90 @@
+"""
+Reservation schedules.
+
+A SpotSchedule holds the reservation windows of one spot as half-open
+intervals [start, end). Windows of a spot never overlap, so sorted by
+start they are sorted by end too, and two parallel sorted lists answer
+"does [a, b) overlap any window?" with one binary search: the first
+window ending after a is the only candidate, and it overlaps if it
+starts before b. Checks are O(log m) for m windows on the spot; adding
+or removing a window is a binary search plus a list insert/delete.
+
+free_spots() filters a lot's spots down to those free for [a, b), at
+O(log m) per spot instead of a scan over every reservation of the lot.
+
+Times are anything ordered (main.py uses naive UTC datetimes).
+
+No Flask or database imports: main.py loads reservations and keeps one
+schedule per spot in its ReservationIndex.
+"""
+from bisect import bisect_left, bisect_right
+
+
+class SpotSchedule:
+    """Non-overlapping reservation windows of one spot, sorted by start."""
+
+    __slots__ = ('starts', 'ends', 'keys', 'start_of')
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.keys = []
+        self.start_of = {} # key -> start, to find a window again in O(log m)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def first_overlap(self, start, end):
+        """Position of the window overlapping [start, end), or None."""
+        position = bisect_right(self.ends, start) # First window ending after start
+        if position < len(self.starts) and self.starts[position] < end:
+            return position
+        return None
+
+    def overlaps(self, start, end, ignore=None):
+        """True if a window other than the one with key `ignore` overlaps [start, end)."""
+        position = self.first_overlap(start, end)
+        if position is None:
+            return False
+        if self.keys[position] != ignore:
+            return True
+        # Windows are disjoint, so at most the next one can overlap as well
+        position += 1
+        return position < len(self.starts) and self.starts[position] < end
+
+    def add(self, key, start, end):
+        """Adds the window [start, end). Returns False (and adds nothing) if it overlaps one."""
+        if not start < end or key in self.start_of or self.first_overlap(start, end) is not None:
+            return False
+        position = bisect_left(self.starts, start)
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self.keys.insert(position, key)
+        self.start_of[key] = start
+        return True
+
+    def remove(self, key):
+        """Removes the window with this key, if present."""
+        start = self.start_of.pop(key, None)
+        if start is None:
+            return
+        position = bisect_left(self.starts, start)
+        del self.starts[position], self.ends[position], self.keys[position]
+
+    def prune(self, before):
+        """Drops the windows that end at or before `before`."""
+        count = bisect_right(self.ends, before)
+        if count:
+            for key in self.keys[:count]:
+                del self.start_of[key]
+            del self.starts[:count], self.ends[:count], self.keys[:count]
+
+
+def free_spots(schedules, spot_ids, start, end):
+    """The spot ids, in order, whose schedule (in `schedules`, by spot id) leaves [start, end) free."""
+    free = []
+    for spot_id in spot_ids:
+        schedule = schedules.get(spot_id)
+        if schedule is None or schedule.first_overlap(start, end) is None:
+            free.append(spot_id)
+    return free
@@ -0,0 +1,76 @@
+"""
+JSON encoding for API responses.
+
+dumps() writes what Flask's default provider writes for jsonify: sorted
+keys, compact separators, non-ASCII escaped as \\uXXXX. It uses orjson
+when it is installed (several times faster on the large list responses)
+and the standard json module otherwise; both give the same bytes, except
+that floats outside [1e-4, 1e16) may be spelled differently (1e-05 vs
+0.00001, the same number) and NaN/Infinity become null; prices, costs and
+revenue totals never hit either case. Anything orjson cannot encode
+(integers beyond 64 bits, non-string dict keys, ...) falls back to json.
+
+datetime, date and time values are written as ISO 8601, the format every
+endpoint already used, so handlers can hand over row values as they come
+from the database instead of calling isoformat() on each of them.
+
+No database imports: main.py installs it with `app.json = JSONProvider(app)`.
+"""
+import json
+import re
+from datetime import date, datetime, time
+
+from flask.json.provider import DefaultJSONProvider, _default as flask_default
+
+try:
+    import orjson
+except ImportError: # Optional: the json module gives the same output, more slowly
+    orjson = None
+
+NON_ASCII = re.compile('[^\x00-\x7e]') # json's ensure_ascii also escapes DEL (0x7f)
+
+
+def iso_default(value):
+    """Encoder fallback: ISO 8601 for dates and times, Flask's conversions for the rest."""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return flask_default(value)
+
+
+def escape_character(match):
+    """\\uXXXX escape of one character, as json.dumps(ensure_ascii=True) writes it."""
+    code = ord(match.group())
+    if code < 0x10000:
+        return f'\\u{code:04x}'
+    code -= 0x10000 # Outside the BMP: a UTF-16 surrogate pair
+    return f'\\u{0xd800 | (code >> 10):04x}\\u{0xdc00 | (code & 0x3ff):04x}'
+
+
+def dumps_stdlib(obj):
+    return json.dumps(obj, default=iso_default, ensure_ascii=True, sort_keys=True,
+                      separators=(',', ':')).encode()
+
+
+def dumps(obj):
+    """Compact, key-sorted, ASCII-only JSON bytes for obj."""
+    if orjson is None:
+        return dumps_stdlib(obj)
+    try:
+        data = orjson.dumps(obj, default=iso_default, option=orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATACLASS)
+    except TypeError: # orjson.JSONEncodeError
+        return dumps_stdlib(obj)
+    if data.isascii():
+        return data
+    return NON_ASCII.sub(escape_character, data.decode()).encode()
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask's default JSON provider, encoding responses with dumps()."""
+
+    default = staticmethod(iso_default)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs) # Indented output: json module
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj) + b'\n', mimetype=self.mimetype)
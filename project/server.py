@@ -0,0 +1,314 @@
+"""
+Production entry point: an asyncio HTTP/1.1 server for the Flask app in
+main.py (replaces the `python main.py` debug server).
+
+    python server.py                         # SERVER_HOST:SERVER_PORT from config.py
+    python server.py --host 0.0.0.0 --port 8000 --threads 16
+
+Connections live on the event loop, so an idle keep-alive connection or
+an open /api/lots/stream client costs a coroutine, not a thread:
+  - requests run the Flask app (the same routes and models) on a pool of
+    SERVER_THREADS threads, which only holds a thread while a handler
+    is actually running;
+  - bodies of unknown length (exports) are sent with chunked encoding,
+    pulling one chunk at a time from the pool;
+  - event streams (main.EventStream) are pumped by the event loop itself
+    with `async for`, waking only when the occupancy feed publishes.
+
+Only the standard library is needed. Put a reverse proxy (TLS, gzip) in
+front of it when it is exposed to the internet. Requests are parsed
+strictly so the proxy and this server cannot disagree on where one ends
+(request smuggling) or on its headers: Content-Length is digits only, any
+request Transfer-Encoding gets 501, whitespace before a header's colon is
+a 400 and header names with underscores are dropped.
+"""
+import argparse
+import asyncio
+import contextvars
+import io
+import re
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import unquote_to_bytes
+
+from main import app, initialize_database, password_hasher
+
+MAX_HEADER_BYTES = 64 * 1024
+TOKEN = re.compile(r"[!#$%&'*+.^_`|~0-9A-Za-z-]+") # RFC 9110 field names
+DIGITS = re.compile(r'[0-9]+')
+
+
+def status_line(code):
+    return f'{code} {HTTPStatus(code).phrase}'
+
+
+class HTTPError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+class Server:
+    """Serves one WSGI app; see the module docstring."""
+
+    def __init__(self, wsgi_app, threads, keepalive_timeout, max_body_bytes):
+        self.app = wsgi_app
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='http')
+        self.keepalive_timeout = keepalive_timeout
+        self.max_body_bytes = max_body_bytes
+        self.connections = set() # Tasks serving open connections
+        self.host = self.port = None
+
+    async def handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            while await self.handle_request(reader, writer):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass # Client went away, or the server is shutting down (see close_connections)
+        except HTTPError as e:
+            body = status_line(e.code).encode()
+            writer.write(f'HTTP/1.1 {status_line(e.code)}\r\nContent-Type: text/plain\r\n'
+                         f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+        except Exception as e:
+            app.logger.error(f"Error serving connection: {e}")
+        finally:
+            self.connections.discard(task)
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def read_head(self, reader):
+        """Reads the request line and headers. Returns None when the client goes away or stays idle too long."""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.keepalive_timeout)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+            return None
+        except asyncio.LimitOverrunError:
+            raise HTTPError(431)
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ')
+        except ValueError:
+            raise HTTPError(400)
+        if version not in ('HTTP/1.0', 'HTTP/1.1'):
+            raise HTTPError(505)
+        headers = []
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, sep, value = line.partition(':')
+            # No whitespace around the name (nor obsolete line folding): a proxy may read it differently
+            if not sep or not TOKEN.fullmatch(name):
+                raise HTTPError(400)
+            if '_' in name:
+                continue # Would share an environ key with its '-' twin (HTTP_X_FOO), so dropped
+            headers.append((name.lower(), value.strip(' \t')))
+        return method, target, version, headers
+
+    async def handle_request(self, reader, writer):
+        """Serves one request. Returns True if the connection stays open for another."""
+        head = await self.read_head(reader)
+        if head is None:
+            return False
+        method, target, version, headers = head
+        header_map = {}
+        for name, value in headers:
+            header_map[name] = f'{header_map[name]},{value}' if name in header_map else value
+
+        if 'transfer-encoding' in header_map:
+            raise HTTPError(501) # No request transfer codings (chunked included): bodies need a Content-Length
+        content_length = header_map.get('content-length', '0')
+        if not DIGITS.fullmatch(content_length): # Only 1*DIGIT, so no '+2', '0_2' or '2,2'
+            raise HTTPError(400)
+        length = int(content_length)
+        if length > self.max_body_bytes:
+            raise HTTPError(413)
+        if length and header_map.get('expect', '').lower() == '100-continue':
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+        try:
+            # Bounded like the head: a client trickling its body must not hold the buffer forever
+            body = await asyncio.wait_for(reader.readexactly(length), self.keepalive_timeout) if length else b''
+        except asyncio.TimeoutError:
+            raise HTTPError(408)
+
+        connection = header_map.get('connection', '').lower()
+        keep_alive = 'close' not in connection if version == 'HTTP/1.1' else 'keep-alive' in connection
+        environ = self.make_environ(method, target, version, header_map, body, writer)
+
+        loop = asyncio.get_running_loop()
+        # One context per request, entered for every chunk whichever pool thread
+        # runs it, so streamed bodies (stream_with_context) keep their request context
+        context = contextvars.copy_context()
+        status, response_headers, first, rest = await loop.run_in_executor(self.pool, context.run, self.call_app, environ)
+        names = {name.lower() for name, _ in response_headers}
+        streamed = rest is not None and 'content-length' not in names
+        chunked = streamed and version == 'HTTP/1.1' and method != 'HEAD'
+        if streamed and not chunked:
+            keep_alive = False # HTTP/1.0: the end of the body is the end of the connection
+        if chunked:
+            response_headers.append(('Transfer-Encoding', 'chunked'))
+        elif rest is None and 'content-length' not in names and not status.startswith(('204', '304')):
+            response_headers.append(('Content-Length', str(len(first))))
+        if not keep_alive:
+            response_headers.append(('Connection', 'close'))
+
+        out = [f'HTTP/1.1 {status}\r\n'.encode('latin-1')]
+        out.extend(f'{name}: {value}\r\n'.encode('latin-1') for name, value in response_headers)
+        out.append(b'\r\n')
+        if method != 'HEAD':
+            out.append(self.frame(first, chunked))
+        writer.write(b''.join(out))
+        await writer.drain()
+
+        if rest is not None:
+            try:
+                if method != 'HEAD':
+                    await self.send_rest(rest, writer, chunked, loop, context)
+            finally:
+                close = getattr(rest, 'close', None)
+                if close is not None:
+                    await loop.run_in_executor(self.pool, context.run, close)
+        return keep_alive
+
+    async def close_connections(self):
+        """Ends every open connection (idle keep-alives and event streams) at shutdown."""
+        tasks = list(self.connections)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    def frame(data, chunked):
+        if not chunked or not data:
+            return data
+        return f'{len(data):X}\r\n'.encode() + data + b'\r\n'
+
+    async def send_rest(self, rest, writer, chunked, loop, context):
+        if hasattr(rest, '__aiter__'):
+            # Event streams wait on the event loop: no thread while idle
+            async for data in rest:
+                writer.write(self.frame(data, chunked))
+                await writer.drain()
+        else:
+            iterator = iter(rest)
+            while True:
+                data = await loop.run_in_executor(self.pool, context.run, next, iterator, None)
+                if data is None:
+                    break
+                writer.write(self.frame(data, chunked))
+                await writer.drain()
+        if chunked:
+            writer.write(b'0\r\n\r\n')
+            await writer.drain()
+
+    def make_environ(self, method, target, version, header_map, body, writer):
+        path, _, query = target.partition('?')
+        peer = writer.get_extra_info('peername') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': unquote_to_bytes(path).decode('latin-1'),
+            'QUERY_STRING': query,
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': str(self.port),
+            'SERVER_PROTOCOL': version,
+            'REMOTE_ADDR': peer[0],
+            'REMOTE_PORT': str(peer[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in header_map.items():
+            if name == 'content-type':
+                environ['CONTENT_TYPE'] = value
+            elif name == 'content-length':
+                environ['CONTENT_LENGTH'] = value
+            else:
+                environ['HTTP_' + name.upper().replace('-', '_')] = value
+        return environ
+
+    def call_app(self, environ):
+        """
+        Runs the app in a pool thread. Returns (status, headers, first, rest):
+        `first` is the body (or its first chunk), `rest` is None when the body
+        is complete, otherwise the iterable to keep reading from.
+        """
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'], started['headers'] = status, list(headers)
+            return lambda data: None # The legacy write() callable is not used by Flask
+
+        result = self.app(environ, start_response)
+        if hasattr(result, '__aiter__'):
+            return started['status'], started['headers'], b'', result
+        length = next((value for name, value in started['headers'] if name.lower() == 'content-length'), None)
+        if length is None:
+            iterator = iter(result)
+            return started['status'], started['headers'], next(iterator, b''), RemainingBody(iterator, result)
+        try:
+            return started['status'], started['headers'], b''.join(result), None
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+
+class RemainingBody:
+    """Iterator over the rest of a WSGI body that closes the original result."""
+
+    def __init__(self, iterator, result):
+        self.iterator = iterator
+        self.result = result
+
+    def __iter__(self):
+        return self.iterator
+
+    def close(self):
+        if hasattr(self.result, 'close'):
+            self.result.close()
+
+
+async def serve(server, host, port, backlog):
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    listener = await asyncio.start_server(server.handle_connection, host, port,
+                                          backlog=backlog, limit=MAX_HEADER_BYTES)
+    server.host, server.port = host, listener.sockets[0].getsockname()[1]
+    print(f"Serving on http://{host}:{server.port} ({server.pool._max_workers} handler threads)", flush=True)
+    async with listener:
+        await stop.wait()
+    print(f"Shutting down ({len(server.connections)} open connections).", flush=True)
+    await server.close_connections()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Production HTTP server for the parking app.')
+    parser.add_argument('--host', default=app.config['SERVER_HOST'])
+    parser.add_argument('--port', type=int, default=app.config['SERVER_PORT'])
+    parser.add_argument('--threads', type=int, default=app.config['SERVER_THREADS'])
+    args = parser.parse_args()
+
+    with app.app_context():
+        initialize_database()
+    server = Server(app, args.threads, app.config['SERVER_KEEPALIVE_TIMEOUT'], app.config['SERVER_MAX_BODY_BYTES'])
+    try:
+        asyncio.run(serve(server, args.host, args.port, app.config['SERVER_BACKLOG']))
+    finally:
+        server.pool.shutdown(wait=True)
+        password_hasher.shutdown()
+
+
+if __name__ == '__main__':
+    main()
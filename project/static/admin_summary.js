@@ -18,6 +18,8 @@ document.addEventListener('DOMContentLoaded', () => {
     // const statusChartCanvas = document.getElementById('statusChart'); // Canvas is created dynamically
     const statusErrorMessage = document.getElementById('status-error-message');
     let statusChartInstance = null; // To hold the status chart instance
+    let statusLots = []; // Lots currently plotted in the status chart
+    let statusFeed = null; // Live occupancy feed (Server-Sent Events)
 
 
     // --- Event Listeners ---
@@ -30,6 +32,7 @@ document.addEventListener('DOMContentLoaded', () => {
             profitSection.classList.remove('hidden');
             statusSection.classList.add('hidden');
             // Destroy status chart if switching away
+            stopStatusFeed();
             if (statusChartInstance) {
                 try { statusChartInstance.destroy(); } catch (e) { console.error("Error destroying status chart:", e); }
                 statusChartInstance = null;
@@ -209,7 +212,8 @@ document.addEventListener('DOMContentLoaded', () => {
          }
 
         try {
-            const response = await fetch('/api/lots'); 
+            // Summary view: the bar chart only needs occupied/maxSpots per lot
+            const response = await fetch('/api/lots?view=summary'); 
             if (!response.ok) {
                  let errorData;
                  try {
@@ -220,6 +224,7 @@ document.addEventListener('DOMContentLoaded', () => {
                  throw new Error(errorData.error || `HTTP error! Status: ${response.status}`);
             }
             const lotsData = await response.json();
+            const feedVersion = response.headers.get('X-Feed-Version');
             
              if (!document.getElementById('status-chart-container')) {
                  console.log("Status view was hidden before data arrived. Aborting render.");
@@ -233,7 +238,9 @@ document.addEventListener('DOMContentLoaded', () => {
              const loadingMessage = statusChartContainer.querySelector('p');
              if (loadingMessage) loadingMessage.remove();
              
+            statusLots = lotsData;
             renderLotStatusBarChart(lotsData, newStatusChartCanvas); 
+            startStatusFeed(feedVersion); // Live updates instead of refetching
 
         } catch (error) {
              if (document.getElementById('status-chart-container')) {
@@ -262,19 +269,7 @@ document.addEventListener('DOMContentLoaded', () => {
          }
         
         const labels = lots.map(lot => lot.name || `Lot #${lot.number}`);
-
-        // --- FIX: Calculate as numbers, remove .toFixed(1) ---
-        const occupiedPercentages = lots.map(lot => {
-            const max = parseFloat(lot.maxSpots);
-            const occupied = parseFloat(lot.occupied);
-            return (max > 0 && !isNaN(occupied)) ? Math.min(100, Math.max(0, (occupied / max) * 100)) : 0; // Return number
-        });
-        const availablePercentages = lots.map(lot => {
-             const max = parseFloat(lot.maxSpots);
-             const occupied = parseFloat(lot.occupied);
-             return (max > 0 && !isNaN(occupied)) ? Math.min(100, Math.max(0, ((max - occupied) / max) * 100)) : 0; // Return number
-        });
-        // --- END FIX ---
+        const { occupiedPercentages, availablePercentages } = computeOccupancyPercentages(lots);
 
 
         if (statusChartInstance) { 
@@ -382,6 +377,59 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    function computeOccupancyPercentages(lots) {
+        // --- FIX: Calculate as numbers, remove .toFixed(1) ---
+        const occupiedPercentages = lots.map(lot => {
+            const max = parseFloat(lot.maxSpots);
+            const occupied = parseFloat(lot.occupied);
+            return (max > 0 && !isNaN(occupied)) ? Math.min(100, Math.max(0, (occupied / max) * 100)) : 0; // Return number
+        });
+        const availablePercentages = lots.map(lot => {
+             const max = parseFloat(lot.maxSpots);
+             const occupied = parseFloat(lot.occupied);
+             return (max > 0 && !isNaN(occupied)) ? Math.min(100, Math.max(0, ((max - occupied) / max) * 100)) : 0; // Return number
+        });
+        // --- END FIX ---
+        return { occupiedPercentages, availablePercentages };
+    }
+
+    // --- Live occupancy feed for the status chart ---
+    function startStatusFeed(sinceVersion) {
+        stopStatusFeed();
+        if (typeof EventSource === 'undefined') return;
+
+        const query = sinceVersion ? `?since=${encodeURIComponent(sinceVersion)}` : '';
+        statusFeed = new EventSource(`/api/lots/stream${query}`);
+
+        statusFeed.addEventListener('spot', (event) => {
+            let change;
+            try {
+                change = JSON.parse(event.data);
+            } catch (e) {
+                console.error("Invalid spot event from live feed:", event.data, e);
+                return;
+            }
+            const lot = statusLots.find(l => l.id == change.lotId);
+            if (!lot || !statusChartInstance) return;
+
+            lot.occupied = change.occupied;
+            const { occupiedPercentages, availablePercentages } = computeOccupancyPercentages(statusLots);
+            statusChartInstance.data.datasets[0].data = occupiedPercentages;
+            statusChartInstance.data.datasets[1].data = availablePercentages;
+            statusChartInstance.update();
+        });
+        // Lots added/edited/removed, or our version is too old: redraw from a fresh snapshot
+        statusFeed.addEventListener('lot', () => fetchAndRenderLotStatusChart());
+        statusFeed.addEventListener('reset', () => fetchAndRenderLotStatusChart());
+    }
+
+    function stopStatusFeed() {
+        if (statusFeed) {
+            statusFeed.close();
+            statusFeed = null;
+        }
+    }
+
      function showStatusError(message) {
          if (statusChartInstance) {
             try { statusChartInstance.destroy(); } catch(e) { console.error("Error destroying status chart:", e);}
@@ -7,6 +7,14 @@ document.addEventListener('DOMContentLoaded', () => {
     const CURRENT_USER_ID = localStorage.getItem('parking_user_id');
     console.log("User ID from localStorage:", CURRENT_USER_ID); // Log the user ID
 
+    // --- Pagination state: pages are loaded on demand as the user scrolls ---
+    const PAGE_SIZE = 50;
+    let nextCursor = null;   // Opaque cursor for the next page (null = no more pages)
+    let isLoadingPage = false;
+    const pageSentinel = document.createElement('div'); // Observed element below the list
+    pageSentinel.className = 'page-sentinel';
+    if (bookingListContainer) bookingListContainer.insertAdjacentElement('afterend', pageSentinel);
+
     /**
      * Helper function to safely update the noBookingsMessage text.
      * @param {string} text - The message to display.
@@ -25,19 +33,24 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     /**
-     * Fetches the user's bookings from the API and displays them.
+     * Fetches a page of the user's bookings from the API and displays it.
+     * @param {boolean} nextPage - Append the next page instead of reloading from the top.
      */
-    async function fetchMyBookings() {
+    async function fetchMyBookings(nextPage = false) {
         if (!CURRENT_USER_ID) {
             console.error('No user ID found in localStorage. Cannot fetch bookings.');
             showNoBookingsMessage('Could not identify user. Please log in again.'); // Use helper
             return;
         }
+        if (nextPage && (!nextCursor || isLoadingPage)) return;
 
         console.log(`Fetching bookings for User ID: ${CURRENT_USER_ID}`); // Log before fetching
 
+        isLoadingPage = true;
         try {
-            const response = await fetch(`/api/my-bookings/${CURRENT_USER_ID}`);
+            let url = `/api/my-bookings/${CURRENT_USER_ID}?limit=${PAGE_SIZE}`;
+            if (nextPage) url += `&after=${encodeURIComponent(nextCursor)}`;
+            const response = await fetch(url);
             console.log("Fetch response status:", response.status); // Log response status
 
             if (!response.ok) {
@@ -61,22 +74,26 @@ document.addEventListener('DOMContentLoaded', () => {
                 throw new Error(errorMsg);
             }
             
-            const bookings = await response.json();
-            console.log("Bookings received from API:", bookings); // Log the raw data received
+            const page = await response.json();
+            console.log("Bookings received from API:", page); // Log the raw data received
 
-            displayBookings(bookings);
+            nextCursor = page.next_cursor;
+            displayBookings(page.items, nextPage);
 
         } catch (error) {
             console.error('Error fetching bookings:', error);
             showNoBookingsMessage(`Error loading bookings: ${error.message}. Please try again.`); // Use helper
+        } finally {
+            isLoadingPage = false;
         }
     }
 
     /**
      * Renders the fetched bookings into the list.
      * @param {Array} bookings - An array of booking objects from the server.
+     * @param {boolean} append - Add to the existing rows instead of replacing them.
      */
-    function displayBookings(bookings) {
+    function displayBookings(bookings, append = false) {
         // Ensure containers exist before modifying
         if (!bookingListContainer || !noBookingsMessage) {
              console.error("Booking list container or message element not found.");
@@ -84,7 +101,9 @@ document.addEventListener('DOMContentLoaded', () => {
         }
 
         // Clear any existing content first
-        bookingListContainer.innerHTML = ''; 
+        if (!append) bookingListContainer.innerHTML = ''; 
+
+        if (append && Array.isArray(bookings) && bookings.length === 0) return;
 
         if (!bookings || !Array.isArray(bookings) || bookings.length === 0) { // Added check for Array type
             console.log("No bookings found or received data is not an array:", bookings);
@@ -213,6 +232,18 @@ document.addEventListener('DOMContentLoaded', () => {
         console.error("Booking list container not found. Cannot add release button listener.");
     }
 
+    // Load the next page when the bottom of the list scrolls into view
+    if ('IntersectionObserver' in window) {
+        const pageObserver = new IntersectionObserver((entries) => {
+            if (entries.some(entry => entry.isIntersecting)) fetchMyBookings(true);
+        }, { rootMargin: '200px' });
+        pageObserver.observe(pageSentinel);
+    } else {
+        window.addEventListener('scroll', () => {
+            if (window.innerHeight + window.scrollY >= document.body.offsetHeight - 200) fetchMyBookings(true);
+        });
+    }
+
     // Initial fetch of bookings when the page loads
     fetchMyBookings();
 });
@@ -124,8 +124,8 @@ document.addEventListener('DOMContentLoaded', function() {
 
             if (!response.ok) throw new Error('API Error: Could not delete lot.');
             
-            // On success, refresh the UI
-            alert(`Lot #${lotIdToDelete} deleted successfully!`);
+            // On success, refresh the UI (the lot is hidden at once; its rows are removed in the background)
+            alert(`Lot #${lotIdToDelete} is being deleted.`);
             fetchAndRenderLots();
 
         } catch (error) {
@@ -153,7 +153,11 @@ document.addEventListener('DOMContentLoaded', function() {
                 body: JSON.stringify(formData),
             });
 
-            if (!response.ok) throw new Error('API Error: Could not update lot.');
+            if (!response.ok) {
+                // e.g. 409 when shrinking would remove occupied spots
+                const errorData = await response.json().catch(() => ({}));
+                throw new Error(errorData.message || 'API Error: Could not update lot.');
+            }
 
             editModal.style.display = "none";
             alert(`Lot #${currentEditLotId} updated successfully!`);
@@ -161,7 +165,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
         } catch (error) {
             console.error('Error updating lot:', error);
-            alert('Failed to update lot. Check console for details.');
+            alert(`Failed to update lot. ${error.message}`);
         }
     });
 
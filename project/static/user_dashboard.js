@@ -27,6 +27,10 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- Global variable to store fetched lot data ---
     let allLotsData = [];
+
+    // --- Live occupancy feed (Server-Sent Events) ---
+    let liveFeed = null;
+    let openLotId = null; // Lot currently shown in the spot selection modal
     
     // --- Get Logged-in User ID ---
     const CURRENT_USER_ID = localStorage.getItem('parking_user_id'); // Read from localStorage
@@ -91,6 +95,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 showBtn.textContent = 'Hide';
             } else {
                 lotGrid.classList.add('hidden');
+                stopLiveFeed();
                 // Consider delaying innerHTML clear if transition is long
                 lotGrid.innerHTML = ''; 
                 showBtn.textContent = 'Show';
@@ -104,13 +109,8 @@ document.addEventListener('DOMContentLoaded', () => {
             const viewBtn = event.target.closest('.view-btn');
             if (viewBtn) {
                 const lotId = viewBtn.dataset.lotId;
-                // Find the lot data using == for potential type difference (string vs number)
-                const lot = allLotsData.find(l => l.id == lotId); 
-                if (lot) {
-                    openSpotSelectionModal(lot);
-                } else {
-                    console.error(`Lot data not found for lotId: ${lotId}`);
-                }
+                // Spot details are only fetched for the lot being viewed
+                fetchLotSpotsAndOpen(lotId);
             }
         });
     } else {
@@ -224,11 +224,12 @@ document.addEventListener('DOMContentLoaded', () => {
          if (!lotGrid) return; // Don't proceed if grid doesn't exist
 
         try {
-            // This calls your existing '/api/lots' endpoint
-            const response = await fetch('/api/lots');
+            // Summary view: lot cards only need counts, not the per-spot arrays
+            const response = await fetch('/api/lots?view=summary');
             if (!response.ok) throw new Error(`HTTP error! Status: ${response.status}`);
             
             allLotsData = await response.json(); // Store data globally
+            const feedVersion = response.headers.get('X-Feed-Version');
             lotGrid.innerHTML = ''; // Clear previous content
 
             if (!Array.isArray(allLotsData)) {
@@ -247,11 +248,11 @@ document.addEventListener('DOMContentLoaded', () => {
                      }
 
                     const cardHTML = `
-                        <div class="parking-card">
+                        <div class="parking-card" data-lot-id="${lot.id}">
                             <h2>Parking ${lot.number}</h2> 
                             <p>Name : ${lot.name ?? 'N/A'}</p>
                             <p class="card-detail occupied">
-                                Occupied Spots : ${lot.occupied ?? '?'}/${lot.maxSpots ?? '?'}
+                                Occupied Spots : <span class="occupied-count">${lot.occupied ?? '?'}</span>/${lot.maxSpots ?? '?'}
                             </p>
                             <p class="card-detail price">
                                 Price Per Hour : Rs. ${lot.price ?? '?'}
@@ -264,6 +265,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 });
             }
             lotGrid.classList.remove('hidden'); // Show the grid
+            startLiveFeed(feedVersion); // Keep the cards current without refetching
         } catch (error) {
             console.error('Failed to fetch parking lots:', error);
              if (lotGrid) { // Check again before modifying
@@ -273,6 +275,75 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    async function fetchLotSpotsAndOpen(lotId) {
+        try {
+            const response = await fetch(`/api/lots?lot_ids=${encodeURIComponent(lotId)}&view=full`);
+            if (!response.ok) throw new Error(`HTTP error! Status: ${response.status}`);
+
+            const lots = await response.json();
+            const lot = Array.isArray(lots) ? lots[0] : null;
+            if (lot) {
+                openSpotSelectionModal(lot);
+            } else {
+                console.error(`Lot data not found for lotId: ${lotId}`);
+                alert("Error: This parking lot is no longer available.");
+            }
+        } catch (error) {
+            console.error(`Failed to fetch spots for lot ${lotId}:`, error);
+            alert(`Error: Could not load spot details. ${error.message}`);
+        }
+    }
+
+    // --- Live occupancy feed ---
+    function startLiveFeed(sinceVersion) {
+        stopLiveFeed();
+        if (typeof EventSource === 'undefined') return; // Old browser: cards update on refetch only
+
+        const query = sinceVersion ? `?since=${encodeURIComponent(sinceVersion)}` : '';
+        liveFeed = new EventSource(`/api/lots/stream${query}`);
+
+        liveFeed.addEventListener('spot', (event) => {
+            try {
+                applySpotChange(JSON.parse(event.data));
+            } catch (e) {
+                console.error("Invalid spot event from live feed:", event.data, e);
+            }
+        });
+        // Lots added/edited/removed, or our version is too old: reload the snapshot
+        liveFeed.addEventListener('lot', () => fetchLotsAndDisplay());
+        liveFeed.addEventListener('reset', () => fetchLotsAndDisplay());
+        liveFeed.onerror = () => console.warn("Live feed connection lost, browser will reconnect.");
+    }
+
+    function stopLiveFeed() {
+        if (liveFeed) {
+            liveFeed.close();
+            liveFeed = null;
+        }
+    }
+
+    function applySpotChange(change) {
+        // 1. Update the stored lot data and its card
+        const lot = allLotsData.find(l => l.id == change.lotId);
+        if (lot) lot.occupied = change.occupied;
+
+        const countElement = lotGrid.querySelector(`.parking-card[data-lot-id="${change.lotId}"] .occupied-count`);
+        if (countElement) countElement.textContent = change.occupied;
+
+        // 2. Update the spot selection modal if it is showing this lot
+        if (openLotId == change.lotId && spotModal.classList.contains('active')) {
+            spotModalOccupiedCount.textContent = `Occupied ${change.occupied}/${lot?.maxSpots ?? '?'}`;
+            const spotButton = spotGrid.querySelector(`.spot-btn[data-spot-id="${change.spotId}"]`);
+            if (spotButton) {
+                const isOccupied = change.status === 1;
+                const spotNumber = spotButton.dataset.spotNumber;
+                spotButton.className = `spot-btn ${isOccupied ? 'occupied' : 'available'}`;
+                spotButton.textContent = isOccupied ? 'O' : (spotNumber ? `A-${spotNumber}` : 'A');
+                spotButton.disabled = isOccupied;
+            }
+        }
+    }
+
     function openSpotSelectionModal(lot) {
          // Ensure modal elements exist
          if (!spotModal || !spotModalTitle || !spotModalOccupiedCount || !spotGrid || !backdrop) {
@@ -287,6 +358,7 @@ document.addEventListener('DOMContentLoaded', () => {
          }
 
         // 1. Populate modal with data
+        openLotId = lot.id;
         spotModalTitle.textContent = `Parking ${lot.number ?? '?'}`;
         spotModalOccupiedCount.textContent = `Occupied ${lot.occupied ?? '?'}/${lot.maxSpots ?? '?'}`;
         
@@ -306,6 +378,7 @@ document.addEventListener('DOMContentLoaded', () => {
             spotButton.disabled = isOccupied;
             spotButton.dataset.spotId = spot.id;
             spotButton.dataset.lotId = lot.id; // Pass lot.id here
+            spotButton.dataset.spotNumber = spot.spotNumber ?? '';
             spotGrid.appendChild(spotButton);
         });
 
@@ -341,6 +414,7 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     function closeAllModals() {
+         openLotId = null;
          if (backdrop) backdrop.classList.remove('active');
          if (spotModal) spotModal.classList.remove('active');
          if (bookingModal) bookingModal.classList.remove('active');
@@ -8,6 +8,15 @@ document.addEventListener('DOMContentLoaded', () => {
     const CURRENT_USER_ID = localStorage.getItem('parking_user_id');
     console.log("Summary User ID from localStorage:", CURRENT_USER_ID);
 
+    // --- Pagination state: pages are loaded on demand as the user scrolls ---
+    const PAGE_SIZE = 50;
+    let nextCursor = null;   // Opaque cursor for the next page (null = no more pages)
+    let isLoadingPage = false;
+    const pageSentinel = document.createElement('div'); // Observed element below the table
+    pageSentinel.className = 'page-sentinel';
+    const billingTable = document.getElementById('billing-table');
+    if (billingTable) billingTable.insertAdjacentElement('afterend', pageSentinel);
+
     /**
      * Helper function to show error messages.
      * @param {string} msg - The error message to display.
@@ -37,20 +46,25 @@ document.addEventListener('DOMContentLoaded', () => {
      }
 
     /**
-     * Fetches the user's billing summary from the API and displays it.
+     * Fetches a page of the user's billing summary from the API and displays it.
+     * @param {boolean} nextPage - Append the next page instead of reloading from the top.
      */
-    async function fetchBillingSummary() {
+    async function fetchBillingSummary(nextPage = false) {
         if (!CURRENT_USER_ID) {
             console.error('No user ID found in localStorage.');
             showError('Could not identify user. Please log in again.');
             return;
         }
+        if (nextPage && (!nextCursor || isLoadingPage)) return;
 
         console.log(`Fetching summary for User ID: ${CURRENT_USER_ID}`);
 
+        isLoadingPage = true;
         try {
             // Fetch data from the new API endpoint
-            const response = await fetch(`/api/user-summary/${CURRENT_USER_ID}`);
+            let url = `/api/user-summary/${CURRENT_USER_ID}?limit=${PAGE_SIZE}`;
+            if (nextPage) url += `&after=${encodeURIComponent(nextCursor)}`;
+            const response = await fetch(url);
             console.log("Summary fetch response status:", response.status);
 
             if (!response.ok) {
@@ -62,22 +76,26 @@ document.addEventListener('DOMContentLoaded', () => {
                 throw new Error(errorMsg);
             }
 
-            const summaryData = await response.json();
-            console.log("Summary data received:", summaryData);
+            const page = await response.json();
+            console.log("Summary data received:", page);
 
-            displaySummary(summaryData);
+            nextCursor = page.next_cursor;
+            displaySummary(page.items, nextPage);
 
         } catch (error) {
             console.error('Error fetching billing summary:', error);
             showError(`Error loading summary: ${error.message}. Please try again.`);
+        } finally {
+            isLoadingPage = false;
         }
     }
 
     /**
      * Renders the fetched summary data into the table.
      * @param {Array} summaryItems - An array of billing summary objects.
+     * @param {boolean} append - Add to the existing rows instead of replacing them.
      */
-    function displaySummary(summaryItems) {
+    function displaySummary(summaryItems, append = false) {
          // Ensure elements exist
          if (!tableBody || !noSummaryMessage || !errorMessage) {
               console.error("Required table elements not found.");
@@ -85,9 +103,11 @@ document.addEventListener('DOMContentLoaded', () => {
               return;
          }
 
-        tableBody.innerHTML = ''; // Clear previous data
+        if (!append) tableBody.innerHTML = ''; // Clear previous data
         errorMessage.style.display = 'none'; // Hide error
 
+        if (append && Array.isArray(summaryItems) && summaryItems.length === 0) return;
+
         if (!summaryItems || !Array.isArray(summaryItems) || summaryItems.length === 0) {
             console.log("No summary items found.");
             showNoDataMessage();
@@ -138,6 +158,18 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
+    // Load the next page when the bottom of the table scrolls into view
+    if ('IntersectionObserver' in window) {
+        const pageObserver = new IntersectionObserver((entries) => {
+            if (entries.some(entry => entry.isIntersecting)) fetchBillingSummary(true);
+        }, { rootMargin: '200px' });
+        pageObserver.observe(pageSentinel);
+    } else {
+        window.addEventListener('scroll', () => {
+            if (window.innerHeight + window.scrollY >= document.body.offsetHeight - 200) fetchBillingSummary(true);
+        });
+    }
+
     // --- Initial Load ---
     fetchBillingSummary();
 